@@ -0,0 +1,88 @@
+"""
+Benchmark automap with each relationship mode (``all``, ``scalar`` and
+``none``).
+
+Usage:
+    uv run python benchmarks/automap_relationships.py [database_url] [n_tables]
+
+The database URL defaults to the ``TESTING_DATABASE`` environment variable.
+A synthetic schema is created in which each table has several foreign keys to
+earlier tables. Each mode is timed with full reflection, and with tables
+loaded from a (warm) model cache, which isolates the cost of mapping. Both
+include configuring the mappers, where relationships are set up.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from sqlalchemy.orm import configure_mappers
+
+from macrostrat.database import Database
+
+schema = "automap_benchmark"
+n_foreign_keys = 4
+
+
+def _schema_sql(n_tables: int) -> str:
+    sql = f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema};"
+    for i in range(n_tables):
+        refs = sorted({(i * (k + 3)) // (k + 5) for k in range(n_foreign_keys)})
+        refs = [r for r in refs if r < i]
+        columns = [f"ref_{r} integer REFERENCES {schema}.table_{r}(id)" for r in refs]
+        columns = ["id serial PRIMARY KEY", "name text"] + columns
+        sql += f"CREATE TABLE {schema}.table_{i} ({', '.join(columns)});"
+    return sql
+
+
+def _automap(url, relationships, cache_file=None):
+    db = Database(url)
+    try:
+        start = perf_counter()
+        db.automap(schemas=[schema], relationships=relationships, cache_file=cache_file)
+        configure_mappers()
+        elapsed = perf_counter() - start
+        n_relationships = sum(
+            len(model.__mapper__.relationships) for model in db.mapper._models
+        )
+    finally:
+        db.engine.dispose()
+    return elapsed, n_relationships
+
+
+def _measure(*args):
+    # Mapped classes are kept in a global registry, so each run gets a fresh
+    # process
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_automap, *args).result()
+
+
+def run_benchmark(url, n_tables: int):
+    db = Database(url)
+    db.run_sql(_schema_sql(n_tables), raise_errors=True, output_mode="none")
+    print(f"{n_tables} tables, up to {n_foreign_keys} foreign keys each")
+    try:
+        with TemporaryDirectory() as tmp:
+            cache_file = Path(tmp) / "models.pickle"
+            # Warm the model cache
+            _measure(url, "none", cache_file)
+            for relationships in ("all", "scalar", "none"):
+                t_reflect, n = _measure(url, relationships)
+                t_cached, _ = _measure(url, relationships, cache_file)
+                print(
+                    f"  {relationships:>6}: {t_reflect:7.3f} s reflected, "
+                    f"{t_cached:7.3f} s from cache, {n:5d} relationships"
+                )
+    finally:
+        db.run_sql(f"DROP SCHEMA {schema} CASCADE", output_mode="none")
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else os.environ["TESTING_DATABASE"]
+    n_tables = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    run_benchmark(url, n_tables)
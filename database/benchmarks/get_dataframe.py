@@ -0,0 +1,63 @@
+"""
+Benchmark the pandas and arrow engines for ``get_dataframe``.
+
+Usage:
+    uv run python benchmarks/get_dataframe.py [database_url] [n_rows]
+
+The database URL defaults to the ``TESTING_DATABASE`` environment variable.
+A wide synthetic result is generated on the server with ``generate_series``.
+"""
+
+import os
+import sys
+from time import perf_counter
+
+from macrostrat.database import Database
+
+_query = """
+SELECT
+  i AS id,
+  i * 2 AS int_value,
+  i::bigint * 1000 AS big_value,
+  random() AS float_value,
+  random()::real AS real_value,
+  'name ' || i AS name,
+  md5(i::text) AS hash,
+  mod(i, 2) = 0 AS is_even,
+  current_date - mod(i, 365) AS day,
+  now() - i * interval '1 minute' AS created
+FROM generate_series(1, {n}) AS i
+"""
+
+
+def _time(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(db: Database, n_rows: int):
+    print(f"{n_rows} rows")
+    query = _query.format(n=n_rows)
+
+    t_pandas, df = _time(lambda: db.get_dataframe(query))
+    print(f"  pandas: {t_pandas:8.3f} s  {df.shape}")
+
+    t_arrow, df = _time(lambda: db.get_dataframe(query, engine="arrow"))
+    print(f"  arrow:  {t_arrow:8.3f} s  {df.shape}")
+    print(f"  speedup: {t_pandas / t_arrow:7.1f}x")
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else os.environ["TESTING_DATABASE"]
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 500_000
+    db = Database(url)
+    try:
+        run_benchmark(db, n_rows)
+    finally:
+        db.engine.dispose()
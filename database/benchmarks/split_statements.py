@@ -0,0 +1,84 @@
+"""
+Benchmark the streaming statement splitter against sqlparse.
+
+Usage:
+    uv run python benchmarks/split_statements.py [schema.sql ...]
+
+Without arguments, a synthetic schema file (tables, plpgsql functions, comments
+and views) of a few megabytes is generated and used.
+"""
+
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import sqlparse
+
+from macrostrat.database.lexer import split_statements
+
+_synthetic_block = """
+-- Table {i}: a table with some comments; and semicolons
+CREATE TABLE IF NOT EXISTS bench.table_{i} (
+  id serial PRIMARY KEY,
+  name text NOT NULL DEFAULT 'unnamed; really',
+  description text /* block comment; */
+);
+
+CREATE OR REPLACE FUNCTION bench.fn_{i}(arg integer) RETURNS text AS $$
+BEGIN
+  -- A comment inside a function body;
+  RETURN 'value; ' || arg::text;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE VIEW bench.view_{i} AS
+SELECT id, name, E'escaped\\'quote;' AS label FROM bench.table_{i};
+"""
+
+
+def _sqlparse_split(sql):
+    return sqlparse.split(sqlparse.format(sql, strip_comments=True))
+
+
+def _lexer_split(path):
+    with path.open() as f:
+        return list(split_statements(f))
+
+
+def _time(fn, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn(*args)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(path: Path):
+    size = path.stat().st_size / 2**20
+    print(f"{path.name} ({size:.1f} MB)")
+
+    t_lexer, statements = _time(_lexer_split, path)
+    print(f"  lexer:    {t_lexer:8.3f} s  ({len(statements)} statements)")
+
+    sql = path.read_text()
+    t_sqlparse, statements = _time(_sqlparse_split, sql, repeat=1)
+    print(f"  sqlparse: {t_sqlparse:8.3f} s  ({len(statements)} statements)")
+    print(f"  speedup:  {t_sqlparse / t_lexer:8.1f}x")
+
+
+if __name__ == "__main__":
+    files = [Path(p) for p in sys.argv[1:]]
+    if files:
+        for fn in files:
+            run_benchmark(fn)
+    else:
+        with TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / "synthetic-schema.sql"
+            with fn.open("w") as f:
+                for i in range(5000):
+                    f.write(_synthetic_block.format(i=i))
+            run_benchmark(fn)
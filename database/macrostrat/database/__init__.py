@@ -1,7 +1,6 @@
 from .core import Database
-from .mapper import DatabaseMapper
 from .postgresql import on_conflict, prefix_inserts  # noqa
-from .query import run_fixtures, run_query, run_sql, execute  # noqa
+from .query import run_fixtures, run_many, run_query, run_sql, execute  # noqa
 from .sequences import reset_sequence, serial_to_identity
 from .utils import (  # noqa
     create_database,
@@ -13,3 +12,13 @@ from .utils import (  # noqa
     reflect_table,
     get_database_url,
 )
+
+
+def __getattr__(name):
+    # The mapper (and GeoAlchemy2, which it requires) is slow to import, so it
+    # is only loaded on first use
+    if name == "DatabaseMapper":
+        from .mapper import DatabaseMapper
+
+        return DatabaseMapper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
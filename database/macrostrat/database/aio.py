@@ -0,0 +1,251 @@
+"""
+An asyncio counterpart of :class:`macrostrat.database.Database`, built on
+SQLAlchemy's async engine and psycopg's async driver.
+
+Queries are parsed, rendered and executed with the same machinery as the
+synchronous API (``query.py``): each call runs on an async connection through
+SQLAlchemy's ``run_sync`` bridge, so the event loop is never blocked on
+database I/O and many concurrent tasks can share a small connection pool.
+"""
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Union
+
+from sqlalchemy import URL, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from macrostrat.utils import get_logger
+
+from .core import Database, _parse_table_name
+from .query import _run_sql, run_many
+from .utils import reflect_table
+
+log = get_logger(__name__)
+
+AsyncDatabaseInput = Union[str, URL, AsyncEngine, Database]
+
+_done = object()
+
+
+def _next_result(session, results):
+    return next(results, _done)
+
+
+def _close_results(session, results):
+    results.close()
+
+
+def _run_query(session, sql, params, **kwargs):
+    # Statements are committed after their result is yielded, so the generator
+    # is run to completion before the session is closed. Results of the async
+    # driver's (client-side) cursors are already buffered.
+    if kwargs.pop("many", False):
+        return run_many(session, sql, params, **kwargs)
+    results = _run_sql(
+        session,
+        sql,
+        params,
+        ensure_single_query=True,
+        yield_results=kwargs.pop("yield_results", False),
+        raise_errors=kwargs.pop("raise_errors", True),
+        **kwargs,
+    )
+    res = None
+    for res in results:
+        pass
+    return res
+
+
+def _get_async_url(db_conn) -> URL:
+    if isinstance(db_conn, Database):
+        db_conn = db_conn.engine.url
+    url = make_url(db_conn)
+    if "postgres" in url.drivername:
+        url = url.set(drivername="postgresql+psycopg")
+    return url
+
+
+class AsyncDatabase(object):
+    """
+    Asynchronous interface to a PostgreSQL database.
+
+    Statements run in a session scoped to the current task: inside
+    ``async with db.transaction()``, concurrent tasks each see their own
+    transaction, and outside of one every call commits on its own.
+    """
+
+    engine: AsyncEngine
+    instance_params: dict
+
+    # Parameter handling is shared with the synchronous API
+    _setup_params = Database._setup_params
+
+    def __init__(self, db_conn: AsyncDatabaseInput, *, echo_sql=False, **kwargs):
+        """
+        Args:
+            db_conn (str | URL | AsyncEngine | Database): Connection string or
+                engine for the database. Synchronous ``Database`` objects are
+                converted using their URL.
+
+        Keyword Args:
+            echo_sql (bool): If True, will echo SQL commands to the console.
+            instance_params (dict): Parameters to pass to queries.
+        """
+        self.instance_params = kwargs.pop("instance_params", {})
+
+        if echo_sql:
+            kwargs["echo"] = True
+
+        if isinstance(db_conn, AsyncEngine):
+            self.engine = db_conn
+        else:
+            self.engine = create_async_engine(_get_async_url(db_conn), **kwargs)
+
+        self._session: ContextVar[Optional[AsyncSession]] = ContextVar(
+            f"session_{id(self)}", default=None
+        )
+        self._table_cache: dict = {}
+        self.savepoint_counter = 0
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        session = self._session.get()
+        if session is not None:
+            yield session
+            return
+        async with AsyncSession(self.engine) as session:
+            yield session
+
+    async def run_query(self, sql, params=None, **kwargs):
+        """Run a single query, returning the (buffered) result.
+
+        Args:
+            sql (str): SQL file or query to execute.
+            params (dict): Parameters to pass to the query.
+
+        Keyword Args:
+            use_instance_params (bool): If True, will use the instance_params set on
+                the Database object. Default is True.
+        """
+        params = self._setup_params(params, kwargs)
+        async with self._session_scope() as session:
+            return await session.run_sync(_run_query, sql, params, **kwargs)
+
+    async def run_sql(self, sql, params=None, **kwargs):
+        """Execute SQL files or query strings, yielding the result of each
+        statement as it completes.
+
+        Usage::
+
+            async for result in db.run_sql(sql):
+                ...
+
+        Accepts the same keyword arguments as ``Database.run_sql``.
+        """
+        params = self._setup_params(params, kwargs)
+        async with self._session_scope() as session:
+            results = _run_sql(session.sync_session, sql, params, **kwargs)
+            try:
+                while True:
+                    res = await session.run_sync(_next_result, results)
+                    if res is _done:
+                        break
+                    yield res
+            finally:
+                await session.run_sync(_close_results, results)
+
+    @asynccontextmanager
+    async def transaction(self, *, rollback="on-error", raise_errors=True):
+        """Run statements in the current task within a single transaction on a
+        dedicated connection, which is committed or rolled back on exit.
+
+        Args:
+            rollback (str): ``"on-error"`` (default), ``"always"`` or ``"never"``.
+            raise_errors (bool): Re-raise errors raised within the block.
+        """
+        async with self.engine.connect() as connection:
+            transaction = await connection.begin()
+            session = AsyncSession(bind=connection)
+            token = self._session.set(session)
+
+            should_rollback = rollback == "always"
+            try:
+                yield self
+            except Exception as e:
+                should_rollback = rollback != "never"
+                if raise_errors:
+                    raise e
+            finally:
+                self._session.reset(token)
+                await session.close()
+                if should_rollback:
+                    await transaction.rollback()
+                else:
+                    await transaction.commit()
+
+    @asynccontextmanager
+    async def savepoint(self, name=None, rollback="on-error"):
+        """A savepoint within the current transaction (a transaction is started
+        if none is active). Savepoints can be nested.
+
+        Args:
+            name (str): Savepoint name. Generated if not given.
+            rollback (str): ``"on-error"`` (default), ``"always"`` or ``"never"``.
+        """
+        if self._session.get() is None:
+            async with self.transaction(rollback=rollback):
+                async with self.savepoint(name, rollback=rollback) as sp:
+                    yield sp
+            return
+
+        if name is None:
+            name = f"sp_{self.savepoint_counter}"
+            self.savepoint_counter += 1
+
+        connection = await self._session.get().connection()
+        quoted = connection.dialect.identifier_preparer.quote(name)
+        await connection.execute(text(f"SAVEPOINT {quoted}"))
+
+        session = AsyncSession(bind=connection)
+        token = self._session.set(session)
+        should_rollback = rollback == "always"
+        try:
+            yield name
+        except Exception as e:
+            should_rollback = rollback != "never"
+            raise e
+        finally:
+            self._session.reset(token)
+            await session.close()
+            if should_rollback:
+                await connection.execute(text(f"ROLLBACK TO SAVEPOINT {quoted}"))
+            else:
+                await connection.execute(text(f"RELEASE SAVEPOINT {quoted}"))
+
+    async def get_table(self, name, *, schema=None):
+        """Return a reflected SQLAlchemy Table object, reflecting it on first
+        access and caching it afterwards.
+
+        Args:
+            name: Table name as ``"table"``, ``"schema.table"``, or
+                  ``("schema", "table")``.
+            schema: Explicit schema override (default ``"public"``).
+        """
+        schema_, table_name = _parse_table_name(name, schema)
+        cache_key = (schema_, table_name)
+        if cache_key in self._table_cache:
+            return self._table_cache[cache_key]
+
+        reflect_schema = None if schema_ == "public" else schema_
+        async with self.engine.connect() as connection:
+            tbl = await connection.run_sync(
+                reflect_table, table_name, schema=reflect_schema
+            )
+        self._table_cache[cache_key] = tbl
+        return tbl
+
+    async def dispose(self):
+        """Close all connections in the engine's pool."""
+        await self.engine.dispose()
@@ -0,0 +1,527 @@
+"""
+Bulk data transfer for PostgreSQL.
+
+Rows are loaded into tables using ``COPY ... FROM STDIN``, which is typically an
+order of magnitude faster than row-by-row inserts, and large query results are
+read in batches from server-side cursors. Both directions stream their data, so
+arbitrarily large inputs and results are handled with bounded memory.
+"""
+
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+from io import RawIOBase
+from itertools import count
+from pathlib import Path
+from time import perf_counter
+from typing import IO, Any, Iterable, Iterator, Optional, Sequence, Union
+
+from psycopg.sql import SQL, Identifier
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.schema import Table
+
+from macrostrat.utils import get_logger
+
+from .query import (
+    _compile_driver_query,
+    _get_connection,
+    _get_queries,
+    _render_query_text,
+)
+
+log = get_logger(__name__)
+
+CopyInput = Union[Iterable[Sequence[Any]], Iterable[dict], "DataFrame", Path, IO]
+
+_copy_formats = ("binary", "csv")
+_stream_outputs = ("tuples", "dicts", "dataframe")
+
+# Arrow types for PostgreSQL types, which are parsed from COPY's CSV output.
+# Other types are read as text, except for those handled specially below.
+_arrow_types = {
+    "bool": "bool_",
+    "int2": "int16",
+    "int4": "int32",
+    "int8": "int64",
+    "oid": "uint32",
+    "float4": "float32",
+    "float8": "float64",
+    # Like ``pandas.read_sql``, which converts decimals to floats by default
+    "numeric": "float64",
+    "date": "date32",
+}
+# Spatial types are converted to WKB
+_wkb_types = ("geometry", "geography")
+# Types with ``infinity`` values, which Arrow can't represent
+_infinite_types = ("date", "timestamp", "timestamptz")
+
+# Server-side cursor names must be unique within a session
+_cursor_ids = count()
+
+
+@dataclass
+class CopyStats:
+    """Throughput statistics for a COPY operation."""
+
+    rows: int
+    elapsed: float
+    bytes: Optional[int] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.elapsed == 0:
+            return float("inf")
+        return self.rows / self.elapsed
+
+    def __str__(self):
+        return f"{self.rows} rows in {self.elapsed:.2f} s ({self.rows_per_second:.0f} rows/s)"
+
+
+def copy_in(
+    connectable,
+    table: Table,
+    data: CopyInput,
+    *,
+    columns: Optional[Sequence[str]] = None,
+    format: str = "binary",
+    header: bool = False,
+    chunk_size: int = 2**16,
+) -> CopyStats:
+    """
+    Load data into a table using ``COPY ... FROM STDIN``.
+
+    Args:
+        connectable: A SQLAlchemy connection or session (the psycopg driver is required).
+        table: The target table. Column types are resolved from its definition.
+        data: An iterable of row tuples or dicts, a pandas DataFrame, or a path or
+            file handle containing data already in the chosen format.
+        columns: Columns to load, in order. Defaults to the DataFrame's columns for
+            DataFrames, and to all table columns otherwise.
+        format: ``"binary"`` (the default, fastest for rows) or ``"csv"``.
+        header: Whether a CSV file input starts with a header line.
+        chunk_size: Read size for file inputs.
+
+    Returns: A ``CopyStats`` object summarizing the load.
+    """
+    if format not in _copy_formats:
+        raise ValueError(
+            f"Unsupported COPY format {format!r}; use one of {_copy_formats}"
+        )
+
+    is_file = isinstance(data, Path) or hasattr(data, "read")
+    if format == "binary" and header:
+        raise ValueError("Headers are only supported for CSV input")
+
+    if columns is None and _is_dataframe(data):
+        columns = [str(c) for c in data.columns]
+    if columns is None:
+        columns = [c.name for c in table.columns]
+    columns = list(columns)
+
+    table_name = Identifier(table.name)
+    if table.schema is not None:
+        table_name = Identifier(table.schema, table.name)
+    options = SQL("FORMAT {}").format(SQL(format))
+    if header:
+        options += SQL(", HEADER")
+    statement = SQL("COPY {table} ({columns}) FROM STDIN WITH ({options})").format(
+        table=table_name,
+        columns=SQL(", ").join(Identifier(c) for c in columns),
+        options=options,
+    )
+
+    trans = None
+    try:
+        trans = connectable.begin()
+    except InvalidRequestError:
+        pass
+    conn = _get_connection(connectable)
+    driver_conn = conn.connection.driver_connection
+
+    start = perf_counter()
+    n_bytes = None
+    try:
+        with driver_conn.cursor() as cursor:
+            with cursor.copy(statement) as copy:
+                if is_file:
+                    n_bytes = _write_file(copy, data, chunk_size)
+                elif format == "binary":
+                    copy.set_types(_column_types(driver_conn, table, columns))
+                    for row in _iter_rows(data, columns):
+                        copy.write_row(row)
+                else:
+                    n_bytes = 0
+                    for row in _iter_rows(data, columns):
+                        line = _csv_line(row)
+                        n_bytes += len(line)
+                        copy.write(line)
+            n_rows = cursor.rowcount
+    except Exception:
+        if trans is not None:
+            trans.rollback()
+        elif hasattr(connectable, "rollback"):
+            connectable.rollback()
+        raise
+
+    if trans is not None:
+        trans.commit()
+    elif hasattr(connectable, "commit"):
+        connectable.commit()
+
+    stats = CopyStats(rows=n_rows, elapsed=perf_counter() - start, bytes=n_bytes)
+    log.info("Copied data into %s: %s", table.fullname, stats)
+    return stats
+
+
+def _is_dataframe(data) -> bool:
+    return hasattr(data, "itertuples") and hasattr(data, "columns")
+
+
+def _column_types(driver_conn, table: Table, columns: Sequence[str]) -> list[str]:
+    """Resolve PostgreSQL type names for binary COPY from the table definition."""
+    dialect = postgresql.dialect()
+    types = []
+    for name in columns:
+        type_name = table.columns[name].type.compile(dialect=dialect)
+        # Strip type modifiers, e.g. VARCHAR(20) or NUMERIC(10, 2)
+        type_name = type_name.split("(")[0].strip().lower()
+        if driver_conn.adapters.types.get(type_name) is None:
+            raise ValueError(
+                f"Column {name!r} has type {type_name!r}, which can't be loaded with "
+                "binary COPY; use format='csv' instead"
+            )
+        types.append(type_name)
+    return types
+
+
+def _iter_rows(data, columns: Sequence[str]):
+    if _is_dataframe(data):
+        from pandas import isna
+        from pandas.api.types import is_scalar
+
+        def _value(v):
+            if is_scalar(v):
+                # Map missing values (NaN, NaT, NA, None) to NULL
+                return None if isna(v) else v
+            # e.g. numpy arrays for array columns
+            return v.tolist() if hasattr(v, "tolist") else v
+
+        for row in data[list(columns)].itertuples(index=False, name=None):
+            yield tuple(_value(v) for v in row)
+        return
+    for row in data:
+        if isinstance(row, dict):
+            yield tuple(row.get(c) for c in columns)
+        else:
+            yield row
+
+
+def _write_file(copy, data: Union[Path, IO], chunk_size: int) -> int:
+    if isinstance(data, Path):
+        with data.open("rb") as f:
+            return _write_file(copy, f, chunk_size)
+    n_bytes = 0
+    while chunk := data.read(chunk_size):
+        n_bytes += len(chunk)
+        copy.write(chunk)
+    return n_bytes
+
+
+def _csv_value(value) -> str:
+    # Quote all strings, so that empty strings are distinct from NULLs
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # Hex format bytea input
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _csv_line(row) -> str:
+    return ",".join(_csv_value(v) for v in row) + "\n"
+
+
+def stream(
+    engine: Engine,
+    sql,
+    params=None,
+    *,
+    batch_size: int = 10000,
+    output: str = "tuples",
+) -> Iterator:
+    """
+    Stream the results of a query in batches, using a server-side cursor.
+
+    Only ``batch_size`` rows are held in memory at a time. The query runs on a
+    dedicated connection from the engine's pool, inside a read transaction that
+    is closed (along with the cursor) when the results are exhausted or the
+    generator is closed early.
+
+    Args:
+        engine: A SQLAlchemy engine using a PostgreSQL driver.
+        sql: A single SQL query, as a string, file path or psycopg ``SQL`` object.
+        params: Parameters to bind to the query.
+        batch_size: Number of rows to fetch per batch.
+        output: Batch type: ``"tuples"`` (a list of tuples), ``"dicts"`` (a list
+            of dicts) or ``"dataframe"`` (a pandas DataFrame).
+
+    Yields: Batches of rows in the requested format.
+    """
+    if output not in _stream_outputs:
+        raise ValueError(
+            f"Unsupported output type {output!r}; use one of {_stream_outputs}"
+        )
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    queries = _get_queries(sql)
+    if queries is None or len(queries) != 1:
+        raise ValueError("Only a single query can be streamed")
+
+    if output == "dataframe":
+        from pandas import DataFrame
+
+    with engine.connect() as conn:
+        query, sql_text, params = _render_query_text(conn, queries[0], params)
+        sql_text, params = _compile_driver_query(conn, query, sql_text, params)
+
+        driver_conn = conn.connection.driver_connection
+        cursor = driver_conn.cursor(name=f"macrostrat_stream_{next(_cursor_ids)}")
+        try:
+            cursor.execute(sql_text, params)
+            columns = None
+            while rows := cursor.fetchmany(batch_size):
+                if columns is None:
+                    columns = [d[0] for d in cursor.description]
+                if output == "dicts":
+                    yield [dict(zip(columns, row)) for row in rows]
+                elif output == "dataframe":
+                    yield DataFrame.from_records(rows, columns=columns)
+                else:
+                    yield [tuple(row) for row in rows]
+        finally:
+            cursor.close()
+            # End the transaction that holds the cursor's portal
+            conn.rollback()
+
+
+def get_arrow_table(connectable, sql, params=None):
+    """
+    Run a query and load its results into a ``pyarrow.Table``.
+
+    Results are exported with ``COPY (...) TO STDOUT`` and parsed by Arrow's
+    streaming CSV reader as they arrive, which avoids building a Python object
+    for each value or holding the whole export in memory. Every column's type is
+    set from the query's result description, which the server gives for the
+    prepared query without running it: timestamps are read with microsecond
+    precision (``timestamptz`` in UTC), ``numeric`` columns as floats (as by
+    ``pandas.read_sql``), and PostGIS geometry and geography columns as WKB
+    binary. Infinite dates and timestamps are read as nulls. Other types are
+    read as text.
+
+    Requires ``pyarrow`` and ``numpy`` (the ``arrow`` extra).
+
+    Args:
+        connectable: A SQLAlchemy engine, connection or session (the psycopg driver
+            is required).
+        sql: A single SQL query, as a string, file path or psycopg ``SQL`` object.
+        params: Parameters to bind to the query.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    queries = _get_queries(sql)
+    if queries is None or len(queries) != 1:
+        raise ValueError("Only a single query can be exported")
+
+    if isinstance(connectable, Engine):
+        with connectable.connect() as conn:
+            return get_arrow_table(conn, sql, params)
+
+    conn = _get_connection(connectable)
+    if conn.dialect.driver != "psycopg":
+        raise ValueError("The arrow engine requires the psycopg driver")
+    query, sql_text, params = _render_query_text(conn, queries[0], params)
+    sql_text, params = _compile_driver_query(conn, query, sql_text, params)
+    # Bind parameters client-side, as COPY doesn't accept server-side parameters
+    driver_conn = conn.connection.driver_connection
+    bound_text = _bind_client_side(driver_conn, sql_text, params)
+    subquery = SQL(bound_text)
+
+    with driver_conn.cursor() as cursor:
+        columns, oids = _describe(driver_conn, bound_text)
+        type_names = _type_names(cursor, oids)
+
+        if len(set(columns)) != len(columns):
+            raise ValueError("Query results must have unique column names")
+
+        selected = []
+        column_types = {}
+        # Conversions applied to columns after parsing
+        conversions = {}
+        for name, type_name in zip(columns, type_names):
+            col = Identifier("q", name)
+            column_types[name] = pa.string()
+            if type_name in _wkb_types:
+                col = SQL("ST_AsBinary({})").format(col)
+            if type_name in _infinite_types:
+                col = SQL("CASE WHEN isfinite({col}) THEN {col} END").format(col=col)
+            if type_name in _wkb_types or type_name == "bytea":
+                # Exported as hex text
+                conversions[name] = _decode_hex
+            elif type_name == "timestamptz":
+                # Exported in UTC, without an offset
+                col = SQL("{} AT TIME ZONE 'UTC'").format(col)
+                column_types[name] = pa.timestamp("us")
+                conversions[name] = _cast(pa.timestamp("us", tz="UTC"))
+            elif type_name == "timestamp":
+                column_types[name] = pa.timestamp("us")
+            elif type_name == "time":
+                column_types[name] = pa.time64("us")
+            elif type_name in _arrow_types:
+                column_types[name] = getattr(pa, _arrow_types[type_name])()
+            selected.append(SQL("{} AS {}").format(col, Identifier(name)))
+
+        statement = SQL(
+            "COPY (SELECT {columns} FROM ({query}) AS q) TO STDOUT WITH (FORMAT csv)"
+        ).format(columns=SQL(", ").join(selected), query=subquery)
+        with cursor.copy(statement) as copy:
+            stream = _CopyStream(copy)
+            if stream.at_end():
+                # The CSV reader can't parse an empty file
+                table = pa.table(
+                    {c: pa.array([], type=column_types[c]) for c in columns}
+                )
+            else:
+                reader = csv.open_csv(
+                    stream,
+                    read_options=csv.ReadOptions(column_names=columns),
+                    convert_options=csv.ConvertOptions(
+                        column_types=column_types,
+                        # PostgreSQL writes NULLs unquoted, and empty strings quoted
+                        null_values=[""],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                        true_values=["t"],
+                        false_values=["f"],
+                    ),
+                )
+                table = reader.read_all()
+
+    for name, convert in conversions.items():
+        ix = table.column_names.index(name)
+        table = table.set_column(ix, name, convert(table.column(ix)))
+    return table
+
+
+class _CopyStream(RawIOBase):
+    """A readable file over the chunks of a ``COPY ... TO STDOUT``."""
+
+    def __init__(self, copy):
+        self._chunks = iter(copy)
+        self._chunk = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def at_end(self) -> bool:
+        while len(self._chunk) == 0:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return True
+            self._chunk = memoryview(chunk)
+        return False
+
+    def readinto(self, buffer) -> int:
+        # COPY yields a chunk per row, so fill the buffer from as many chunks as
+        # fit, rather than returning short reads
+        size = 0
+        while size < len(buffer) and not self.at_end():
+            n = min(len(buffer) - size, len(self._chunk))
+            buffer[size : size + n] = self._chunk[:n]
+            self._chunk = self._chunk[n:]
+            size += n
+        return size
+
+
+def _bind_client_side(driver_conn, sql_text, params) -> str:
+    from psycopg import ClientCursor
+
+    with ClientCursor(driver_conn) as cursor:
+        return cursor.mogrify(sql_text, params)
+
+
+def _describe(driver_conn, sql_text: str) -> tuple[list[str], list[int]]:
+    """The column names and type OIDs of a query's result, as described by the
+    server for the prepared (but not executed) query."""
+    from psycopg import errors, pq
+
+    encoding = driver_conn.info.encoding
+    pgconn = driver_conn.pgconn
+    for res in (
+        pgconn.prepare(b"", sql_text.encode(encoding)),
+        pgconn.describe_prepared(b""),
+    ):
+        if res.status != pq.ExecStatus.COMMAND_OK:
+            raise errors.error_from_result(res, encoding=encoding)
+    columns = [res.fname(i).decode(encoding) for i in range(res.nfields)]
+    return columns, [res.ftype(i) for i in range(res.nfields)]
+
+
+def _type_names(cursor, oids: Sequence[int]) -> list[str]:
+    res = cursor.execute(
+        "SELECT oid, typname FROM pg_type WHERE oid = ANY(%s)", (list(set(oids)),)
+    )
+    names = dict(res.fetchall())
+    return [names.get(oid) for oid in oids]
+
+
+def _cast(arrow_type):
+    return lambda column: column.cast(arrow_type)
+
+
+def _decode_hex(column):
+    """Decode a column of hex-format ``bytea`` text values (``\\x...``) to binary,
+    without converting values to Python objects."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Map ASCII hex digits to their values
+    digits = np.zeros(256, dtype=np.uint8)
+    for i, c in enumerate(b"0123456789abcdef"):
+        digits[c] = i
+    for i, c in enumerate(b"ABCDEF"):
+        digits[c] = 10 + i
+
+    chunks = []
+    for chunk in column.chunks:
+        if len(chunk) == 0:
+            chunks.append(pa.array([], type=pa.binary()))
+            continue
+        # Strip the ``\x`` prefix (this also copies the chunk to a new array)
+        chunk = pc.utf8_slice_codeunits(chunk, 2)
+        validity, offsets, data = chunk.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int32, count=len(chunk) + 1)
+        # Each value has an even number of digits, so they pair up across values
+        hex_digits = np.frombuffer(data or b"", dtype=np.uint8, count=offsets[-1])
+        nibbles = digits[hex_digits]
+        values = (nibbles[0::2] << 4) | nibbles[1::2]
+        chunks.append(
+            pa.Array.from_buffers(
+                pa.binary(),
+                len(chunk),
+                [validity, pa.py_buffer(offsets // 2), pa.py_buffer(values)],
+                null_count=chunk.null_count,
+            )
+        )
+    return pa.chunked_array(chunks, type=pa.binary())
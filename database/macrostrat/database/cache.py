@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache(object):
+    """
+    A small, thread-safe least-recently-used cache with hit/miss accounting.
+
+    This backs the various in-process caches of the database module (parsed
+    statements, rendered queries, etc.). Besides the number of entries, the
+    cache can be bounded by the total ``weight`` of its entries (e.g. their size
+    in bytes), given when they are added.
+    """
+
+    def __init__(self, maxsize: int = 128, maxweight: Optional[int] = None):
+        if maxsize < 1:
+            raise ValueError("LRUCache maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._weights = {}
+        self._lock = RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, weight: int = 1) -> Any:
+        """Add a value to the cache. Values heavier than ``maxweight`` on their
+        own are not cached."""
+        with self._lock:
+            self._remove(key)
+            if self.maxweight is not None and weight > self.maxweight:
+                return value
+            self._data[key] = value
+            self._weights[key] = weight
+            self.weight += weight
+            self._evict()
+        return value
+
+    def get_or_create(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        weight: int = 1,
+    ) -> Any:
+        """Return the cached value for ``key``, building it with ``factory`` on a miss."""
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.put(key, factory(), weight)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key]
+            self._remove(key)
+            return value
+
+    def resize(self, maxsize: int, maxweight: Optional[int] = None):
+        with self._lock:
+            self.maxsize = maxsize
+            if maxweight is not None:
+                self.maxweight = maxweight
+            self._evict()
+
+    def _remove(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self.weight -= self._weights.pop(key)
+
+    def _evict(self):
+        while len(self._data) > self.maxsize or (
+            self.maxweight is not None and self.weight > self.maxweight
+        ):
+            key, _ = self._data.popitem(last=False)
+            self.weight -= self._weights.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        stats = dict(
+            size=len(self._data),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+        if self.maxweight is not None:
+            stats.update(weight=self.weight, maxweight=self.maxweight)
+        return stats
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
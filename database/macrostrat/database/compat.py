@@ -1,7 +1,23 @@
+import sys
 from warnings import warn
 
 import psycopg.sql as psql3
-import psycopg2.sql as psql2
+
+
+def _legacy_sql_module():
+    """The ``psycopg2.sql`` module, if it has been imported. Legacy objects can't
+    exist otherwise, so psycopg2 is never imported just to check for them."""
+    return sys.modules.get("psycopg2.sql")
+
+
+def is_legacy_composable(obj, *types: str) -> bool:
+    """Check whether an object is a psycopg2 SQL object (optionally, one of the
+    given ``psycopg2.sql`` class names)."""
+    psql2 = _legacy_sql_module()
+    if psql2 is None:
+        return False
+    types = types or ("Composable",)
+    return isinstance(obj, tuple(getattr(psql2, t) for t in types))
 
 
 def update_legacy_identifier(identifier):
@@ -23,6 +39,9 @@ def update_legacy_identifier(identifier):
 
 
 def _map_psycopg2_identifier_to_psycopg3_identifier_internal(identifier):
+    psql2 = _legacy_sql_module()
+    if psql2 is None:
+        return identifier
     if isinstance(identifier, psql2.Identifier):
         return psql3.Identifier(*identifier._wrapped)
     if isinstance(identifier, psql2.SQL):
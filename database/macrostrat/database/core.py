@@ -1,7 +1,7 @@
 import warnings
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Union
+from typing import TYPE_CHECKING, Optional, Union
 
 from psycopg.errors import InvalidSavepointSpecification
 from psycopg.sql import Identifier
@@ -9,20 +9,29 @@ from sqlalchemy import URL, Engine, MetaData, inspect
 from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import Insert
 
 from macrostrat.utils import get_logger
-from .mapper import DatabaseMapper
+from .bulk import copy_in, stream
+from .metrics import DatabaseMetrics, configure_metrics, pool_stats
 from .postgresql import prefix_inserts
-from .query import run_fixtures, run_query, run_sql
+from .prepared import configure_prepared_statements
+from .profiles import PoolProfile, get_pool_profile, pop_profile_overrides
+from .query import run_fixtures, run_many, run_query, run_sql
+from .result_cache import ResultCache, run_cached_query
 from .utils import (
     create_engine,
     get_dataframe,
     get_or_create,
     reflect_table,
+    register_geometry_types,
     DatabaseInput,
 )
 
+if TYPE_CHECKING:
+    from .mapper import DatabaseMapper
+
 metadata = MetaData()
 
 log = get_logger(__name__)
@@ -51,10 +60,12 @@ def _model_key(schema, table_name):
 
 
 class Database(object):
-    mapper: Optional[DatabaseMapper] = None
+    mapper: Optional["DatabaseMapper"] = None
     metadata: MetaData
     session: Session
     instance_params: dict
+    profile: PoolProfile
+    metrics: Optional[DatabaseMetrics] = None
 
     __inspector__ = None
 
@@ -72,16 +83,81 @@ class Database(object):
                 console. Default is False.
             instance_params (dict): Parameters to
                 pass to queries and other database operations.
+            profile (str | PoolProfile): Connection pool profile (``"web"``,
+                ``"worker"``, ``"cli"`` or ``"pgbouncer"``) setting the pool
+                size, recycling, pre-ping, statement timeout, prepared-statement
+                policy and application name. Any profile field (e.g.
+                ``pool_size`` or ``statement_timeout``) can be passed as a
+                keyword argument to override it. The resolved profile is
+                available as ``Database.profile``. Pool and connection settings
+                can't be applied to an existing engine, so only the
+                prepared-statement policy may differ from the default profile
+                when ``db_conn`` is an ``Engine``.
+            connect_args (dict): Arguments passed to the driver's ``connect``.
+                ``options`` are appended to the profile's (e.g. its statement
+                timeout), and other arguments override the profile's.
+            prepare_threshold (int | None): Number of executions of a query on a
+                connection after which psycopg prepares it on the server
+                (default 5). Set to None to disable prepared statements, e.g.
+                when connecting through PgBouncer in transaction pooling mode.
+            prepared_max (int): Maximum number of prepared statements kept per
+                connection (default 100).
+            track_prepared_statements (bool): If True, estimate prepared
+                statement reuse (reported by ``prepared_statement_stats()``).
+                Default is False.
+            result_cache (ResultCache): Cache for ``run_query(..., cache=ttl)``
+                results. By default, each database gets its own cache; a cache
+                can be shared between databases.
+            metrics (bool | dict): If True, collect pool and query metrics
+                (reported by ``stats()``). A dict is passed as keyword arguments
+                to ``configure_metrics``. Default is False.
         """
 
         compiles(Insert, "postgresql")(prefix_inserts)
+        # PostGIS types must be registered before tables are reflected, including
+        # by callers that reflect with the engine directly
+        register_geometry_types()
 
         self.instance_params = kwargs.pop("instance_params", {})
+        result_cache = kwargs.pop("result_cache", None)
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        metrics = kwargs.pop("metrics", False)
+        track_prepared_statements = kwargs.pop("track_prepared_statements", False)
+        profile = kwargs.pop("profile", None)
+        self.profile = get_pool_profile(profile, **pop_profile_overrides(kwargs))
 
         if echo_sql:
             kwargs["echo"] = True
 
-        self.engine = create_engine(db_conn, **kwargs)
+        engine_kwargs = self.profile.engine_kwargs()
+        if engine_kwargs and isinstance(db_conn, (Engine, Database)):
+            raise ValueError(
+                f"The settings of pool profile {self.profile.name!r} can't be "
+                "applied to an existing engine; pass a database URL instead"
+            )
+        connect_args = engine_kwargs.pop("connect_args", {})
+        user_connect_args = dict(kwargs.pop("connect_args", {}))
+        if "options" in connect_args and "options" in user_connect_args:
+            # Later options take precedence
+            user_connect_args["options"] = " ".join(
+                (connect_args["options"], user_connect_args["options"])
+            )
+        connect_args.update(user_connect_args)
+        if connect_args:
+            engine_kwargs["connect_args"] = connect_args
+        engine_kwargs.update(kwargs)
+
+        self.engine = create_engine(db_conn, **engine_kwargs)
+        self._prepared_statements = configure_prepared_statements(
+            self.engine,
+            self.profile.prepare_threshold,
+            self.profile.prepared_max,
+            track=track_prepared_statements,
+        )
+        if metrics:
+            if metrics is True:
+                metrics = {}
+            self.metrics = configure_metrics(self.engine, **metrics)
 
         self.metadata = kwargs.get("metadata", metadata)
 
@@ -100,10 +176,59 @@ class Database(object):
         metadata.create_all(bind=self.engine)
 
     def automap(self, **kwargs):
+        """Reflect the database and map its tables to models.
+
+        Keyword Args:
+            schemas (list[str]): Schemas to reflect (default ``["public"]``).
+            cache_file (str | Path): File in which to cache reflected models.
+                Only schemas that changed since they were cached are
+                reflected again.
+            use_cache (bool): If False, ignore the cache file.
+            max_workers (int): Reflect up to this many schemas concurrently,
+                on separate pooled connections.
+            lazy (bool): If True, tables are reflected but only mapped to models
+                on first access (e.g. ``db.model.my_table`` or ``get_model``),
+                along with the tables they reference. This avoids building
+                classes and relationships for tables that are never used.
+            relationships (str | dict): Relationships to generate between
+                models: ``"all"`` (default), ``"scalar"`` (many-to-one only,
+                without backrefs) or ``"none"``. A dict sets the mode by schema,
+                e.g. ``{"macrostrat": "scalar", "*": "none"}``.
+        """
+        from .mapper import DatabaseMapper
+
         log.info("Automapping the database")
-        self.mapper = DatabaseMapper(self)
+        mapper_kwargs = dict(
+            cache_file=kwargs.pop("cache_file", None),
+            lazy=kwargs.pop("lazy", False),
+            relationships=kwargs.pop("relationships", "all"),
+        )
+        self.mapper = DatabaseMapper(self, **mapper_kwargs)
         self.mapper.reflect_database(**kwargs)
 
+    def prepared_statement_stats(self) -> Optional[dict]:
+        """Estimated server-side prepared statement usage for this database's
+        connections: executions, hits (executions that reused a prepared
+        statement), prepares and hit rate. None unless the database was created
+        with ``track_prepared_statements=True``, or if prepared statements are
+        disabled or not supported by the driver."""
+        if self._prepared_statements is None:
+            return None
+        return self._prepared_statements.stats()
+
+    def stats(self) -> dict:
+        """Pool occupancy, the pool profile, prepared statement and result cache
+        statistics, and (if enabled) connection and query metrics."""
+        res = dict(
+            profile=self.profile.name,
+            pool=pool_stats(self.engine),
+            prepared_statements=self.prepared_statement_stats(),
+            result_cache=self.result_cache.stats(),
+        )
+        if self.metrics is not None:
+            res["metrics"] = self.metrics.stats()
+        return res
+
     def get_server_version(self):
         with self.engine.connect():
             return self.engine.dialect.server_version_info
@@ -147,6 +272,15 @@ class Database(object):
         Keyword Args:
             use_instance_params (bool): If True, will use the instance_params set on
                 the Database object. Default is True.
+            pipeline (bool): If True, send statements in batches using psycopg's
+                pipeline mode to avoid a network round trip per statement.
+            batch (bool): If True, send statements without bind parameters as
+                multi-statement scripts, in a single round trip.
+            single_transaction (bool): If True, run all statements in one
+                transaction, using a savepoint per statement to tolerate errors.
+            on_statement (Callable): Called with a ``StatementRecord`` after each
+                statement is executed.
+            report (ExecutionReport): Collects a record of each executed statement.
 
         Returns: Iterator of results from the query.
         """
@@ -163,10 +297,98 @@ class Database(object):
         Keyword Args:
             use_instance_params (bool): If True, will use the instance_params set on
                 the Database object. Default is True.
+            many (bool): If True, treat ``params`` as an iterable of parameter sets
+                and execute them in batches (see ``run_many``).
+            cache (float): Cache the result of a read-only query for this many
+                seconds in ``result_cache``, keyed on the rendered SQL and
+                parameters. Only plain ``SELECT`` queries run outside of a
+                transaction are cached; other statements always run.
+            cache_tags (list[str]): Tables read by the query, whose changes
+                invalidate the cached result (inferred from the query by default).
+                Queries on views should list the view's base tables.
         """
+        if kwargs.pop("many", False):
+            return self.run_many(sql, params, **kwargs)
         params = self._setup_params(params, kwargs)
+        ttl = kwargs.pop("cache", None)
+        tags = kwargs.pop("cache_tags", None)
+        if ttl is not None:
+            return run_cached_query(
+                self.session,
+                self.result_cache,
+                sql,
+                params,
+                ttl=ttl,
+                tags=tags,
+                **kwargs,
+            )
         return run_query(self.session, sql, params, **kwargs)
 
+    def run_many(self, sql, params, *, batch_size=1000, **kwargs) -> int:
+        """Execute a single statement for each of an iterable of parameter sets,
+        in batches using the driver's executemany support.
+
+        Args:
+            sql (str): SQL statement to execute.
+            params (Iterable[dict]): Parameter sets, consumed lazily.
+            batch_size (int): Number of parameter sets to send per batch.
+
+        Keyword Args:
+            use_instance_params (bool): If True, will use the instance_params set on
+                the Database object. Default is True.
+
+        Returns: Total number of rows affected.
+        """
+        if kwargs.pop("use_instance_params", True) and self.instance_params:
+            params = (dict(p, **self.instance_params) for p in params)
+        return run_many(self.session, sql, params, batch_size=batch_size, **kwargs)
+
+    def copy_in(self, table, data, *, columns=None, format="binary", **kwargs):
+        """Bulk-load rows into a table using PostgreSQL's ``COPY ... FROM STDIN``.
+
+        This is typically much faster than inserting rows individually. Input is
+        streamed, so large iterators and files are loaded with bounded memory.
+
+        Args:
+            table (str|tuple|Table): Table name (resolved with ``get_table``) or Table object.
+            data: Iterable of row tuples or dicts, a pandas DataFrame, or a path or
+                file handle containing data in the given format.
+            columns (list[str]): Columns to load. Defaults to the DataFrame's columns
+                or all of the table's columns.
+            format (str): ``"binary"`` (default) or ``"csv"``.
+
+        Returns: A ``CopyStats`` object with row count and throughput.
+        """
+        if not isinstance(table, Table):
+            table = self.get_table(table)
+        return copy_in(
+            self.session, table, data, columns=columns, format=format, **kwargs
+        )
+
+    def stream(self, sql, params=None, *, batch_size=10000, output="tuples", **kwargs):
+        """Stream the results of a query in batches using a server-side cursor.
+
+        Unlike ``run_query``, results are not buffered on the client, so very large
+        result sets can be processed with constant memory. The query runs on a
+        dedicated connection, outside of the current session.
+
+        Args:
+            sql (str): SQL file or query to execute.
+            params (dict): Parameters to pass to the query.
+            batch_size (int): Number of rows to fetch per batch.
+            output (str): ``"tuples"`` (default), ``"dicts"`` or ``"dataframe"``.
+
+        Keyword Args:
+            use_instance_params (bool): If True, will use the instance_params set on
+                the Database object. Default is True.
+
+        Returns: A generator of row batches. Closing it early releases the cursor.
+        """
+        params = self._setup_params(params, kwargs)
+        return stream(
+            self.engine, sql, params, batch_size=batch_size, output=output, **kwargs
+        )
+
     def run_fixtures(self, fixtures: Union[Path, list[Path]], params=None, **kwargs):
         """Run a set of fixtures on the database object.
 
@@ -177,6 +399,24 @@ class Database(object):
         Keyword Args:
             use_instance_params (bool): If True, will use the instance_params set on
                 the Database object. Default is True.
+            parallel (int): Run up to this many fixture files concurrently, in stages
+                determined by ``-- depends-on:`` headers. Files without them
+                keep their place in name order.
+            stage_by_directory (bool): With ``parallel``, run files without
+                dependency declarations concurrently within each directory.
+            single_transaction (bool): Run each fixture file in one transaction,
+                using a savepoint per statement to tolerate errors.
+            on_statement (Callable): Called with a ``StatementRecord`` after each
+                statement is executed.
+            slowest (int): Print the N slowest statements after all fixtures run.
+            incremental (bool): Skip files whose contents and parameters are
+                unchanged since they were last applied, as recorded in a ledger
+                table (``macrostrat_meta.applied_fixtures`` by default).
+            force (list[str]): Glob patterns for files to re-run in incremental mode.
+            ledger_root (Path): Directory that files are recorded relative to in
+                incremental mode. Defaults to the fixture directory.
+
+        Returns: An ``ExecutionReport`` with a record of each executed statement.
         """
         params = self._setup_params(params, kwargs)
         return run_fixtures(self.session, fixtures, params, **kwargs)
@@ -206,9 +446,15 @@ class Database(object):
         )
         return self.run_sql(sql, params, **kwargs)
 
-    def get_dataframe(self, *args):
-        """Returns a Pandas DataFrame from a SQL query"""
-        return get_dataframe(self.engine, *args)
+    def get_dataframe(self, *args, **kwargs):
+        """Returns a Pandas DataFrame from a SQL query.
+
+        Keyword Args:
+            engine (str): ``"pandas"`` (default) to load results with
+                ``pandas.read_sql``, or ``"arrow"`` to use a faster columnar path
+                based on ``COPY`` and ``pyarrow`` (the ``arrow`` extra).
+        """
+        return get_dataframe(self.engine, *args, **kwargs)
 
     @property
     def inspector(self):
@@ -411,6 +657,44 @@ class Database(object):
         self._table_cache[cache_key] = tbl
         return tbl
 
+    def preload_tables(self, schema=None, names=None, *, views=True):
+        """Reflect many tables at once and cache them for ``get_table``.
+
+        Tables are reflected with ``MetaData.reflect``, which reads the columns,
+        constraints and indexes of all tables in a schema with a few batched
+        catalog queries, rather than several queries per table. Tables that are
+        already cached are kept. Tables referenced by foreign keys are reflected
+        (and cached) as well.
+
+        Args:
+            schema: Schema to reflect (default ``"public"``).
+            names: Names of the tables to reflect (default: all tables in the
+                schema).
+            views: If True, views are reflected as well.
+
+        Returns: A dict of the schema's cached tables, keyed by name.
+        """
+        schema_ = schema or "public"
+        if names is not None:
+            names = [n for n in names if (schema_, n) not in self._table_cache]
+
+        if names is None or len(names) > 0:
+            meta = MetaData()
+            # "public" → None matches how get_table and automap store tables
+            reflect_schema = None if schema_ == "public" else schema_
+            meta.reflect(
+                bind=self.engine, schema=reflect_schema, only=names, views=views
+            )
+            for tbl in meta.tables.values():
+                cache_key = (tbl.schema or "public", tbl.name)
+                self._table_cache.setdefault(cache_key, tbl)
+
+        return {
+            name: tbl
+            for (_schema, name), tbl in self._table_cache.items()
+            if _schema == schema_
+        }
+
     def get_model(self, name, *, schema=None, automap=True):
         """Return the ORM model class for a table.
 
@@ -460,6 +744,8 @@ class Database(object):
 
     # Destroy engine on cleanup
     def cleanup(self):
+        if getattr(self, "result_cache", None) is not None:
+            self.result_cache.stop()
         try:
             self.session.close()
         except OperationalError:
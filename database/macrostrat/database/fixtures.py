@@ -0,0 +1,343 @@
+"""
+Planning and concurrent execution of SQL fixture files.
+
+Fixtures are grouped into *stages*: every file in a stage can run concurrently,
+and stages run one after another. Stages are derived from dependency
+declarations in file headers, e.g.::
+
+    -- depends-on: 01-schema.sql, functions/utils.sql
+
+where paths are relative to the declaring file. Files without declarations
+depend on the file before them in name order, so they run in the same order
+as without ``parallel``. If grouping by directory is requested, they instead
+depend on the files of the previous directory, so that the files in each
+directory can run concurrently.
+
+For incremental runs, a ledger table records the content and parameter hashes
+of applied fixtures, so that unchanged files can be skipped.
+"""
+
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from hashlib import sha256
+from os import path
+from pathlib import Path
+from typing import Optional, Sequence
+
+from click import style
+from psycopg.sql import Identifier
+from sqlalchemy.engine import Engine
+
+from macrostrat.utils import get_logger
+
+from .output import MemorySink, OutputSink, _is_already_exists_error
+from .query import _get_engine, run_sql, run_sql_file
+
+log = get_logger(__name__)
+
+_depends_on = re.compile(r"^--\s*depends-on:\s*(.*)$", re.IGNORECASE)
+
+
+class FixtureError(Exception):
+    """Raised when one or more fixture files fail to run."""
+
+    def __init__(self, failures: list["FixtureFailure"]):
+        self.failures = failures
+        files = ", ".join(str(f.file) for f in failures)
+        super().__init__(f"{len(failures)} fixture file(s) failed: {files}")
+
+
+@dataclass
+class FixtureFailure:
+    """A fixture file that encountered errors."""
+
+    file: Path
+    errors: list[Exception]
+    # Set if the error stopped execution of the file
+    fatal: bool = False
+
+
+def read_dependencies(fixture: Path) -> list[Path]:
+    """Read the ``-- depends-on:`` declarations from a fixture file's header
+    (the comment lines and blank lines before the first statement)."""
+    deps = []
+    with fixture.open() as f:
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            if not line.startswith("--"):
+                break
+            match = _depends_on.match(line)
+            if match is None:
+                continue
+            for name in re.split(r"[,\s]+", match.group(1).strip()):
+                if name != "":
+                    deps.append(fixture.parent / name)
+    return deps
+
+
+def plan_stages(files: list[Path], by_directory: bool = False) -> list[list[Path]]:
+    """Group fixture files into stages that can each be run concurrently.
+
+    Files without ``-- depends-on:`` declarations depend on the file before them
+    (so they run in the given order), or with ``by_directory``, on the files of
+    the previous directory.
+    """
+    if by_directory:
+        groups = _directory_groups(files)
+        previous = {
+            f: prev for prev, group in zip([[], *groups], groups) for f in group
+        }
+    else:
+        previous = {f: [prev] for prev, f in zip(files, files[1:])}
+    dependencies = {}
+    for fixture in files:
+        deps = read_dependencies(fixture)
+        dependencies[fixture] = deps if len(deps) > 0 else previous.get(fixture, [])
+    return _dependency_stages(dependencies)
+
+
+def _directory_groups(files: list[Path]) -> list[list[Path]]:
+    groups = {}
+    for fixture in files:
+        groups.setdefault(fixture.parent, []).append(fixture)
+    return [groups[k] for k in sorted(groups)]
+
+
+def _dependency_stages(dependencies: dict[Path, list[Path]]) -> list[list[Path]]:
+    """Topologically sort files into levels, preserving the input order within
+    each level."""
+    resolved = {_normalize(f): f for f in dependencies}
+    remaining = {}
+    for fixture, deps in dependencies.items():
+        remaining[fixture] = set()
+        for dep in deps:
+            key = _normalize(dep)
+            if key not in resolved:
+                log.warning(
+                    "Dependency %s of fixture %s is not being run; ignoring",
+                    dep,
+                    fixture,
+                )
+                continue
+            remaining[fixture].add(resolved[key])
+
+    stages = []
+    done = set()
+    while len(remaining) > 0:
+        stage = [f for f, deps in remaining.items() if deps <= done]
+        if len(stage) == 0:
+            cycle = ", ".join(str(f) for f in remaining)
+            raise ValueError(f"Circular fixture dependencies among: {cycle}")
+        for fixture in stage:
+            del remaining[fixture]
+        done.update(stage)
+        stages.append(stage)
+    return stages
+
+
+def _normalize(fixture: Path) -> str:
+    return path.normpath(path.abspath(fixture))
+
+
+def _run_fixture(engine: Engine, fixture: Path, params, kwargs):
+    """Run a single fixture on its own pooled connection, buffering its output."""
+    output = MemorySink()
+    errors = []
+    on_error = kwargs.pop("on_error", None)
+
+    def _on_error(ctx, err, connectable):
+        recovery = None
+        if on_error is not None:
+            recovery = on_error(ctx, err, connectable)
+        if recovery is None and not _is_already_exists_error(err):
+            errors.append(err)
+        return recovery
+
+    failure = None
+    try:
+        with engine.connect() as conn:
+            run_sql_file(
+                conn, fixture, params, output_file=output, on_error=_on_error, **kwargs
+            )
+    except Exception as err:
+        if err not in errors:
+            errors.append(err)
+        failure = FixtureFailure(fixture, errors, fatal=True)
+    if failure is None and len(errors) > 0:
+        failure = FixtureFailure(fixture, errors)
+    return output, failure
+
+
+def run_fixtures_parallel(
+    connectable,
+    files: list[Path],
+    params=None,
+    *,
+    parallel: int,
+    output: OutputSink,
+    prefix: Optional[str] = None,
+    stage_by_directory: bool = False,
+    **kwargs,
+) -> list[FixtureFailure]:
+    """
+    Run fixture files in dependency-ordered stages, with up to ``parallel``
+    files of each stage running concurrently on separate pooled connections.
+    Files without dependency declarations run sequentially, or concurrently
+    within each directory if ``stage_by_directory`` is set.
+
+    Each file's output is collected and sent to ``output`` as a block once its
+    stage finishes. Statement errors are collected per file; if a file fails to run
+    to completion (e.g. with ``raise_errors=True``), later stages are not run
+    and a ``FixtureError`` is raised.
+
+    Returns: A list of files that encountered (non-fatal) statement errors.
+    """
+    engine = _get_engine(connectable)
+    stages = plan_stages(files, by_directory=stage_by_directory)
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        for i, stage in enumerate(stages):
+            output.message(
+                style(f"Stage {i + 1}/{len(stages)}: {len(stage)} file(s)", dim=True)
+            )
+            futures = [
+                executor.submit(_run_fixture, engine, f, params, dict(kwargs))
+                for f in stage
+            ]
+            for fixture, future in zip(stage, futures):
+                events, failure = future.result()
+                fn = fixture if prefix is None else fixture.relative_to(prefix)
+                output.message(style(str(fn), fg="cyan", bold=True))
+                events.replay(output)
+                output.message("")
+                if failure is not None:
+                    failures.append(failure)
+
+            if any(f.fatal for f in failures):
+                break
+
+    for failure in failures:
+        output.message(
+            style(f"Errors in {failure.file}:", fg="red", bold=True)
+            + f" {len(failure.errors)} error(s)"
+        )
+    if any(f.fatal for f in failures):
+        raise FixtureError(failures)
+    return failures
+
+
+class FixtureLedger(object):
+    """
+    Records the fixture files applied to a database, with hashes of their
+    contents and parameters, in a ledger table (by default
+    ``macrostrat_meta.applied_fixtures``). Files are identified by their path
+    relative to a root directory (the fixture directory passed to
+    ``run_fixtures``), which doesn't change when only some of its files are run.
+    """
+
+    def __init__(
+        self,
+        connectable,
+        root: Path,
+        params=None,
+        *,
+        table: str = "macrostrat_meta.applied_fixtures",
+    ):
+        self.connectable = connectable
+        self.root = Path(root) if Path(root).is_dir() else Path(root).parent
+        self.params_hash = _params_hash(params)
+        schema, _, name = table.rpartition(".")
+        self._params = dict(
+            schema=Identifier(schema or "public"),
+            table=Identifier(schema or "public", name),
+        )
+        self._content_hashes = {}
+
+    def _run(self, sql, params=None):
+        params = dict(self._params, **(params or {}))
+        # Consume all results, so the statement is committed
+        (res,) = run_sql(
+            self.connectable, sql, params, output_mode="none", raise_errors=True
+        )
+        return res
+
+    def setup(self):
+        """Create the ledger table if it doesn't exist."""
+        self._run("CREATE SCHEMA IF NOT EXISTS {schema}")
+        self._run("""
+            CREATE TABLE IF NOT EXISTS {table} (
+              path text PRIMARY KEY,
+              content_hash text NOT NULL,
+              params_hash text NOT NULL,
+              applied_at timestamptz NOT NULL DEFAULT now()
+            )
+            """)
+
+    def key(self, fixture: Path) -> str:
+        return fixture.absolute().relative_to(self.root.absolute()).as_posix()
+
+    def applied(self) -> dict[str, tuple[str, str]]:
+        """Content and parameter hashes of applied fixtures, by path."""
+        res = self._run("SELECT path, content_hash, params_hash FROM {table}")
+        return {path: (content, params) for path, content, params in res}
+
+    def plan(
+        self, files: list[Path], force: Optional[Sequence[str]] = None
+    ) -> tuple[list[Path], list[Path]]:
+        """Split fixture files into those that need to be run and those that are
+        unchanged since they were last applied.
+
+        Args:
+            files: Fixture files.
+            force: Glob patterns (matched against the relative path or file name)
+                for files that should be run even if unchanged.
+        """
+        self.setup()
+        applied = self.applied()
+        to_run = []
+        skipped = []
+        for fixture in files:
+            key = self.key(fixture)
+            content_hash = sha256(fixture.read_bytes()).hexdigest()
+            self._content_hashes[fixture] = content_hash
+            forced = any(
+                fnmatch(key, p) or fnmatch(fixture.name, p) for p in force or []
+            )
+            if not forced and applied.get(key) == (content_hash, self.params_hash):
+                skipped.append(fixture)
+            else:
+                to_run.append(fixture)
+        return to_run, skipped
+
+    def record(self, fixture: Path):
+        """Record that a fixture file was applied."""
+        content_hash = self._content_hashes.get(fixture)
+        if content_hash is None:
+            content_hash = sha256(fixture.read_bytes()).hexdigest()
+        self._run(
+            """
+            INSERT INTO {table} (path, content_hash, params_hash)
+            VALUES (:path, :content_hash, :params_hash)
+            ON CONFLICT (path) DO UPDATE SET
+              content_hash = EXCLUDED.content_hash,
+              params_hash = EXCLUDED.params_hash,
+              applied_at = now()
+            """,
+            dict(
+                path=self.key(fixture),
+                content_hash=content_hash,
+                params_hash=self.params_hash,
+            ),
+        )
+
+
+def _params_hash(params) -> str:
+    # psycopg SQL objects (e.g. Identifier) are hashed by their repr
+    text = json.dumps(params or {}, sort_keys=True, default=repr)
+    return sha256(text.encode()).hexdigest()
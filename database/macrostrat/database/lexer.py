@@ -0,0 +1,244 @@
+"""
+A single-pass, streaming splitter for PostgreSQL scripts.
+
+This replaces the general-purpose (and comparatively slow) ``sqlparse`` splitter
+for our use case: we only need statement boundaries and comment stripping, so
+the lexer tracks just enough state to find semicolons that are not part of
+string literals, quoted identifiers, dollar-quoted bodies, comments, SQL-standard
+``BEGIN ATOMIC ... END`` function bodies or ``COPY ... FROM stdin`` data blocks.
+
+Input is consumed line by line, so scripts can be split lazily from an open
+file handle without holding the whole file in memory. ``COPY`` data blocks are
+read in chunks as they are consumed.
+"""
+
+import re
+from io import StringIO
+from typing import IO, Iterable, Iterator, Union
+
+# Approximate size of the chunks in which COPY data blocks are yielded
+copy_chunk_size = 2**16
+
+__all__ = ["CopyFromStdin", "split_statements"]
+
+
+class CopyFromStdin(str):
+    """A ``COPY ... FROM stdin`` statement, carrying the inline data block that
+    followed it in the script (as written by ``pg_dump`` in plain format).
+
+    The data block is read lazily from the script by :meth:`iter_data`, and can
+    be consumed only once. If the splitter moves on to the next statement
+    first, the rest of the block is buffered in memory.
+    """
+
+    def __new__(cls, statement: str, data: Union[str, Iterable[str]] = ""):
+        obj = super().__new__(cls, statement)
+        obj._chunks = iter([data] if isinstance(data, str) else data)
+        return obj
+
+    def iter_data(self) -> Iterator[str]:
+        """Yield the data block in chunks, as it is read from the script."""
+        yield from self._chunks
+
+    @property
+    def data(self) -> str:
+        """The (remaining) data block, as one string."""
+        return "".join(self.iter_data())
+
+    def _buffer(self):
+        self._chunks = iter(list(self._chunks))
+
+
+def _copy_data(lines: Iterator[str]) -> Iterator[str]:
+    """Read a COPY data block from ``lines``, up to its terminating ``\\.``."""
+    chunk = []
+    size = 0
+    for line in lines:
+        if line.rstrip("\r\n") == "\\.":
+            break
+        chunk.append(line)
+        size += len(line)
+        if size >= copy_chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+# Tokens that change the lexer state (or end a statement) in plain SQL text
+_normal_tokens = re.compile(
+    r"""
+    ;
+    | --
+    | /\*
+    | (?<![\w$])[Ee]'
+    | '
+    | "
+    | (?<![\w$])\$(?:[^\W\d]\w*)?\$
+    | (?=[BbCcEe])(?<![\w$])(?i:BEGIN\s+ATOMIC|CASE|END)(?![\w$])
+    """,
+    re.VERBOSE,
+)
+_block_comment_tokens = re.compile(r"/\*|\*/")
+_escape_string_tokens = re.compile(r"[\\']")
+_copy_from_stdin = re.compile(
+    r"^\s*COPY\b.*\bFROM\s+STDIN\b", re.IGNORECASE | re.DOTALL
+)
+
+_NORMAL = 0
+_SINGLE_QUOTE = 1
+_ESCAPE_STRING = 2
+_DOUBLE_QUOTE = 3
+_DOLLAR_QUOTE = 4
+_BLOCK_COMMENT = 5
+
+
+def _iter_lines(source: Union[str, IO, Iterable[str]]) -> Iterator[str]:
+    if isinstance(source, str):
+        source = StringIO(source)
+    yield from source
+
+
+def split_statements(source: Union[str, IO, Iterable[str]]) -> Iterator[str]:
+    """Lazily split a PostgreSQL script into statements.
+
+    Comments are stripped, and statements are yielded without surrounding
+    whitespace or their terminating semicolon. ``COPY ... FROM stdin`` statements
+    are yielded as :class:`CopyFromStdin` objects holding their data block.
+    Semicolons inside ``BEGIN ATOMIC ... END`` function bodies (including
+    nested ``CASE ... END`` expressions) don't end the statement.
+    psql meta-commands (lines starting with a backslash between statements)
+    are skipped.
+
+    Args:
+        source: SQL text, an open text file handle, or any iterable of lines.
+    """
+    state = _NORMAL
+    buffer = []
+    # Nesting depth for block comments, or the closing tag for dollar quotes
+    depth = 0
+    tag = None
+    # Nesting depth of BEGIN ATOMIC (and CASE expressions within it)
+    atomic_depth = 0
+
+    lines = _iter_lines(source)
+    for line in lines:
+        if state == _NORMAL and line.lstrip().startswith("\\"):
+            if "".join(buffer).strip() == "":
+                # A psql meta-command (e.g. \connect); not SQL
+                continue
+
+        pos = 0
+        end = len(line)
+        while pos < end:
+            if state == _NORMAL:
+                match = _normal_tokens.search(line, pos)
+                if match is None:
+                    buffer.append(line[pos:])
+                    break
+                token = match.group()
+                buffer.append(line[pos : match.start()])
+                pos = match.end()
+                if token == ";":
+                    if atomic_depth > 0:
+                        buffer.append(token)
+                        continue
+                    statement = "".join(buffer).strip()
+                    buffer = []
+                    if statement == "":
+                        continue
+                    if _copy_from_stdin.match(statement):
+                        # Data starts on the line following the statement
+                        copy = CopyFromStdin(statement, _copy_data(lines))
+                        yield copy
+                        # Skip past any data that wasn't consumed
+                        copy._buffer()
+                        break
+                    yield statement
+                elif token == "--":
+                    if line.endswith("\n"):
+                        buffer.append("\n")
+                    break
+                elif token == "/*":
+                    # Replace the comment with whitespace so tokens aren't joined
+                    buffer.append(" ")
+                    depth = 1
+                    state = _BLOCK_COMMENT
+                elif token[0] in "BbCcEe" and token[-1] not in "'":
+                    buffer.append(token)
+                    keyword = token[0].upper()
+                    if keyword == "B":
+                        atomic_depth += 1
+                    elif atomic_depth > 0:
+                        # CASE expressions are only tracked inside BEGIN ATOMIC,
+                        # since END is also a statement on its own
+                        atomic_depth += 1 if keyword == "C" else -1
+                else:
+                    buffer.append(token)
+                    if token == "'":
+                        state = _SINGLE_QUOTE
+                    elif token == '"':
+                        state = _DOUBLE_QUOTE
+                    elif token.endswith("'"):
+                        state = _ESCAPE_STRING
+                    else:
+                        tag = token
+                        state = _DOLLAR_QUOTE
+
+            elif state == _BLOCK_COMMENT:
+                match = _block_comment_tokens.search(line, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                depth += 1 if match.group() == "/*" else -1
+                if depth == 0:
+                    state = _NORMAL
+
+            elif state == _DOLLAR_QUOTE:
+                ix = line.find(tag, pos)
+                if ix == -1:
+                    buffer.append(line[pos:])
+                    break
+                buffer.append(line[pos : ix + len(tag)])
+                pos = ix + len(tag)
+                state = _NORMAL
+
+            elif state == _ESCAPE_STRING:
+                match = _escape_string_tokens.search(line, pos)
+                if match is None:
+                    buffer.append(line[pos:])
+                    break
+                ix = match.start()
+                if match.group() == "\\":
+                    # Skip the escaped character
+                    buffer.append(line[pos : ix + 2])
+                    pos = ix + 2
+                    continue
+                buffer.append(line[pos : ix + 1])
+                pos = ix + 1
+                if line.startswith("'", pos):
+                    # Doubled quote inside the string
+                    buffer.append("'")
+                    pos += 1
+                else:
+                    state = _NORMAL
+
+            else:
+                # Standard string literals and quoted identifiers
+                quote = "'" if state == _SINGLE_QUOTE else '"'
+                ix = line.find(quote, pos)
+                if ix == -1:
+                    buffer.append(line[pos:])
+                    break
+                buffer.append(line[pos : ix + 1])
+                pos = ix + 1
+                if line.startswith(quote, pos):
+                    buffer.append(quote)
+                    pos += 1
+                else:
+                    state = _NORMAL
+
+    statement = "".join(buffer).strip()
+    if statement != "":
+        yield statement
@@ -2,17 +2,21 @@ from warnings import warn
 
 # Drag in geographic types for database reflection
 from geoalchemy2 import Geography, Geometry
+from sqlalchemy import MetaData
 from sqlalchemy.ext.automap import generate_relationship
+from sqlalchemy.orm import backref, interfaces, relationship
 
 from macrostrat.database.utils import reflect_table
 from macrostrat.utils.logs import get_logger
 
 from .cache import DatabaseModelCache
+from .reflection import merge_schemas, reflect_schemas
 from .utils import (
     ModelCollection,
     TableCollection,
     _classname_for_table,
     classname_for_table,
+    filter_relationships,
     name_for_collection_relationship,
     name_for_scalar_relationship,
 )
@@ -34,13 +38,34 @@ class DatabaseMapper:
     _models = None
     _tables = None
     _reflected_schemas: set
+    lazy = False
 
     def __init__(self, db, **kwargs):
+        """
+        Keyword Args:
+            cache_file (str | Path): File in which to cache reflected models.
+                Cached schemas are validated against a fingerprint of the
+                database catalog, and reflected again if they changed.
+            lazy (bool): If True, reflected tables are only mapped to models
+                when first accessed (along with the tables they reference).
+            relationships (str | dict): Relationships to generate between
+                models: ``"all"`` (default), ``"scalar"`` (many-to-one only) or
+                ``"none"``, or a dict of modes by schema (see
+                ``filter_relationships``).
+        """
         # https://docs.sqlalchemy.org/en/13/orm/extensions/automap.html#sqlalchemy.ext.automap.AutomapBase.prepare
         # TODO: add the process flow described below:
         # https://docs.sqlalchemy.org/en/13/orm/extensions/automap.html#generating-mappings-from-an-existing-metadata
         self.db = db
 
+        self.lazy = kwargs.get("lazy", False)
+        cache_file = kwargs.get("cache_file")
+        relationships = kwargs.get("relationships", "all")
+        # Models with cached tables or without the full set of relationships
+        # get their own base, rather than sharing the default one
+        if cache_file is not None or relationships != "all":
+            self.automap_base = DatabaseModelCache(cache_file).automap_base()
+
         # This stuff should be placed outside of core (one likely extension point).
         self.reflection_kwargs = dict(
             name_for_scalar_relationship=kwargs.get(
@@ -50,47 +75,189 @@ class DatabaseMapper:
                 "name_for_collection_relationship", name_for_collection_relationship
             ),
             classname_for_table=kwargs.get("classname_for_table", _classname_for_table),
-            generate_relationship=kwargs.get(
-                "generate_relationship", generate_relationship
+            generate_relationship=filter_relationships(
+                kwargs.get("generate_relationship", generate_relationship),
+                relationships,
             ),
         )
 
-        self._models = ModelCollection(self.automap_base.classes)
+        # Reflected tables that can be mapped on first access (in lazy mode)
+        self._lazy_metadata = MetaData()
+        self._lazy_tables = {}
+
+        self._models = self._model_collection()
         self._tables = TableCollection(self._models)
         self._reflected_schemas = set()
 
-    def reflect_database(self, schemas=["public"], use_cache=True):
+    def _model_collection(self):
+        if not self.lazy:
+            return ModelCollection(self.automap_base.classes)
+        return ModelCollection(
+            self.automap_base.classes,
+            loader=self._materialize,
+            available=self._lazy_tables,
+        )
+
+    def reflect_database(self, schemas=["public"], use_cache=True, max_workers=None):
+        """
+        Reflect and map the tables in several schemas.
+
+        Args:
+            schemas: Schemas to reflect.
+            use_cache: If False, ignore the model cache file.
+            max_workers: If greater than 1, reflect up to this many schemas
+                concurrently (each on its own pooled connection) into separate
+                metadata objects, which are then merged in the order of
+                ``schemas``.
+        """
         # This stuff should be placed outside of core (one likely extension point).
+        self._reflect_schemas(schemas, use_cache=use_cache, max_workers=max_workers)
 
-        for schema in schemas:
-            self.reflect_schema(schema, use_cache=use_cache)
+    def reflect_schema(self, schema, use_cache=True):
+        self._reflect_schemas([schema], use_cache=use_cache)
+
+    def _reflect_schemas(self, schemas, use_cache=True, max_workers=None):
+        builder = self.automap_base.builder
+        schemas = [schema or "public" for schema in schemas]
+        self._reflected_schemas.update(schemas)
+        engine = self.db.engine
 
-        self._cache_database_map()
+        if self.lazy:
+            # Tables are collected in a separate metadata object, and copied to
+            # the automap base's metadata when first accessed
+            if use_cache and builder.cache_file is not None:
+                builder.load_schemas(
+                    engine, self._lazy_metadata, schemas, max_workers=max_workers
+                )
+            else:
+                reflected = reflect_schemas(engine, schemas, max_workers)
+                merge_schemas(self._lazy_metadata, reflected)
+            for table in self._lazy_metadata.tables.values():
+                # Tables without primary keys can't be mapped
+                if table.primary_key:
+                    self._lazy_tables.setdefault(classname_for_table(table), table)
+        elif use_cache and builder.cache_file is not None:
+            # Cached tables are copied into the metadata, and only changed
+            # schemas are reflected
+            loaded = builder.load_schemas(
+                engine, self.automap_base.metadata, schemas, max_workers=max_workers
+            )
+            for schema, from_cache in loaded.items():
+                if from_cache:
+                    log.info(
+                        "Database models for %s have been loaded from cache", schema
+                    )
+            self.automap_base.loaded_from_cache = all(loaded.values())
+            self.automap_base.prepare(**self.reflection_kwargs)
+        elif max_workers is not None and max_workers > 1:
+            reflected = reflect_schemas(engine, schemas, max_workers)
+            merge_schemas(self.automap_base.metadata, reflected)
+            self.automap_base.prepare(**self.reflection_kwargs)
+        else:
+            for schema in schemas:
+                log.info(f"Reflecting schema {schema}")
+                # Reflect tables in schemas we care about
+                # Note: this will not reflect views because they don't have primary keys.
+                self.automap_base.prepare(
+                    autoload_with=self.db.engine,
+                    schema=None if schema == "public" else schema,
+                    **self.reflection_kwargs,
+                )
 
-        self._models = ModelCollection(self.automap_base.classes)
+        self._models = self._model_collection()
         self._tables = TableCollection(self._models)
 
-    def _cache_database_map(self):
-        if self.automap_base.loaded_from_cache:
-            return
-        self.automap_base.builder._cache_database_map(self.automap_base.metadata)
+    def _materialize(self, key) -> bool:
+        """Map a lazily-reflected table to a model, along with the tables it
+        references. Returns False if there is no such table."""
+        source = self._lazy_tables.get(key)
+        if source is None:
+            return False
 
-    def reflect_schema(self, schema, use_cache=True):
-        self._reflected_schemas.add(schema or "public")
-        if use_cache and self.automap_base.loaded_from_cache:
-            log.info("Database models for %s have been loaded from cache", schema)
-            self.automap_base.prepare(schema=schema, **self.reflection_kwargs)
+        # Referenced tables are needed to resolve foreign keys
+        closure = [source]
+        seen = {source.key}
+        for table in closure:
+            for fk in table.foreign_keys:
+                if fk.column.table.key not in seen:
+                    seen.add(fk.column.table.key)
+                    closure.append(fk.column.table)
+
+        metadata = self.automap_base.metadata
+        new_tables = []
+        for table in closure:
+            if table.key not in metadata.tables:
+                new_tables.append(table.to_metadata(metadata))
+
+        mapped = {cls.__table__: cls for cls in self.automap_base.classes}
+        log.info(f"Mapping {len(new_tables)} tables for model {key}")
+        self.automap_base.prepare(**self.reflection_kwargs)
+
+        # Automap only creates relationships between classes mapped together,
+        # so we add relationships to classes mapped earlier
+        classes = {cls.__table__: cls for cls in self.automap_base.classes}
+        for table in new_tables:
+            cls = classes.get(table)
+            if cls is None:
+                continue
+            for constraint in table.foreign_key_constraints:
+                referred_cls = mapped.get(constraint.elements[0].column.table)
+                if referred_cls is not None:
+                    self._add_relationship(cls, referred_cls, constraint)
+
+        targets = [metadata.tables[t.key] for t in closure]
+        self._models.register(*(classes[t] for t in targets if t in classes))
+        return True
+
+    def _add_relationship(self, local_cls, referred_cls, constraint):
+        """Add a many-to-one relationship (and a one-to-many backref), as
+        automap does for classes mapped together."""
+        base = self.automap_base
+        kwargs = self.reflection_kwargs
+        name = kwargs["name_for_scalar_relationship"](
+            base, local_cls, referred_cls, constraint
+        )
+        backref_name = kwargs["name_for_collection_relationship"](
+            base, referred_cls, local_cls, constraint
+        )
+        if local_cls.__mapper__.has_property(name):
             return
-        log.info(f"Reflecting schema {schema}")
-        if schema == "public":
-            schema = None
-        # Reflect tables in schemas we care about
-        # Note: this will not reflect views because they don't have primary keys.
-        self.automap_base.prepare(
-            autoload_with=self.db.engine, schema=schema, **self.reflection_kwargs
+
+        o2m_kws = {}
+        fks = constraint.elements
+        ondelete = (constraint.ondelete or "").lower()
+        if False in {fk.parent.nullable for fk in fks}:
+            o2m_kws["cascade"] = "all, delete-orphan"
+            if ondelete == "cascade":
+                o2m_kws["passive_deletes"] = True
+        elif ondelete == "set null":
+            o2m_kws["passive_deletes"] = True
+
+        backref_obj = None
+        if not referred_cls.__mapper__.has_property(backref_name):
+            backref_obj = kwargs["generate_relationship"](
+                base,
+                interfaces.ONETOMANY,
+                backref,
+                backref_name,
+                referred_cls,
+                local_cls,
+                collection_class=list,
+                **o2m_kws,
+            )
+        rel = kwargs["generate_relationship"](
+            base,
+            interfaces.MANYTOONE,
+            relationship,
+            name,
+            local_cls,
+            referred_cls,
+            foreign_keys=[fk.parent for fk in fks],
+            backref=backref_obj,
+            remote_side=[fk.column for fk in fks],
         )
-        self._models = ModelCollection(self.automap_base.classes)
-        self._tables = TableCollection(self._models)
+        if rel is not None:
+            setattr(local_cls, name, rel)
 
     def reflect_table(self, tablename, *column_args, **kwargs):
         # Warn that this method is deprecated
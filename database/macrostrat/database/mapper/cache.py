@@ -1,14 +1,76 @@
+"""
+A file cache for reflected database models.
+
+Reflecting large schemas takes a long time, so ``DatabaseModelCache`` pickles
+the reflected ``MetaData`` for each schema, along with a fingerprint of the
+schema's catalog entries (tables, columns, constraints and indexes). On later
+runs, the fingerprints of all cached schemas are computed in a single query,
+and only schemas whose fingerprint changed are reflected again.
+
+Each schema's tables are reflected into a separate ``MetaData``, which also
+holds the tables they reference in other schemas; the fingerprints of those
+schemas are stored with the entry, so it is rebuilt when they change too.
+Cached tables are copied into the automap base's metadata (with
+``Table.to_metadata``) before mapping.
+
+The cache file is written to a temporary file and atomically moved into place,
+so concurrent processes never see a partially-written cache.
+"""
+
+import os
 from os import makedirs, path
 from pickle import dump, load
+from tempfile import NamedTemporaryFile
+from typing import Iterable, Optional
 
+import sqlalchemy
+from sqlalchemy import MetaData, text
 from sqlalchemy.ext.automap import automap_base
 
 from macrostrat.utils.logs import get_logger
 
 from .base import ModelHelperMixins
+from .reflection import merge_schemas, reflect_schemas, schema_name, table_schema
 
 log = get_logger(__name__)
 
+# Incremented when the format of the cache file changes
+cache_format_version = 2
+
+_relkinds = "('r', 'v', 'm', 'p', 'f')"
+
+# A hash of the catalog entries that affect reflection, for each schema
+schema_fingerprint_query = f"""
+SELECT n.nspname, md5(concat_ws('|',
+  (SELECT string_agg(c.relname || ':' || CAST(c.relkind AS text), ',' ORDER BY c.relname)
+    FROM pg_catalog.pg_class c
+    WHERE c.relnamespace = n.oid AND c.relkind IN {_relkinds}),
+  (SELECT string_agg(
+      c.relname || '.' || a.attname || ':'
+        || pg_catalog.format_type(a.atttypid, a.atttypmod) || ':'
+        || a.attnotnull || ':' || CAST(a.attidentity AS text) || ':'
+        || coalesce(pg_catalog.pg_get_expr(d.adbin, d.adrelid), ''),
+      ',' ORDER BY c.relname, a.attnum)
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+    LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE c.relnamespace = n.oid AND c.relkind IN {_relkinds}
+      AND a.attnum > 0 AND NOT a.attisdropped),
+  (SELECT string_agg(
+      c.relname || '.' || co.conname || ':' || pg_catalog.pg_get_constraintdef(co.oid),
+      ',' ORDER BY c.relname, co.conname)
+    FROM pg_catalog.pg_constraint co
+    JOIN pg_catalog.pg_class c ON c.oid = co.conrelid
+    WHERE c.relnamespace = n.oid),
+  (SELECT string_agg(pg_catalog.pg_get_indexdef(i.indexrelid), ',' ORDER BY ic.relname)
+    FROM pg_catalog.pg_index i
+    JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+    WHERE ic.relnamespace = n.oid)
+))
+FROM pg_catalog.pg_namespace n
+WHERE n.nspname = ANY(:schemas)
+"""
+
 
 class AutomapError(Exception):
     pass
@@ -19,53 +81,154 @@ class DatabaseModelCache(object):
 
     def __init__(self, cache_file=None):
         self.cache_file = cache_file
+        # Whether each schema was loaded from the cache on the last load
+        self.loaded_schemas: dict[str, bool] = {}
 
     @property
     def _metadata_cache_filename(self):
         return self.cache_file
 
+    def schema_fingerprints(self, connectable, schemas: Iterable[str]) -> dict:
+        """Fingerprints of the catalog entries of several schemas, computed
+        in one query. Schemas that don't exist are omitted."""
+        schemas = sorted({schema_name(s) for s in schemas})
+        if len(schemas) == 0:
+            return {}
+        with connectable.connect() as conn:
+            res = conn.execute(text(schema_fingerprint_query), dict(schemas=schemas))
+            return {schema: fingerprint for schema, fingerprint in res}
+
+    def _load_database_map(self) -> dict:
+        """Read the cached schema entries (an empty dict if the cache is missing,
+        unreadable or was written by an incompatible version)."""
+        if self.cache_file is None:
+            return {}
+        try:
+            with open(self.cache_file, "rb") as f:
+                cached = load(file=f)
+        except (IOError, EOFError):
+            # cache file not found - no problem
+            log.info(
+                f"Could not find database model cache ({self._metadata_cache_filename})"
+            )
+            return {}
+        except Exception as exc:
+            log.error(f"Error loading database model cache: {exc}")
+            return {}
+
+        if not isinstance(cached, dict) or cached.get("version") != (
+            cache_format_version,
+            sqlalchemy.__version__,
+        ):
+            log.info("Ignoring database model cache from an incompatible version")
+            return {}
+        return cached["schemas"]
+
     # https://stackoverflow.com/questions/41547778/sqlalchemy-automap-best-practices-for-performance/44607512
-    def _cache_database_map(self, metadata):
+    def _cache_database_map(self, entries: dict):
         if self.cache_file is None:
             return
-        # save the metadata for future runs
+        # Keep schemas cached by other processes since we read the file
+        current = self._load_database_map()
+        current.update(entries)
+        data = dict(
+            version=(cache_format_version, sqlalchemy.__version__), schemas=current
+        )
+
+        cache_dir = path.dirname(path.abspath(self.cache_file))
+        tmp = None
         try:
-            cache_dir = path.dirname(self.cache_file)
             if not path.exists(cache_dir):
                 makedirs(cache_dir)
             # make sure to open in binary mode - we're writing bytes, not str
-            with open(self.cache_file, "wb") as f:
-                dump(metadata, f)
+            with NamedTemporaryFile(
+                "wb",
+                dir=cache_dir,
+                prefix=path.basename(self.cache_file) + ".",
+                suffix=".tmp",
+                delete=False,
+            ) as f:
+                tmp = f.name
+                dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.cache_file)
+            tmp = None
             log.info(f"Cached database models to {self.cache_file}")
         except IOError:
             # couldn't write the file for some reason
             log.info(f"Could not cache database models to {self.cache_file}")
+        finally:
+            if tmp is not None and path.exists(tmp):
+                os.remove(tmp)
 
-    def _load_database_map(self):
-        # We have hard-coded the cache file for now
-        if self.cache_file is None:
-            return None
-        cached_metadata = None
-        try:
-            with open(self.cache_file, "rb") as f:
-                cached_metadata = load(file=f)
+    def _cache_entry(
+        self, engine, schema: str, metadata: MetaData, fingerprints: dict
+    ) -> dict:
+        # Tables referenced in other schemas are included in the metadata, so
+        # their schemas' fingerprints are tracked too
+        schemas = {schema} | {table_schema(t) for t in metadata.tables.values()}
+        missing = schemas - set(fingerprints)
+        if missing:
+            fingerprints.update(self.schema_fingerprints(engine, missing))
+        return dict(
+            fingerprints={s: fingerprints.get(s) for s in sorted(schemas)},
+            metadata=metadata,
+        )
 
-        except (IOError, EOFError):
-            # cache file not found - no problem
-            log.info(
-                f"Could not find database model cache ({self._metadata_cache_filename})"
+    def load_schemas(
+        self,
+        engine,
+        metadata: MetaData,
+        schemas: Iterable[str],
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Copy the tables of several schemas into ``metadata``, from the cache
+        where the schema is unchanged and by reflection otherwise. The cache file
+        is updated if any schema was reflected.
+
+        Args:
+            engine: The database engine.
+            metadata: Metadata to copy tables into.
+            schemas: Schemas to load.
+            max_workers: Maximum number of schemas to reflect concurrently.
+
+        Returns: A dict of whether each schema was loaded from the cache.
+        """
+        schemas = list(dict.fromkeys(schema_name(s) for s in schemas))
+        entries = self._load_database_map()
+
+        tracked = set(schemas)
+        for schema in schemas:
+            if schema in entries:
+                tracked |= set(entries[schema]["fingerprints"])
+        fingerprints = self.schema_fingerprints(engine, tracked)
+
+        loaded = {}
+        for schema in schemas:
+            entry = entries.get(schema)
+            loaded[schema] = entry is not None and all(
+                fingerprints.get(s) == fp for s, fp in entry["fingerprints"].items()
             )
-        except Exception as exc:
-            log.error(f"Error loading database model cache: {exc}")
-        return cached_metadata
+
+        reflected = reflect_schemas(
+            engine, [s for s in schemas if not loaded[s]], max_workers
+        )
+        changed = {
+            schema: self._cache_entry(engine, schema, schema_metadata, fingerprints)
+            for schema, schema_metadata in reflected.items()
+        }
+        entries.update(changed)
+
+        merge_schemas(metadata, {s: entries[s]["metadata"] for s in schemas})
+
+        if changed:
+            self._cache_database_map(changed)
+        self.loaded_schemas.update(loaded)
+        return loaded
 
     def automap_base(self):
-        cached_metadata = self._load_database_map()
-        if cached_metadata is None:
-            base = automap_base(cls=ModelHelperMixins)
-        else:
-            log.info("Loading database models from cache")
-            base = automap_base(metadata=cached_metadata)
-            base.loaded_from_cache = True
+        base = automap_base(cls=ModelHelperMixins)
         base.builder = self
         return base
@@ -0,0 +1,74 @@
+"""
+Reflection of several schemas into separate ``MetaData`` objects, optionally
+concurrently, and deterministic merging of the results.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from sqlalchemy import MetaData
+
+from macrostrat.utils.logs import get_logger
+
+from ..utils import register_geometry_types
+
+log = get_logger(__name__)
+
+
+def schema_name(schema: Optional[str]) -> str:
+    return schema or "public"
+
+
+def table_schema(table) -> str:
+    return schema_name(table.schema)
+
+
+def reflect_schema(engine, schema: str) -> MetaData:
+    """Reflect a schema's tables (and the tables they reference in other
+    schemas) into a new ``MetaData``."""
+    log.info(f"Reflecting schema {schema}")
+    metadata = MetaData()
+    metadata.reflect(engine, schema=None if schema == "public" else schema)
+    return metadata
+
+
+def reflect_schemas(
+    engine, schemas: Iterable[str], max_workers: Optional[int] = None
+) -> dict[str, MetaData]:
+    """
+    Reflect each schema into its own ``MetaData``. If ``max_workers`` is
+    greater than 1, schemas are reflected concurrently, each on its own pooled
+    connection.
+
+    Returns: A dict of metadata by schema, in the order of ``schemas``.
+    """
+    schemas = list(dict.fromkeys(schema_name(s) for s in schemas))
+    register_geometry_types()
+    if max_workers is None or max_workers <= 1 or len(schemas) <= 1:
+        return {schema: reflect_schema(engine, schema) for schema in schemas}
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(schemas)),
+        thread_name_prefix="reflect-schema",
+    ) as executor:
+        results = executor.map(lambda s: reflect_schema(engine, s), schemas)
+        return dict(zip(schemas, results))
+
+
+def merge_schemas(target: MetaData, schema_metadata: dict[str, MetaData]):
+    """
+    Copy tables from per-schema metadata into ``target`` (with
+    ``Table.to_metadata``), skipping tables that already exist there.
+
+    Each schema's own tables are copied first (in the order of
+    ``schema_metadata``), so that tables reflected as references from other
+    schemas can't shadow them. The result doesn't depend on the order in which
+    the schemas were reflected.
+    """
+    for own_tables in (True, False):
+        for schema, metadata in schema_metadata.items():
+            for table in metadata.sorted_tables:
+                if (table_schema(table) == schema) != own_tables:
+                    continue
+                if table.key not in target.tables:
+                    table.to_metadata(target)
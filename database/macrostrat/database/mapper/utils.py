@@ -48,6 +48,58 @@ def name_for_collection_relationship(base, local_cls, referred_cls, constraint):
     return cls_name + "_collection"
 
 
+relationship_modes = ("none", "scalar", "all")
+
+
+def _relationship_mode(relationships, cls):
+    if isinstance(relationships, str):
+        return relationships
+    schema = cls.__table__.schema or "public"
+    return relationships.get(schema, relationships.get("*", "all"))
+
+
+def filter_relationships(generate_relationship, relationships="all"):
+    """
+    Wrap an automap ``generate_relationship`` function to limit the
+    relationships that are created. ``relationships`` is one of
+
+    - ``"all"``: all relationships (many-to-one, one-to-many and many-to-many);
+    - ``"scalar"``: only many-to-one relationships, without backrefs;
+    - ``"none"``: no relationships;
+
+    or a dict mapping schema names (and ``"*"`` for other schemas) to these
+    modes. A schema's mode applies to the relationships defined on its models.
+    """
+    modes = (
+        [relationships]
+        if isinstance(relationships, str)
+        else list(relationships.values())
+    )
+    for mode in modes:
+        if mode not in relationship_modes:
+            raise ValueError(
+                f"Invalid relationship mode {mode!r} (expected one of {relationship_modes})"
+            )
+    if relationships == "all":
+        return generate_relationship
+
+    from sqlalchemy.orm import interfaces
+
+    def _generate_relationship(
+        base, direction, return_fn, attrname, local_cls, referred_cls, **kw
+    ):
+        mode = _relationship_mode(relationships, local_cls)
+        if mode == "none":
+            return None
+        if mode == "scalar" and direction is not interfaces.MANYTOONE:
+            return None
+        return generate_relationship(
+            base, direction, return_fn, attrname, local_cls, referred_cls, **kw
+        )
+
+    return _generate_relationship
+
+
 class BaseCollection(object):
     def __repr__(self):
         keys = ",\n  ".join(self.keys())
@@ -55,8 +107,17 @@ class BaseCollection(object):
 
 
 class ModelCollection(BaseCollection):
-    def __init__(self, models=None):
+    """
+    Collection of models, keyed by class name. If a ``loader`` is given, names
+    in ``available`` that haven't been mapped yet are loaded on first access
+    (``keys`` and ``in`` include them; iteration and ``len`` only cover models
+    that have been mapped).
+    """
+
+    def __init__(self, models=None, *, loader=None, available=()):
         self.__models = {}
+        self.__loader = loader
+        self.__available = available
         if models is None:
             return
         self.register(*models)
@@ -70,8 +131,10 @@ class ModelCollection(BaseCollection):
         self.__models[key] = value
 
     def __getattr__(self, name):
+        if name.startswith("_ModelCollection__"):
+            raise AttributeError(name)
         try:
-            return self.__models[name]
+            return self[name]
         except KeyError:
             raise AttributeError(name)
 
@@ -82,15 +145,19 @@ class ModelCollection(BaseCollection):
         yield from self.__models.values()
 
     def keys(self):
-        return [k for k in self.__models.keys()]
+        keys = [k for k in self.__models.keys()]
+        keys.extend(k for k in self.__available if k not in self.__models)
+        return keys
 
     # Support for dict-like access
     def __getitem__(self, key):
+        if key not in self.__models and key in self.__available:
+            self.__loader(key)
         return self.__models[key]
 
     # Support 'in' operator
     def __contains__(self, key):
-        return key in self.__models
+        return key in self.__models or key in self.__available
 
 
 class TableCollection(BaseCollection):
@@ -0,0 +1,445 @@
+"""
+Connection pool and query metrics.
+
+``configure_metrics`` attaches engine and pool event listeners that record:
+
+- the time taken to check a connection out of the pool (including time spent
+  waiting for a free connection or opening a new one);
+- connections opened, closed and invalidated;
+- query counts, errors and latency histograms, per statement fingerprint
+  (the statement text with literals replaced by ``?``).
+
+Pool occupancy (size, connections in use and overflow) is read from the pool
+when statistics are requested. Nothing is attached unless metrics are enabled
+(``Database(url, metrics=True)``), so disabled metrics cost nothing.
+
+``render_prometheus`` renders a database's statistics in the Prometheus text
+exposition format, for serving from a ``/metrics`` endpoint::
+
+    db = Database(url, metrics=True)
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(render_prometheus(db), media_type=prometheus_content_type)
+"""
+
+import re
+from bisect import bisect_left
+from functools import lru_cache
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+if TYPE_CHECKING:
+    from .core import Database
+
+prometheus_content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds, in seconds
+default_buckets = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Fingerprint under which statements are counted once ``max_fingerprints``
+# distinct fingerprints have been seen
+other_fingerprint = "other"
+
+_string_literal = re.compile(r"(?:\bE)?'(?:[^']|'')*'")
+_number_literal = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_value_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_whitespace = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def statement_fingerprint(statement: str, max_length: int = 200) -> str:
+    """Normalize a statement for grouping: literals are replaced by ``?``,
+    lists of values collapsed and whitespace squeezed."""
+    text = _string_literal.sub("?", statement)
+    text = _number_literal.sub("?", text)
+    text = _value_list.sub("(...)", text)
+    text = _whitespace.sub(" ", text).strip().rstrip(";")
+    if len(text) > max_length:
+        text = text[: max_length - 3] + "..."
+    return text
+
+
+class Histogram(object):
+    """A cumulative histogram of observed values (as used by Prometheus)."""
+
+    def __init__(self, buckets: Sequence[float] = default_buckets):
+        self.buckets = tuple(buckets)
+        # The last count is for values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """(upper bound, count) pairs, ending with ``inf``."""
+        res = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            res.append((bound, total))
+        return res
+
+    def to_dict(self) -> dict:
+        return dict(
+            count=self.count,
+            sum=self.sum,
+            mean=self.sum / self.count if self.count > 0 else 0.0,
+            buckets=self.cumulative_counts(),
+        )
+
+
+class QueryStats(object):
+    def __init__(self, buckets: Sequence[float]):
+        self.errors = 0
+        self.latency = Histogram(buckets)
+
+
+class DatabaseMetrics(object):
+    """Pool and query metrics for an engine, collected from engine events."""
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = default_buckets,
+        max_fingerprints: int = 500,
+    ):
+        self.buckets = tuple(buckets)
+        self.max_fingerprints = max_fingerprints
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.connections_invalidated = 0
+        self.checkouts = 0
+        self.checkout_time = Histogram(self.buckets)
+        self.queries: dict[str, QueryStats] = {}
+        self._lock = Lock()
+
+    def _query_stats(self, statement: str) -> QueryStats:
+        fingerprint = statement_fingerprint(statement)
+        stats = self.queries.get(fingerprint)
+        if stats is None:
+            if len(self.queries) >= self.max_fingerprints:
+                fingerprint = other_fingerprint
+                stats = self.queries.get(fingerprint)
+            if stats is None:
+                stats = self.queries[fingerprint] = QueryStats(self.buckets)
+        return stats
+
+    def observe_query(self, statement: str, elapsed: float, error: bool = False):
+        with self._lock:
+            stats = self._query_stats(statement)
+            stats.latency.observe(elapsed)
+            if error:
+                stats.errors += 1
+
+    def increment(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe_checkout(self, elapsed: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_time.observe(elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queries = {
+                fingerprint: dict(errors=q.errors, **q.latency.to_dict())
+                for fingerprint, q in self.queries.items()
+            }
+            return dict(
+                connections_created=self.connections_created,
+                connections_closed=self.connections_closed,
+                connections_invalidated=self.connections_invalidated,
+                checkouts=self.checkouts,
+                checkout_time=self.checkout_time.to_dict(),
+                query_count=sum(q["count"] for q in queries.values()),
+                query_errors=sum(q["errors"] for q in queries.values()),
+                queries=queries,
+            )
+
+    def reset(self):
+        with self._lock:
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.connections_invalidated = 0
+            self.checkouts = 0
+            self.checkout_time = Histogram(self.buckets)
+            self.queries = {}
+
+
+def pool_stats(engine: Engine) -> dict:
+    """Current pool occupancy. Pools without a fixed size (e.g. ``NullPool``)
+    only report their class."""
+    pool = engine.pool
+    res = dict(pool_class=type(pool).__name__)
+    if not hasattr(pool, "checkedout"):
+        return res
+    res.update(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        # Negative while the pool has fewer than ``size`` connections
+        overflow=max(pool.overflow(), 0),
+        max_overflow=getattr(pool, "_max_overflow", None),
+    )
+    return res
+
+
+# Metrics collected for each engine, so that engines shared by several
+# databases only have listeners attached once
+_engine_metrics: "WeakKeyDictionary[Engine, DatabaseMetrics]" = WeakKeyDictionary()
+
+
+def _time_checkouts(engine: Engine, metrics: DatabaseMetrics):
+    # Pools don't have an event for the start of a checkout, so wrap
+    # ``connect`` on the pool instance (which the engine calls for each
+    # checkout).
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = perf_counter()
+        try:
+            return connect()
+        finally:
+            metrics.observe_checkout(perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+def configure_metrics(engine: Engine, **kwargs) -> DatabaseMetrics:
+    """
+    Attach listeners that collect pool and query metrics for an engine. If the
+    engine is already instrumented (e.g. it is shared by several databases),
+    its existing metrics are returned.
+
+    Keyword Args:
+        buckets (Sequence[float]): Histogram bucket upper bounds, in seconds.
+        max_fingerprints (int): Maximum number of statement fingerprints
+            tracked separately; further statements are counted as ``"other"``.
+    """
+    metrics = _engine_metrics.get(engine)
+    if metrics is not None:
+        return metrics
+    metrics = _engine_metrics[engine] = DatabaseMetrics(**kwargs)
+    _time_checkouts(engine, metrics)
+
+    @event.listens_for(engine, "engine_disposed")
+    def rewrap_pool(engine):
+        # Disposing an engine replaces its pool
+        _time_checkouts(engine, metrics)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment("connections_created")
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        metrics.increment("connections_closed")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("connections_invalidated")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        # The statement may have started before the engine was instrumented
+        timers = conn.info.get("metrics_query_start")
+        if not timers:
+            return
+        start = timers.pop()
+        metrics.observe_query(statement, perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        conn = context.connection
+        if conn is None or context.statement is None:
+            return
+        timers = conn.info.get("metrics_query_start")
+        if not timers:
+            return
+        start = timers.pop()
+        metrics.observe_query(context.statement, perf_counter() - start, error=True)
+
+    return metrics
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _PrometheusWriter(object):
+    def __init__(self, prefix: str, labels: dict):
+        self.prefix = prefix
+        self.labels = labels
+        self.lines = []
+        self._declared = set()
+
+    def declare(self, name: str, kind: str, help: str):
+        if name in self._declared:
+            return
+        self._declared.add(name)
+        self.lines.append(f"# HELP {self.prefix}_{name} {help}")
+        self.lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+
+    def sample(self, name: str, value, **labels):
+        labels = {**self.labels, **labels}
+        self.lines.append(
+            f"{self.prefix}_{name}{_labels(labels)} {_format_value(value)}"
+        )
+
+    def metric(self, name: str, kind: str, help: str, value, **labels):
+        if value is None:
+            return
+        self.declare(name, kind, help)
+        self.sample(name, value, **labels)
+
+    def histogram(self, name: str, help: str, histogram: dict, **labels):
+        self.declare(name, "histogram", help)
+        for bound, count in histogram["buckets"]:
+            self.sample(f"{name}_bucket", count, le=_format_value(bound), **labels)
+        self.sample(f"{name}_sum", histogram["sum"], **labels)
+        self.sample(f"{name}_count", histogram["count"], **labels)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus(
+    db: "Database", prefix: str = "macrostrat_db", labels: Optional[dict] = None
+) -> str:
+    """
+    Render a database's statistics in the Prometheus text exposition format.
+
+    Args:
+        db: The database (query metrics are only included if it was created with
+            ``metrics=True``).
+        prefix: Prefix for metric names.
+        labels: Labels added to every sample (e.g. to distinguish databases).
+    """
+    stats = db.stats()
+    out = _PrometheusWriter(prefix, labels or {})
+
+    pool = stats["pool"]
+    out.metric("pool_size", "gauge", "Pool size.", pool.get("size"))
+    out.metric(
+        "pool_checked_out",
+        "gauge",
+        "Connections checked out of the pool.",
+        pool.get("checked_out"),
+    )
+    out.metric(
+        "pool_checked_in",
+        "gauge",
+        "Idle connections in the pool.",
+        pool.get("checked_in"),
+    )
+    out.metric(
+        "pool_overflow",
+        "gauge",
+        "Connections open beyond the pool size.",
+        pool.get("overflow"),
+    )
+
+    metrics = stats.get("metrics")
+    if metrics is not None:
+        for name, help in (
+            ("connections_created", "Database connections opened."),
+            ("connections_closed", "Database connections closed."),
+            ("connections_invalidated", "Database connections invalidated."),
+        ):
+            out.metric(f"{name}_total", "counter", help, metrics[name])
+        out.histogram(
+            "pool_checkout_seconds",
+            "Time taken to check a connection out of the pool.",
+            metrics["checkout_time"],
+        )
+        for fingerprint, query in metrics["queries"].items():
+            out.histogram(
+                "query_duration_seconds",
+                "Query latency by statement fingerprint.",
+                query,
+                statement=fingerprint,
+            )
+        for fingerprint, query in metrics["queries"].items():
+            out.metric(
+                "query_errors_total",
+                "counter",
+                "Failed queries by statement fingerprint.",
+                query["errors"],
+                statement=fingerprint,
+            )
+
+    prepared = stats.get("prepared_statements")
+    if prepared is not None:
+        out.metric(
+            "prepared_statement_executions_total",
+            "counter",
+            "Executions observed by the prepared statement tracker.",
+            prepared["executions"],
+        )
+        out.metric(
+            "prepared_statement_hits_total",
+            "counter",
+            "Executions that reused a prepared statement.",
+            prepared["hits"],
+        )
+
+    cache = stats["result_cache"]
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        out.metric(
+            f"result_cache_{name}_total",
+            "counter",
+            f"Result cache {name}.",
+            cache[name],
+        )
+    out.metric("result_cache_entries", "gauge", "Cached results.", cache["entries"])
+    out.metric(
+        "result_cache_bytes",
+        "gauge",
+        "Estimated memory used by cached results.",
+        cache["bytes"],
+    )
+    return out.render()
@@ -0,0 +1,231 @@
+"""
+Output sinks for progress reporting while running SQL.
+
+``run_sql`` and ``run_fixtures`` report each executed (or skipped) statement,
+statement errors and informational messages to an ``OutputSink``. Sinks can be
+passed as ``output_file``; plain file objects are wrapped in a ``ConsoleSink``.
+
+- ``ConsoleSink`` writes styled text to a terminal or file, buffering lines and
+  flushing them in batches to limit the cost of terminal I/O.
+- ``JSONLinesSink`` writes one JSON object per event, for structured logs.
+- ``MemorySink`` collects events in memory, and can replay them to another sink.
+- ``null_sink`` discards all output.
+"""
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter, time
+from typing import IO, Optional, Union
+
+from click import echo, secho, style, unstyle
+
+from macrostrat.utils import get_logger
+
+log = get_logger(__name__)
+
+
+def _error_message(err) -> str:
+    if orig := getattr(err, "orig", None):
+        return str(orig).strip()
+    return str(err).strip()
+
+
+def _is_already_exists_error(err) -> bool:
+    """Errors from re-creating existing objects, which idempotent fixtures
+    routinely produce."""
+    return "already exists" in _error_message(err)
+
+
+def _print_error(sql_text, err, **kwargs):
+    _err = _error_message(err)
+    # Decide whether error should be dimmed
+    dim = kwargs.pop("dim", _is_already_exists_error(err))
+    secho(sql_text, fg=None if dim else "red", dim=True, **kwargs)
+    if dim:
+        _err = "  " + _err
+    secho(_err, fg="red", dim=dim, **kwargs)
+    log.error(err)
+
+
+class OutputSink(object):
+    """Receives progress output. The base class discards everything."""
+
+    def statement(self, text: str, *, skipped: bool = False):
+        """Report a statement that was executed (or skipped)."""
+
+    def error(self, text: str, err: Exception):
+        """Report a statement that failed with an error."""
+
+    def message(self, text: str):
+        """Report an informational message (optionally styled with ``click.style``)."""
+
+    def flush(self):
+        """Write out any buffered output."""
+
+
+class NullSink(OutputSink):
+    """Discards all output."""
+
+
+null_sink = NullSink()
+
+
+class ConsoleSink(OutputSink):
+    """
+    Writes styled output to a terminal or file (styles are removed if the file
+    isn't a terminal). Statement lines are buffered, and written once
+    ``max_lines`` have accumulated or ``interval`` seconds have passed since the
+    last write; errors and messages are written immediately.
+    """
+
+    def __init__(
+        self,
+        file: Optional[IO] = None,
+        *,
+        max_lines: int = 100,
+        interval: float = 0.1,
+        console=None,
+    ):
+        """
+        Args:
+            file: File to write to (by default, standard output).
+            max_lines: Maximum number of buffered statement lines.
+            interval: Maximum time (in seconds) between writes.
+            console: A ``rich`` console for messages (for backwards compatibility
+                with ``run_fixtures(console=...)``).
+        """
+        self.file = file
+        self.max_lines = max_lines
+        self.interval = interval
+        self.console = console
+        self._buffer = []
+        self._last_flush = perf_counter()
+
+    def statement(self, text: str, *, skipped: bool = False):
+        self._buffer.append(style(text, dim=True, strikethrough=skipped or None))
+        if (
+            len(self._buffer) >= self.max_lines
+            or perf_counter() - self._last_flush >= self.interval
+        ):
+            self.flush()
+
+    def error(self, text: str, err: Exception):
+        self.flush()
+        _print_error(text, err, file=self.file)
+
+    def message(self, text: str):
+        self.flush()
+        if self.console is not None:
+            from rich.text import Text
+
+            self.console.print(Text.from_ansi(text))
+            return
+        echo(text, file=self.file)
+
+    def flush(self):
+        self._last_flush = perf_counter()
+        if len(self._buffer) == 0:
+            return
+        lines = self._buffer
+        self._buffer = []
+        echo("\n".join(lines), file=self.file)
+
+
+@dataclass
+class OutputEvent:
+    """An output event, as collected by a ``MemorySink``."""
+
+    kind: str
+    text: str
+    skipped: bool = False
+    error: Optional[Exception] = None
+    time: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        res = dict(event=self.kind, text=self.text, time=self.time)
+        if self.kind == "statement":
+            res["skipped"] = self.skipped
+        if self.error is not None:
+            res["error"] = _error_message(self.error)
+            res["already_exists"] = _is_already_exists_error(self.error)
+        return res
+
+    def replay(self, sink: OutputSink):
+        if self.kind == "statement":
+            sink.statement(self.text, skipped=self.skipped)
+        elif self.kind == "error":
+            sink.error(self.text, self.error)
+        else:
+            sink.message(self.text)
+
+
+class MemorySink(OutputSink):
+    """Collects output events in memory."""
+
+    def __init__(self):
+        self.events: list[OutputEvent] = []
+
+    def statement(self, text: str, *, skipped: bool = False):
+        self.events.append(OutputEvent("statement", text, skipped=skipped, time=time()))
+
+    def error(self, text: str, err: Exception):
+        self.events.append(OutputEvent("error", text, error=err, time=time()))
+
+    def message(self, text: str):
+        self.events.append(OutputEvent("message", text, time=time()))
+
+    @property
+    def errors(self) -> list[OutputEvent]:
+        return [e for e in self.events if e.kind == "error"]
+
+    def replay(self, sink: OutputSink):
+        """Send the collected events to another sink."""
+        for event in self.events:
+            event.replay(sink)
+        sink.flush()
+
+
+class JSONLinesSink(OutputSink):
+    """
+    Writes each output event as a line of JSON with ``event`` (``statement``,
+    ``error`` or ``message``), ``text`` and ``time`` (a Unix timestamp) keys.
+    Errors add ``error`` and ``already_exists`` keys, and statements a
+    ``skipped`` key. Styles are removed from messages.
+    """
+
+    def __init__(self, file: Union[IO, str, Path]):
+        """
+        Args:
+            file: A file object, or the path of a file to append to.
+        """
+        self._owns_file = isinstance(file, (str, Path))
+        self.file = open(file, "a") if self._owns_file else file
+
+    def _write(self, event: OutputEvent):
+        self.file.write(json.dumps(event.to_dict()) + "\n")
+
+    def statement(self, text: str, *, skipped: bool = False):
+        self._write(OutputEvent("statement", text, skipped=skipped, time=time()))
+
+    def error(self, text: str, err: Exception):
+        self._write(OutputEvent("error", text, error=err, time=time()))
+
+    def message(self, text: str):
+        self._write(OutputEvent("message", unstyle(text), time=time()))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        """Close the file, if it was opened by the sink."""
+        if self._owns_file:
+            self.file.close()
+
+
+def get_output_sink(output_file: Union[IO, OutputSink, None]) -> OutputSink:
+    """Wrap a file object (or None, for standard output) in a ``ConsoleSink``,
+    passing sinks through unchanged."""
+    if isinstance(output_file, OutputSink):
+        return output_file
+    return ConsoleSink(output_file)
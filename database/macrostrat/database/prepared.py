@@ -0,0 +1,217 @@
+"""
+Server-side prepared statement settings and hit-rate tracking.
+
+psycopg 3 prepares statements automatically: a query executed
+``prepare_threshold`` times on a connection is prepared on the server, and
+later executions skip parsing and planning. Prepared statements are kept in a
+per-connection LRU of ``prepared_max`` entries, keyed by query text.
+
+Prepared statements are tied to a server session, so they must be disabled
+(``prepare_threshold=None``) behind PgBouncer in transaction pooling mode.
+
+psycopg doesn't expose cache statistics, so ``PreparedStatementTracker`` mirrors
+its policy using engine events to *estimate* how often executions reuse a
+prepared statement. It is only attached when tracking is requested. Statements
+sent directly through the driver (pipelines, one-shot scripts, ``run_many``
+batches and ``Database.stream``) don't fire cursor events, so they aren't
+counted.
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from macrostrat.utils import get_logger
+
+log = get_logger(__name__)
+
+# psycopg's defaults
+default_prepare_threshold = 5
+default_prepared_max = 100
+
+# Statements after which psycopg discards all prepared statements
+_clears_prepared = re.compile(
+    r"^\s*(?:DROP|ALTER|ROLLBACK|DISCARD\s+ALL|DEALLOCATE\s+ALL)\b", re.IGNORECASE
+)
+
+
+class PreparedStatementTracker(object):
+    """Estimate prepared statement reuse across an engine's connections, by
+    replaying psycopg's preparation policy on observed executions."""
+
+    def __init__(
+        self,
+        prepare_threshold: int = default_prepare_threshold,
+        prepared_max: int = default_prepared_max,
+    ):
+        self.prepare_threshold = prepare_threshold
+        self.prepared_max = prepared_max
+        self.executions = 0
+        self.hits = 0
+        self.prepares = 0
+        self._lock = Lock()
+        self._info_key = f"prepared_statements_{id(self)}"
+
+    def _state(self, info: dict):
+        # Map statement text to the number of times it was seen, and the set
+        # of prepared statements, both in least-recently-used order
+        if self._info_key not in info:
+            info[self._info_key] = (OrderedDict(), OrderedDict())
+        return info[self._info_key]
+
+    def observe(self, info: dict, statement: str):
+        """Record the execution of a statement on a connection (identified by
+        its ``info`` dictionary)."""
+        counts, prepared = self._state(info)
+        with self._lock:
+            self.executions += 1
+            if statement in prepared:
+                prepared.move_to_end(statement)
+                self.hits += 1
+                return
+
+            count = counts.get(statement, 0)
+            if count >= self.prepare_threshold:
+                counts.pop(statement, None)
+                prepared[statement] = True
+                self.prepares += 1
+                if len(prepared) > self.prepared_max:
+                    prepared.popitem(last=False)
+                return
+
+            counts[statement] = count + 1
+            counts.move_to_end(statement)
+            if len(counts) > self.prepared_max:
+                counts.popitem(last=False)
+
+    def clear(self, info: dict):
+        """Forget the statements prepared on a connection."""
+        info.pop(self._info_key, None)
+
+    @property
+    def hit_rate(self) -> float:
+        if self.executions == 0:
+            return 0.0
+        return self.hits / self.executions
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                executions=self.executions,
+                hits=self.hits,
+                prepares=self.prepares,
+                hit_rate=self.hit_rate,
+                prepare_threshold=self.prepare_threshold,
+                prepared_max=self.prepared_max,
+            )
+
+    def reset(self):
+        with self._lock:
+            self.executions = 0
+            self.hits = 0
+            self.prepares = 0
+
+
+@dataclass
+class _EngineState:
+    prepare_threshold: Optional[int]
+    prepared_max: int
+    tracker: Optional[PreparedStatementTracker] = None
+
+
+# Prepared statement settings applied to each engine, so that engines shared by
+# several databases are only configured once
+_configured_engines: "WeakKeyDictionary[Engine, _EngineState]" = WeakKeyDictionary()
+
+
+def configure_prepared_statements(
+    engine: Engine,
+    prepare_threshold: Optional[int] = default_prepare_threshold,
+    prepared_max: int = default_prepared_max,
+    *,
+    track: bool = False,
+) -> Optional[PreparedStatementTracker]:
+    """
+    Apply prepared statement settings to new connections of a psycopg engine,
+    and optionally track prepared statement reuse.
+
+    Listeners are only attached for non-default settings or when tracking is
+    requested, and at most once per engine: settings given when the engine was
+    first configured are kept, and its tracker is shared.
+
+    Args:
+        engine: A SQLAlchemy engine using the psycopg driver.
+        prepare_threshold: Number of executions after which a statement is
+            prepared. ``None`` disables prepared statements (needed for PgBouncer
+            transaction pooling); ``0`` prepares every statement.
+        prepared_max: Maximum number of prepared statements per connection.
+        track: Estimate prepared statement reuse.
+
+    Returns: A tracker, or None if tracking wasn't requested or prepared
+        statements are disabled or unsupported.
+    """
+    if engine.dialect.driver != "psycopg":
+        if prepare_threshold != default_prepare_threshold:
+            log.warning(
+                "Prepared statement settings require the psycopg driver; ignoring"
+            )
+        return None
+
+    state = _configured_engines.get(engine)
+    if state is None:
+        state = _EngineState(prepare_threshold, prepared_max)
+        _configured_engines[engine] = state
+        if (prepare_threshold, prepared_max) != (
+            default_prepare_threshold,
+            default_prepared_max,
+        ):
+            _set_prepare_options(engine, prepare_threshold, prepared_max)
+    elif (state.prepare_threshold, state.prepared_max) != (
+        prepare_threshold,
+        prepared_max,
+    ):
+        log.warning(
+            "Prepared statements are already configured for this engine; ignoring"
+        )
+
+    if not track or state.prepare_threshold is None:
+        return None
+    if state.tracker is None:
+        state.tracker = PreparedStatementTracker(
+            state.prepare_threshold, state.prepared_max
+        )
+        _attach_tracker(engine, state.tracker)
+    return state.tracker
+
+
+def _set_prepare_options(engine: Engine, prepare_threshold, prepared_max):
+    @event.listens_for(engine, "connect")
+    def set_prepare_options(dbapi_connection, connection_record):
+        dbapi_connection.prepare_threshold = prepare_threshold
+        dbapi_connection.prepared_max = prepared_max
+
+
+def _attach_tracker(engine: Engine, tracker: PreparedStatementTracker):
+    @event.listens_for(engine, "before_cursor_execute")
+    def observe(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            tracker.observe(conn.info, statement)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def clear_on_ddl(conn, cursor, statement, parameters, context, executemany):
+        if _clears_prepared.match(statement):
+            tracker.clear(conn.info)
+
+    @event.listens_for(engine, "rollback")
+    def clear_on_rollback(conn):
+        tracker.clear(conn.info)
+
+    @event.listens_for(engine, "reset")
+    def clear_on_reset(dbapi_connection, connection_record, reset_state):
+        tracker.clear(connection_record.info)
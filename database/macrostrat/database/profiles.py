@@ -0,0 +1,160 @@
+"""
+Named connection pool profiles.
+
+A ``PoolProfile`` bundles the engine settings that suit a kind of workload:
+pool size and overflow, connection recycling, pre-ping, a server-side
+statement timeout, the prepared-statement policy and the ``application_name``
+reported in ``pg_stat_activity``. Pass a profile name (or a ``PoolProfile``) to
+``Database``; any profile field passed as a keyword argument overrides the
+profile's value::
+
+    db = Database(url, profile="web", statement_timeout=5000)
+    db.profile  # PoolProfile(name='web', pool_size=10, ...)
+
+Fields set to None are left at SQLAlchemy's (or the server's) defaults.
+"""
+
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Optional, Union
+
+from .prepared import default_prepare_threshold, default_prepared_max
+
+
+@dataclass(frozen=True)
+class PoolProfile:
+    name: str
+    pool_size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    # Seconds after which connections are replaced
+    pool_recycle: Optional[int] = None
+    # Check that connections are alive before handing them out
+    pool_pre_ping: Optional[bool] = None
+    # Seconds to wait for a connection from a full pool
+    pool_timeout: Optional[float] = None
+    # Open a new connection for each checkout, instead of pooling
+    null_pool: bool = False
+    # Server-side statement timeout, in milliseconds
+    statement_timeout: Optional[int] = None
+    application_name: Optional[str] = None
+    # None disables server-side prepared statements
+    prepare_threshold: Optional[int] = default_prepare_threshold
+    prepared_max: int = default_prepared_max
+
+    def replace(self, **overrides) -> "PoolProfile":
+        """Return a copy of the profile with some fields changed."""
+        return replace(self, **overrides)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def engine_kwargs(self) -> dict:
+        """Keyword arguments for ``create_engine`` that apply the profile's pool
+        and connection settings (excluding the prepared-statement policy)."""
+        kwargs = {}
+        if self.null_pool:
+            from sqlalchemy.pool import NullPool
+
+            kwargs["poolclass"] = NullPool
+        else:
+            for key in ("pool_size", "max_overflow", "pool_timeout"):
+                value = getattr(self, key)
+                if value is not None:
+                    kwargs[key] = value
+        if self.pool_recycle is not None:
+            kwargs["pool_recycle"] = self.pool_recycle
+        if self.pool_pre_ping is not None:
+            kwargs["pool_pre_ping"] = self.pool_pre_ping
+
+        connect_args = {}
+        if self.statement_timeout is not None:
+            connect_args["options"] = f"-c statement_timeout={self.statement_timeout}"
+        if self.application_name is not None:
+            connect_args["application_name"] = self.application_name
+        if connect_args:
+            kwargs["connect_args"] = connect_args
+        return kwargs
+
+
+pool_profiles: dict[str, PoolProfile] = {}
+
+
+def register_pool_profile(profile: PoolProfile):
+    """Register a profile, so that it can be selected by name."""
+    pool_profiles[profile.name] = profile
+
+
+# SQLAlchemy's defaults
+register_pool_profile(PoolProfile("default"))
+
+# Many short requests from a long-lived process: a larger pool, stale
+# connections detected before use, and runaway queries cut off
+register_pool_profile(
+    PoolProfile(
+        "web",
+        pool_size=10,
+        max_overflow=20,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+        pool_timeout=10,
+        statement_timeout=30_000,
+        application_name="macrostrat-web",
+    )
+)
+
+# Long-running jobs on a few connections, without a statement timeout
+register_pool_profile(
+    PoolProfile(
+        "worker",
+        pool_size=2,
+        max_overflow=2,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+        application_name="macrostrat-worker",
+    )
+)
+
+# Short-lived command-line processes: connections aren't kept open
+register_pool_profile(
+    PoolProfile("cli", null_pool=True, application_name="macrostrat-cli")
+)
+
+# PgBouncer in transaction pooling mode: prepared statements don't survive
+# between transactions, and PgBouncer rejects the ``options`` startup parameter
+# (so a statement timeout should be set on the database role instead)
+register_pool_profile(
+    PoolProfile(
+        "pgbouncer",
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=300,
+        pool_pre_ping=True,
+        application_name="macrostrat",
+        prepare_threshold=None,
+    )
+)
+
+_profile_fields = {f.name for f in fields(PoolProfile)} - {"name"}
+
+
+def get_pool_profile(
+    profile: Union[str, PoolProfile, None] = None, **overrides
+) -> PoolProfile:
+    """Get a profile by name (or the default profile), with some fields
+    overridden."""
+    if profile is None:
+        profile = "default"
+    if isinstance(profile, str):
+        try:
+            profile = pool_profiles[profile]
+        except KeyError:
+            raise ValueError(
+                f"Unknown pool profile {profile!r} (expected one of {sorted(pool_profiles)})"
+            ) from None
+    if overrides:
+        profile = profile.replace(**overrides)
+    return profile
+
+
+def pop_profile_overrides(kwargs: dict) -> dict:
+    """Remove profile fields from a dictionary of keyword arguments."""
+    return {k: kwargs.pop(k) for k in list(kwargs) if k in _profile_fields}
@@ -1,22 +1,30 @@
+import codecs
 import os
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 from enum import Enum
+from functools import cached_property
+from itertools import islice, repeat
 from pathlib import Path
 from re import search
 from sys import stderr
+from threading import Lock
+from time import perf_counter
 from typing import Callable, Any, IO, Union
+from uuid import UUID
 from warnings import warn
+from weakref import WeakKeyDictionary
 
-import psycopg2.sql as psql2
-import sqlparse
-from click import secho
+from click import secho, style
 from psycopg.errors import QueryCanceled
-from psycopg.sql import SQL, Composable, Composed
-from rich.console import Console
+from psycopg.sql import SQL, Composable, Composed, Identifier, Literal, Placeholder
 from sqlalchemy import text
 from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
 from sqlalchemy.exc import (
+    DBAPIError,
     IntegrityError,
     InternalError,
     InvalidRequestError,
@@ -26,9 +34,21 @@ from sqlalchemy.exc import (
 from sqlalchemy.sql.elements import TextClause
 
 from macrostrat.database.compat import (
+    is_legacy_composable,
     update_legacy_identifier,
 )
 from macrostrat.utils import get_logger
+from .cache import LRUCache
+from .lexer import CopyFromStdin, split_statements
+from .output import (  # noqa: F401
+    ConsoleSink,
+    OutputSink,
+    _error_message,
+    _is_already_exists_error,
+    _print_error,
+    get_output_sink,
+    null_sink,
+)
 
 log = get_logger(__name__)
 
@@ -42,8 +62,7 @@ def infer_is_sql_text(_string: str) -> bool:
     if isinstance(_string, bytes):
         _string = _string.decode("utf-8")
 
-    lines = _string.split("\n")
-    if len(lines) > 1:
+    if "\n" in _string:
         return True
     return _starts_with_keyword(_string)
 
@@ -116,56 +135,173 @@ def get_sql_text(sql, interpret_as_file=None, echo_file_name=True):
     return sql
 
 
-def _get_queries(sql, *, interpret_as_file=None, format=False):
+def _get_queries(sql, *, interpret_as_file=None, use_cache=True):
+    if sql in [None, ""]:
+        return
+    return list(
+        _iter_queries(sql, interpret_as_file=interpret_as_file, use_cache=use_cache)
+    )
+
+
+def _iter_queries(sql, *, interpret_as_file=None, use_cache=True):
+    """Lazily yield the statements in a query, list of queries or SQL file."""
     if isinstance(sql, (list, tuple)):
-        queries = []
         for i in sql:
-            queries.extend(_get_queries(i, interpret_as_file=interpret_as_file))
-        return queries
-    if isinstance(sql, (SQL, psql2.SQL, TextClause)):
-        return [sql]
+            yield from _iter_queries(
+                i, interpret_as_file=interpret_as_file, use_cache=use_cache
+            )
+        return
+    if isinstance(sql, (SQL, TextClause)) or is_legacy_composable(sql, "SQL"):
+        yield sql
+        return
 
     if sql in [None, ""]:
         return
     if interpret_as_file:
-        sql = Path(sql).read_text()
+        sql = Path(sql)
+    elif hasattr(sql, "read"):
+        # Stream statements directly from file-like objects
+        yield from split_statements(sql)
+        return
     elif interpret_as_file is None:
         sql = canonicalize_query(sql)
 
-    if isinstance(sql, Path):
-        sql = sql.read_text()
+    if use_cache:
+        yield from statement_cache.iter_statements(sql)
+    elif isinstance(sql, Path):
+        with sql.open() as f:
+            yield from split_statements(f)
+    else:
+        yield from split_statements(sql)
 
-    # We're now dealing with a single string
 
-    # Quickly check for comments to see if we must strip them
-    if _has_comments(sql) or format:
-        sql = sqlparse.format(sql, strip_comments=True)
+# Statements that start, end or checkpoint a transaction
+_transaction_control = re.compile(
+    r"^\s*(?:--[^\n]*\n\s*)*"
+    r"(?:BEGIN|START\s+TRANSACTION|COMMIT|END|ROLLBACK|ABORT|SAVEPOINT|RELEASE"
+    r"|PREPARE\s+TRANSACTION)\b",
+    re.IGNORECASE,
+)
 
-    sql = sql.strip()
-    # If the last character is a semicolon, remove it
-    if sql.endswith(";"):
-        sql = sql[:-1]
 
-    if ";" not in sql:
-        # Fast path, only semicolons can be used to separate queries
-        return [sql]
+class StatementInfo(object):
+    """Connection-independent facts about a statement's SQL text, computed on demand."""
 
-    # Do the expensive SQL split operation
-    return sqlparse.split(sql)
+    def __init__(self, sql_text: str):
+        self.sql_text = sql_text
 
+    @cached_property
+    def escaped(self) -> str:
+        return escape_postgresql_cast_parameters(self.sql_text)
 
-def _is_prebind_param(param):
-    return isinstance(param, (Composable, psql2.Composable))
+    @cached_property
+    def has_server_binds(self) -> bool:
+        return infer_has_server_binds(self.sql_text)
 
+    @cached_property
+    def summary(self) -> str:
+        return summarize_statement(self.sql_text)
 
-def _has_comments(sql):
-    """Fast pre-check to see if a query has comments.
-    This saves us from formatting the query and doing a regex search"""
-    for line in sql.split("\n"):
-        line = line.strip()
-        if line.startswith("--") or line.startswith("/*"):
-            return True
-    return False
+    @cached_property
+    def controls_transaction(self) -> bool:
+        return _transaction_control.match(self.sql_text) is not None
+
+    @cached_property
+    def script_text(self) -> str | None:
+        """The statement as plain SQL that can be sent as part of a multi-statement
+        script, or None if it has bind parameters."""
+        if self.has_server_binds:
+            return None
+        compiled = text(self.sql_text).compile()
+        if len(compiled.params) > 0:
+            return None
+        return compiled.string.rstrip().rstrip(";")
+
+
+class StatementCache(object):
+    """
+    Bounded LRU cache of split statement lists and per-statement metadata, so
+    that repeatedly running the same SQL files or strings skips parsing entirely.
+
+    File sources are keyed on their resolved path, modification time and size,
+    so edited files are re-read; strings are keyed on their content.
+
+    Besides the number of entries, the caches are bounded by the total size of
+    the cached sources and statement texts (``max_total_size``, in characters).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        max_statements: int = 4096,
+        max_source_size: int = 2**20,
+        max_total_size: int = 2**25,
+    ):
+        self.max_source_size = max_source_size
+        self._sources = LRUCache(maxsize, maxweight=max_total_size)
+        self._statements = LRUCache(max_statements, maxweight=max_total_size)
+
+    def statements(self, source: Union[str, Path]) -> list:
+        return list(self.iter_statements(source))
+
+    def iter_statements(self, source: Union[str, Path]):
+        """Yield the statements in a SQL string or file, splitting them lazily
+        on a cache miss. Files larger than ``max_source_size`` are streamed
+        without being cached."""
+        if isinstance(source, Path):
+            stat = source.stat()
+            key = ("file", str(source.resolve()), stat.st_mtime_ns, stat.st_size)
+            size = stat.st_size
+        else:
+            key = ("text", source)
+            size = len(source)
+
+        queries = self._sources.get(key)
+        if queries is not None:
+            yield from queries
+            return
+
+        if isinstance(source, Path):
+            with source.open() as f:
+                queries = yield from self._collect(split_statements(f), size)
+        else:
+            queries = yield from self._collect(split_statements(source), size)
+        if queries is not None:
+            self._sources.put(key, tuple(queries), weight=size)
+
+    def _collect(self, statements, size):
+        # Only keep the statements if the source will be cached
+        if size > self.max_source_size:
+            yield from statements
+            return None
+        queries = []
+        for statement in statements:
+            # COPY data blocks are streamed, so they can't be replayed
+            if isinstance(statement, CopyFromStdin):
+                queries = None
+            if queries is not None:
+                queries.append(statement)
+            yield statement
+        return queries
+
+    def info(self, sql_text: str) -> StatementInfo:
+        return self._statements.get_or_create(
+            sql_text, lambda: StatementInfo(sql_text), weight=len(sql_text)
+        )
+
+    def clear(self):
+        self._sources.clear()
+        self._statements.clear()
+
+    def stats(self) -> dict:
+        return dict(sources=self._sources.stats(), statements=self._statements.stats())
+
+
+statement_cache = StatementCache()
+
+
+def _is_prebind_param(param):
+    return isinstance(param, Composable) or is_legacy_composable(param)
 
 
 def _split_params(params):
@@ -228,10 +364,105 @@ def _get_connection(connectable) -> Connection:
     return conn
 
 
+def _get_engine(connectable) -> Engine:
+    if isinstance(connectable, Engine):
+        return connectable
+    if isinstance(connectable, Connection):
+        return connectable.engine
+    # ORM sessions
+    return connectable.get_bind()
+
+
+# Rendered text of psycopg ``Composed``/``SQL`` trees that don't depend on a
+# connection's settings, keyed by the tree's structure
+rendered_query_cache = LRUCache(maxsize=1024)
+
+# Whether each engine's connections can render queries without a connection
+_offline_rendering = WeakKeyDictionary()
+
+# Python types whose literal rendering is the same for any UTF-8 connection
+_plain_literal_types = (
+    str,
+    int,
+    float,
+    bool,
+    type(None),
+    Decimal,
+    date,
+    datetime,
+    time,
+    timedelta,
+    UUID,
+)
+
+
+def _composable_key(query: Composable):
+    """A hashable key describing a psycopg composable, or None if it contains
+    values that can't be cached safely."""
+    if isinstance(query, Composed):
+        keys = tuple(_composable_key(q) for q in query._obj)
+        if any(k is None for k in keys):
+            return None
+        return ("C", keys)
+    if isinstance(query, SQL):
+        return ("S", query._obj)
+    if isinstance(query, Identifier):
+        return ("I", query._obj)
+    if isinstance(query, Placeholder):
+        return ("P", query._obj, query._format)
+    if isinstance(query, Literal):
+        value = query._obj
+        if type(value) not in _plain_literal_types:
+            return None
+        return ("L", type(value), value)
+    return None
+
+
+def _can_render_offline(connectable) -> bool:
+    """Check whether queries for this connectable can be rendered without a
+    connection. This is the case for PostgreSQL connections using UTF-8 with
+    ``standard_conforming_strings`` on (the defaults), which are checked once
+    per engine."""
+    try:
+        engine = _get_engine(connectable)
+    except AttributeError:
+        return False
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg":
+        return False
+    if engine in _offline_rendering:
+        return _offline_rendering[engine]
+
+    if isinstance(connectable, Engine):
+        with connectable.connect() as conn:
+            info = conn.connection.driver_connection.info
+    else:
+        info = _get_connection(connectable).connection.driver_connection.info
+    offline = (
+        codecs.lookup(info.encoding).name == "utf-8"
+        and info.parameter_status("standard_conforming_strings") == "on"
+    )
+    _offline_rendering[engine] = offline
+    return offline
+
+
 def _render_query(query: Union[SQL, Composed], connectable: Union[Engine, Connection]):
-    """Render a query to a SQL string."""
+    """Render a query to a SQL string.
+
+    Where possible, queries are rendered without a connection, and the text is
+    memoized for identical query trees.
+    """
     if not isinstance(query, (Composed, SQL)):
         return query
+
+    if _can_render_offline(connectable):
+        key = _composable_key(query)
+        if key is None:
+            return query.as_string(None)
+        return rendered_query_cache.get_or_create(key, lambda: query.as_string(None))
+
+    if isinstance(connectable, Engine):
+        with connectable.connect() as conn:
+            return query.as_string(_get_cursor(conn))
     # Find a connection or cursor object for the connectable
     conn = _get_cursor(connectable)
     return query.as_string(conn)
@@ -254,7 +485,7 @@ class OutputMode(Enum):
     ALL = "all"
 
 
-def _normalize_output_args(kwargs):
+def _normalize_output_args(kwargs) -> tuple[OutputMode, OutputSink]:
     output_mode = kwargs.pop("output_mode", OutputMode.SUMMARY)
     output_file = kwargs.pop("output_file", stderr)
 
@@ -262,8 +493,8 @@ def _normalize_output_args(kwargs):
         output_mode = OutputMode(output_mode)
 
     if output_mode == OutputMode.NONE:
-        output_file = open(os.devnull, "w")
-    return output_mode, output_file
+        return output_mode, null_sink
+    return output_mode, get_output_sink(output_file)
 
 
 @dataclass
@@ -289,6 +520,23 @@ class StatementDirective:
 StatementResult = StatementDirective
 
 
+class BufferedResult(IteratorResult):
+    """The buffered result of a statement run directly on the driver (in a
+    pipeline or a multi-statement script), with the interface of SQLAlchemy's
+    ``CursorResult``: rows are fetched from the cursor when the result is
+    created, and ``rowcount`` and ``returns_rows`` are kept."""
+
+    def __init__(self, cursor):
+        self.rowcount = cursor.rowcount
+        self.returns_rows = cursor.description is not None
+        keys = [col.name for col in cursor.description or ()]
+        rows = cursor.fetchall() if self.returns_rows else []
+        super().__init__(SimpleResultMetaData(keys), iter(rows))
+        if not self.returns_rows:
+            # Like a ``CursorResult`` for a statement that doesn't return rows
+            self._soft_close(hard=True)
+
+
 @dataclass
 class StatementContext:
     """What a hook is told: the statement currently being processed."""
@@ -299,7 +547,83 @@ class StatementContext:
     sql_text: str
 
 
+@dataclass
+class StatementRecord:
+    """What happened when a statement was executed.
+
+    Passed to the ``on_statement`` callback after each statement runs. For
+    pipelined statements, ``wall_time`` is an equal share of the batch's time.
+    """
+
+    index: int | None
+    summary: str
+    wall_time: float
+    rowcount: int | None = None
+    error: Exception | None = None
+    source: str | None = None
+    # Set if an ``on_error`` handler recovered from the error
+    recovered: bool = False
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+@dataclass
+class ExecutionReport:
+    """Aggregated records of executed statements.
+
+    Pass as ``report=`` to ``run_sql`` to collect records; ``run_fixtures``
+    returns one. Records may be added concurrently from multiple threads.
+    """
+
+    records: list[StatementRecord] = field(default_factory=list)
+    # Files that encountered errors, for parallel fixture runs
+    failures: list = field(default_factory=list)
+    # Fixture files that were run, or skipped as unchanged (incremental runs)
+    applied: list[Path] = field(default_factory=list)
+    skipped: list[Path] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._lock = Lock()
+
+    def add(self, record: StatementRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def total_time(self) -> float:
+        return sum(r.wall_time for r in self.records)
+
+    @property
+    def errors(self) -> list[StatementRecord]:
+        return [r for r in self.records if r.failed]
+
+    def slowest(self, n: int = 10) -> list[StatementRecord]:
+        return sorted(self.records, key=lambda r: r.wall_time, reverse=True)[:n]
+
+    def print_slowest(self, n: int = 10, file: Union[IO, OutputSink] = None):
+        output = get_output_sink(file)
+        output.message(
+            style(
+                f"Slowest statements ({len(self)} run in {self.total_time:.2f} s):",
+                bold=True,
+            )
+        )
+        for record in self.slowest(n):
+            location = f"#{record.index}" if record.index is not None else ""
+            if record.source is not None:
+                location = f"{Path(record.source).name} {location}"
+            line = f"{record.wall_time:9.3f} s  {location:24} {record.summary}"
+            output.message(style(line, fg="red" if record.failed else None))
+        output.flush()
+
+
 TransformFn = Callable[[StatementContext], list[StatementDirective] | None]
+StatementCallback = Callable[[StatementRecord], None]
 Connectable = Union[Engine, Connection]
 
 # Called when a statement raises. It may return a list of StatementDirectives to
@@ -326,6 +650,7 @@ def _run_sql(
     *,
     print_skipped=True,
     use_transaction=True,
+    single_transaction=False,
     **kwargs,
 ):
     """
@@ -335,13 +660,21 @@ def _run_sql(
     """
     if isinstance(connectable, Engine):
         with connectable.connect() as conn:
-            yield from _run_sql(conn, sql, params, **kwargs)
+            yield from _run_sql(
+                conn,
+                sql,
+                params,
+                print_skipped=print_skipped,
+                use_transaction=use_transaction,
+                single_transaction=single_transaction,
+                **kwargs,
+            )
             return
 
     stop_on_error = kwargs.pop("stop_on_error", False)
     raise_errors = kwargs.pop("raise_errors", False)
     ensure_single_query = kwargs.pop("ensure_single_query", False)
-    output_mode, output_file = _normalize_output_args(kwargs)
+    output_mode, output = _normalize_output_args(kwargs)
     has_server_binds = kwargs.pop("has_server_binds", None)
 
     statement_filter = kwargs.pop("statement_filter", None)
@@ -365,18 +698,125 @@ def _run_sql(
         transform_statement = _statement_filter_to_transform(statement_filter)
 
     interpret_as_file = kwargs.pop("interpret_as_file", None)
-    queries = _get_queries(sql, interpret_as_file=interpret_as_file)
+    slowest = kwargs.pop("slowest", None)
+    report: ExecutionReport | None = kwargs.pop("report", None)
+    if slowest and report is None:
+        report = ExecutionReport()
+    on_statement = _statement_callback(
+        kwargs.pop("on_statement", None),
+        report,
+        source=str(sql) if isinstance(sql, Path) or interpret_as_file else None,
+    )
 
-    if queries is None:
-        return
+    # Statements are split lazily, unless we need to know how many there are
+    queries = _iter_queries(sql, interpret_as_file=interpret_as_file)
+    if ensure_single_query or isinstance(params, list):
+        queries = list(queries)
 
     if ensure_single_query and len(queries) > 1:
         raise ValueError("Multiple queries passed when only one was expected")
 
-    if not isinstance(params, list) or not len(params) == len(queries):
-        params = [params] * len(queries)
+    if isinstance(params, list) and len(params) == len(queries):
+        all_params = params
+    else:
+        all_params = repeat(params)
+
+    exec_kwargs = dict(
+        raise_errors=raise_errors,
+        output_mode=output_mode,
+        print_skipped=print_skipped,
+        has_server_binds=has_server_binds,
+        use_transaction=use_transaction,
+        in_transaction=single_transaction,
+        on_error=on_error,
+        on_statement=on_statement,
+    )
+
+    pipeline = kwargs.pop("pipeline", False)
+    pipeline_batch_size = kwargs.pop("pipeline_batch_size", 500)
+    batch = kwargs.pop("batch", False)
+    if pipeline and batch:
+        raise ValueError("Cannot specify both pipeline and batch")
+    if pipeline and not _supports_pipeline(connectable):
+        warn("Pipeline mode requires the psycopg driver with libpq >= 14; ignoring")
+        pipeline = False
+    if batch and not _is_psycopg(connectable):
+        warn("Batch mode requires the psycopg driver; ignoring")
+        batch = False
+
+    results = _run_statements(
+        connectable,
+        queries,
+        all_params,
+        output,
+        transform_statement=transform_statement,
+        pipeline=pipeline,
+        pipeline_batch_size=pipeline_batch_size,
+        batch=batch,
+        **exec_kwargs,
+    )
+    if single_transaction:
+        results = _single_transaction(connectable, results)
+    try:
+        yield from results
+    finally:
+        output.flush()
+
+    if slowest:
+        report.print_slowest(slowest, file=output)
+
 
-    for index, (query, _params) in enumerate(zip(queries, params)):
+def _single_transaction(connectable, results):
+    """Run all statements in one transaction, which is committed once they have
+    all run and rolled back otherwise (if an error is raised, or the results are
+    not consumed to the end)."""
+    trans = None
+    try:
+        trans = connectable.begin()
+    except InvalidRequestError:
+        # Already in a transaction (e.g. an autobegun session)
+        pass
+
+    try:
+        yield from results
+    except BaseException:
+        # Including GeneratorExit, when iteration stops early
+        if trans is not None:
+            trans.rollback()
+        elif hasattr(connectable, "rollback"):
+            connectable.rollback()
+        raise
+    else:
+        if trans is not None:
+            trans.commit()
+        elif hasattr(connectable, "commit"):
+            connectable.commit()
+
+
+def _run_statements(
+    connectable,
+    queries,
+    all_params,
+    output: OutputSink,
+    *,
+    transform_statement: TransformFn | None,
+    pipeline: bool,
+    pipeline_batch_size: int,
+    batch: bool,
+    **exec_kwargs,
+):
+    # Consecutive statements that can be sent together are collected into
+    # batches, for pipeline mode or as multi-statement scripts
+    execute_batch = None
+    if pipeline:
+        execute_batch, can_batch = _execute_pipeline, _can_pipeline
+        max_batch_size = pipeline_batch_size
+    elif batch:
+        execute_batch, can_batch = _execute_script, _can_script
+        max_batch_size = None
+
+    pending = []
+    for index, (query, _params) in enumerate(zip(queries, all_params)):
         _query, sql_text, rest_params = _render_query_text(connectable, query, _params)
         if sql_text == "":
             continue
@@ -391,29 +831,59 @@ def _run_sql(
             results = [StatementDirective(query=query, params=_params)]
 
         for result in results:
+            if execute_batch is not None and can_batch(connectable, ctx, result):
+                pending.append((ctx, result))
+                if max_batch_size is not None and len(pending) >= max_batch_size:
+                    yield from execute_batch(
+                        connectable, pending, output, **exec_kwargs
+                    )
+                    pending = []
+                continue
+            if len(pending) > 0:
+                yield from execute_batch(connectable, pending, output, **exec_kwargs)
+                pending = []
             yield from _execute_one(
-                connectable,
-                result,
-                output_file,
-                raise_errors=raise_errors,
-                output_mode=output_mode,
-                print_skipped=print_skipped,
-                has_server_binds=has_server_binds,
-                use_transaction=use_transaction,
-                on_error=on_error,
-                context=ctx,
+                connectable, result, output, context=ctx, **exec_kwargs
             )
 
+    if len(pending) > 0:
+        yield from execute_batch(connectable, pending, output, **exec_kwargs)
+
+
+def _statement_callback(
+    on_statement: StatementCallback | None,
+    report: ExecutionReport | None,
+    source: str | None = None,
+) -> StatementCallback | None:
+    """Combine a user callback and a report into a single ``on_statement`` hook."""
+    if on_statement is None and report is None:
+        return None
+
+    def callback(record: StatementRecord):
+        record.source = source
+        if report is not None:
+            report.add(record)
+        if on_statement is not None:
+            on_statement(record)
+
+    return callback
+
+
+def _get_rowcount(res) -> int | None:
+    if isinstance(res, int):
+        return res
+    return getattr(res, "rowcount", None)
+
 
 def _render_query_text(connectable, query, params):
     params, pre_bind_params = _split_params(params)
-    if isinstance(query, (psql2.SQL, psql2.Composed)):
+    if is_legacy_composable(query, "SQL", "Composed"):
         query = update_legacy_identifier(query)
 
     if isinstance(query, str):
         # Escape postgresql cast parameters after SQLAlchemy binds
         # (e.g., :param::text)
-        query = escape_postgresql_cast_parameters(query)
+        query = statement_cache.info(query).escaped
 
     if pre_bind_params is not None:
         if not isinstance(query, SQL):
@@ -439,95 +909,444 @@ def escape_postgresql_cast_parameters(sql_text):
     return sql_text
 
 
+def _get_display_text(result: StatementDirective, sql_text: str, output_mode):
+    if result.label is not None:
+        return result.label
+    if output_mode == OutputMode.NONE:
+        return None
+    if output_mode != OutputMode.ALL:
+        return statement_cache.info(sql_text).summary
+    return sql_text
+
+
+def _compile_driver_query(
+    connection: Connection, query, sql_text: str, params, has_server_binds=None
+):
+    """Compile a rendered statement (from ``_render_query_text``) to SQL text and
+    parameters that can be passed directly to the DBAPI driver, bypassing
+    SQLAlchemy's execution machinery."""
+    if has_server_binds is None:
+        has_server_binds = statement_cache.info(sql_text).has_server_binds
+    if has_server_binds:
+        return sql_text, params
+
+    if not isinstance(query, TextClause):
+        query = text(query)
+    compiled = query.compile(dialect=connection.dialect)
+    # Always pass parameters so that escaped percent signs are unescaped
+    return compiled.string, compiled.construct_params(params or {})
+
+
+def _is_psycopg(connectable) -> bool:
+    conn = _get_connection(connectable)
+    return (
+        getattr(conn, "dialect", None) is not None and conn.dialect.driver == "psycopg"
+    )
+
+
+def _supports_pipeline(connectable) -> bool:
+    if not _is_psycopg(connectable):
+        return False
+    from psycopg import Pipeline
+
+    return Pipeline.is_supported()
+
+
+def _can_pipeline(
+    connectable, ctx: StatementContext, result: StatementDirective
+) -> bool:
+    # COPY can't run in pipeline mode, and executemany batches itself
+    if result.skip or isinstance(result.query, CopyFromStdin):
+        return False
+    if isinstance(result.params, list):
+        return False
+    # A failed batch is only re-run if it was rolled back as a whole, so it
+    # can't commit part of its work
+    return not statement_cache.info(ctx.sql_text).controls_transaction
+
+
+def _can_script(connectable, ctx: StatementContext, result: StatementDirective) -> bool:
+    if not _can_pipeline(connectable, ctx, result):
+        return False
+    sql_text = ctx.sql_text
+    if result.query is not ctx.query or result.params is not ctx.params:
+        _, sql_text, _ = _render_query_text(connectable, result.query, result.params)
+    return statement_cache.info(sql_text).script_text is not None
+
+
+def _execute_pipeline(
+    connectable,
+    batch: list[tuple[StatementContext, StatementDirective]],
+    output: OutputSink,
+    *,
+    output_mode: OutputMode = OutputMode.SUMMARY,
+    has_server_binds: bool | None = None,
+    use_transaction: bool = True,
+    in_transaction: bool = False,
+    on_statement: StatementCallback | None = None,
+    **kwargs,
+):
+    """
+    Send a batch of statements through psycopg's pipeline mode, waiting for a
+    single round trip rather than one per statement. The batch runs in one
+    transaction (or a savepoint, within an enclosing transaction); if any
+    statement fails, it is rolled back and re-run statement by statement so
+    that errors map back to their ``StatementContext`` and the usual
+    ``on_error``/``raise_errors`` handling applies.
+
+    If the batch couldn't be rolled back (on an autocommit connection),
+    statements before the failing one may have been committed, so it isn't
+    re-run: the error is raised for the failing statement.
+
+    Yields a ``BufferedResult`` for each statement.
+    """
+    trans = None
+    if in_transaction:
+        trans = connectable.begin_nested()
+    elif use_transaction:
+        try:
+            trans = connectable.begin()
+        except InvalidRequestError:
+            pass
+
+    conn = _get_connection(connectable)
+    driver_conn = conn.connection.driver_connection
+    cursors = []
+    display_texts = []
+    summaries = []
+    start = perf_counter()
+    try:
+        with driver_conn.pipeline() as pipeline:
+            for ctx, result in batch:
+                query, sql_text, params = _render_query_text(
+                    conn, result.query, result.params
+                )
+                sql, params = _compile_driver_query(
+                    conn, query, sql_text, params, has_server_binds
+                )
+                display_texts.append(_get_display_text(result, sql_text, output_mode))
+                summaries.append(statement_cache.info(sql_text).summary)
+                log.debug("Executing SQL in pipeline: \n %s", sql)
+                cursor = driver_conn.cursor()
+                cursor.execute(sql, params)
+                cursors.append(cursor)
+            pipeline.sync()
+    except Exception as err:
+        rolled_back = not driver_conn.autocommit
+        if trans is not None:
+            trans.rollback()
+        elif hasattr(connectable, "rollback"):
+            connectable.rollback()
+        else:
+            rolled_back = False
+        if not rolled_back:
+            _raise_pipeline_error(conn, batch, cursors, err, start, on_statement)
+        log.debug("Pipelined batch failed (%s); re-running statements singly", err)
+        for ctx, result in batch:
+            yield from _execute_one(
+                connectable,
+                result,
+                output,
+                output_mode=output_mode,
+                has_server_binds=has_server_binds,
+                use_transaction=use_transaction,
+                in_transaction=in_transaction,
+                on_statement=on_statement,
+                context=ctx,
+                **kwargs,
+            )
+        return
+    wall_time = (perf_counter() - start) / len(batch)
+
+    if trans is not None:
+        trans.commit()
+    elif not in_transaction and hasattr(connectable, "commit"):
+        connectable.commit()
+
+    results = []
+    for cursor in cursors:
+        results.append(BufferedResult(cursor))
+        cursor.close()
+
+    for (ctx, _), summary, display_text, res in zip(
+        batch, summaries, display_texts, results
+    ):
+        if on_statement is not None:
+            on_statement(
+                StatementRecord(
+                    index=ctx.index,
+                    summary=summary,
+                    wall_time=wall_time,
+                    rowcount=res.rowcount,
+                )
+            )
+        if display_text is not None:
+            output.statement(display_text)
+        yield res
+
+
+def _raise_pipeline_error(
+    conn: Connection,
+    batch: list[tuple[StatementContext, StatementDirective]],
+    cursors: list,
+    err: Exception,
+    start: float,
+    on_statement: StatementCallback | None,
+):
+    # Statements before the failing one have results; later ones were aborted
+    index = next(
+        (i for i, cursor in enumerate(cursors) if cursor.pgresult is None),
+        len(cursors),
+    )
+    ctx, _ = batch[min(index, len(batch) - 1)]
+    summary = statement_cache.info(ctx.sql_text).summary
+    log.error(
+        "Statement %s (%s) of a pipelined batch failed on an autocommit "
+        "connection; earlier statements may have been committed, so the batch "
+        "is not re-run",
+        ctx.index,
+        summary,
+    )
+    dbapi = conn.dialect.loaded_dbapi
+    if isinstance(err, dbapi.Error):
+        err = DBAPIError.instance(ctx.sql_text, ctx.params, err, dbapi.Error)
+    if on_statement is not None:
+        on_statement(
+            StatementRecord(
+                index=ctx.index,
+                summary=summary,
+                wall_time=perf_counter() - start,
+                error=err,
+            )
+        )
+    raise err
+
+
+def _execute_script(
+    connectable,
+    batch: list[tuple[StatementContext, StatementDirective]],
+    output: OutputSink,
+    *,
+    output_mode: OutputMode = OutputMode.SUMMARY,
+    use_transaction: bool = True,
+    in_transaction: bool = False,
+    on_statement: StatementCallback | None = None,
+    **kwargs,
+):
+    """
+    Send a batch of parameter-free statements to the server as a single script,
+    using the simple query protocol, so that they run in one round trip. The batch
+    runs in one transaction (or a savepoint, within an enclosing transaction). If
+    it fails, it is rolled back and bisected until the failing statement is run on
+    its own, so that the usual ``on_error``/``raise_errors`` handling applies.
+
+    Yields a ``BufferedResult`` for each statement, read before the cursor
+    is advanced to the next statement's result.
+    """
+    trans = None
+    if in_transaction:
+        trans = connectable.begin_nested()
+    elif use_transaction:
+        try:
+            trans = connectable.begin()
+        except InvalidRequestError:
+            pass
+
+    conn = _get_connection(connectable)
+    driver_conn = conn.connection.driver_connection
+    sql_texts = [
+        _render_query_text(conn, result.query, result.params)[1] for _, result in batch
+    ]
+    script = ";\n".join(statement_cache.info(t).script_text for t in sql_texts)
+    cursor = driver_conn.cursor()
+    start = perf_counter()
+    try:
+        log.debug("Executing SQL script: \n %s", script)
+        # Without parameters, psycopg uses the simple query protocol
+        cursor.execute(script, prepare=False)
+    except Exception as err:
+        if trans is not None:
+            trans.rollback()
+        elif not in_transaction and hasattr(connectable, "rollback"):
+            connectable.rollback()
+        kwargs.update(
+            output_mode=output_mode,
+            use_transaction=use_transaction,
+            in_transaction=in_transaction,
+            on_statement=on_statement,
+        )
+        if len(batch) == 1:
+            ctx, result = batch[0]
+            yield from _execute_one(connectable, result, output, context=ctx, **kwargs)
+            return
+        log.debug("Script of %d statements failed (%s); bisecting", len(batch), err)
+        mid = len(batch) // 2
+        yield from _execute_script(connectable, batch[:mid], output, **kwargs)
+        yield from _execute_script(connectable, batch[mid:], output, **kwargs)
+        return
+    wall_time = (perf_counter() - start) / len(batch)
+
+    if trans is not None:
+        trans.commit()
+    elif not in_transaction and hasattr(connectable, "commit"):
+        connectable.commit()
+
+    results = []
+    for i in range(len(batch)):
+        if i > 0:
+            cursor.nextset()
+        results.append(BufferedResult(cursor))
+    cursor.close()
+
+    for (ctx, result), sql_text, res in zip(batch, sql_texts, results):
+        if on_statement is not None:
+            on_statement(
+                StatementRecord(
+                    index=ctx.index,
+                    summary=statement_cache.info(sql_text).summary,
+                    wall_time=wall_time,
+                    rowcount=res.rowcount,
+                )
+            )
+        display_text = _get_display_text(result, sql_text, output_mode)
+        if display_text is not None:
+            output.statement(display_text)
+        yield res
+
+
 def _execute_one(
     connectable,
     result: StatementDirective,
-    output_file: IO,
+    output: OutputSink,
     *,
     raise_errors: bool = True,
     output_mode: OutputMode = OutputMode.SUMMARY,
     has_server_binds: bool | None = None,
     print_skipped: bool = True,
     use_transaction: bool = True,
+    in_transaction: bool = False,
     on_error: "RecoveryFn | None" = None,
+    on_statement: StatementCallback | None = None,
     context: "StatementContext | None" = None,
     _recovering: bool = False,
 ):
     params = result.params
 
     query, sql_text, _params = _render_query_text(connectable, result.query, params)
+    info = statement_cache.info(sql_text)
     if has_server_binds is None:
-        has_server_binds = infer_has_server_binds(sql_text)
+        has_server_binds = info.has_server_binds
 
-    if result.label is not None:
-        display_text = result.label
-    elif output_mode == OutputMode.NONE:
-        display_text = None
-    elif output_mode != OutputMode.ALL:
-        display_text = summarize_statement(str(query))
-    else:
-        display_text = str(query)
+    display_text = _get_display_text(result, sql_text, output_mode)
 
     if result.skip:
         if print_skipped and display_text is not None:
-            secho(display_text, dim=True, strikethrough=True, file=output_file)
+            output.statement(display_text, skipped=True)
         return
 
     trans = None
-    if use_transaction:
+    if in_transaction:
+        # Within an enclosing transaction, a savepoint lets us continue past a
+        # failed statement. It isn't needed if errors abort the transaction.
+        if not raise_errors or (on_error is not None and not _recovering):
+            trans = connectable.begin_nested()
+    elif use_transaction:
         try:
             trans = connectable.begin()
         except InvalidRequestError:
             pass
 
+    index = context.index if context is not None else None
+    start = perf_counter()
     try:
         log.debug("Executing SQL: \n %s", query)
-        if has_server_binds:
+        if isinstance(result.query, CopyFromStdin):
+            res = _copy_from_stdin(connectable, result.query)
+        elif has_server_binds:
             conn = _get_connection(connectable)
             res = conn.exec_driver_sql(query, _params)
         else:
             if not isinstance(query, TextClause):
                 query = text(query)
             res = connectable.execute(query, _params)
+        wall_time = perf_counter() - start
 
         yield res
 
         if trans is not None:
             trans.commit()
-        elif hasattr(connectable, "commit"):
+        elif not in_transaction and hasattr(connectable, "commit"):
             connectable.commit()
 
+        if on_statement is not None:
+            on_statement(
+                StatementRecord(
+                    index=index,
+                    summary=info.summary,
+                    wall_time=wall_time,
+                    rowcount=_get_rowcount(res),
+                )
+            )
+
         if display_text is not None:
-            secho(display_text, dim=True, file=output_file)
+            output.statement(display_text)
 
     except Exception as err:
         if trans is not None:
             trans.rollback()
-        elif hasattr(connectable, "rollback"):
+        elif not in_transaction and hasattr(connectable, "rollback"):
             connectable.rollback()
 
+        wall_time = perf_counter() - start
+
         # Give an error handler a chance to recover (e.g. drop-and-recreate).
         # Recovery statements run with on_error disabled to prevent loops.
+        recovery = None
         if on_error is not None and not _recovering and context is not None:
             recovery = on_error(context, err, connectable)
-            if recovery is not None:
-                for _stmt in recovery:
-                    yield from _execute_one(
-                        connectable,
-                        _stmt,
-                        output_file,
-                        raise_errors=raise_errors,
-                        output_mode=output_mode,
-                        print_skipped=print_skipped,
-                        use_transaction=use_transaction,
-                        _recovering=True,
-                    )
-                return
+
+        if on_statement is not None:
+            on_statement(
+                StatementRecord(
+                    index=index,
+                    summary=info.summary,
+                    wall_time=wall_time,
+                    error=err,
+                    recovered=recovery is not None,
+                )
+            )
+
+        if recovery is not None:
+            for _stmt in recovery:
+                yield from _execute_one(
+                    connectable,
+                    _stmt,
+                    output,
+                    raise_errors=raise_errors,
+                    output_mode=output_mode,
+                    print_skipped=print_skipped,
+                    use_transaction=use_transaction,
+                    in_transaction=in_transaction,
+                    on_statement=on_statement,
+                    _recovering=True,
+                )
+            return
 
         if raise_errors or _should_raise_query_error(err):
             raise err
         if display_text is not None:
-            _print_error(display_text, err, file=output_file)
+            output.error(display_text, err)
+
+
+def _copy_from_stdin(connectable, statement: CopyFromStdin) -> int:
+    """Run a COPY ... FROM stdin statement with its inline data block using the
+    psycopg driver connection. Returns the number of rows copied."""
+    conn = _get_connection(connectable).connection.driver_connection
+    with conn.cursor() as cursor:
+        with cursor.copy(str(statement)) as copy:
+            for chunk in statement.iter_data():
+                copy.write(chunk)
+        return cursor.rowcount
 
 
 def _should_raise_query_error(err):
@@ -554,26 +1373,13 @@ def _should_raise_query_error(err):
     return False
 
 
-def _print_error(sql_text, err, **kwargs):
-    if orig := getattr(err, "orig", None):
-        _err = str(orig)
-    else:
-        _err = str(err)
-    _err = _err.strip()
-    # Decide whether error should be dimmed
-    dim = kwargs.pop("dim", "already exists" in _err)
-    secho(sql_text, fg=None if dim else "red", dim=True, **kwargs)
-    if dim:
-        _err = "  " + _err
-    secho(_err, fg="red", dim=dim, **kwargs)
-    log.error(err)
-
-
 def run_sql_file(connectable, filename, params=None, **kwargs):
     return run_sql(connectable, filename, params, interpret_as_file=True, **kwargs)
 
 
 def run_query(connectable, query, params=None, **kwargs):
+    if kwargs.pop("many", False):
+        return run_many(connectable, query, params, **kwargs)
     return next(
         iter(
             _run_sql(
@@ -589,6 +1395,33 @@ def run_query(connectable, query, params=None, **kwargs):
     )
 
 
+def run_many(connectable, sql, params, *, batch_size=1000, **kwargs) -> int:
+    """
+    Execute a single statement once for each of an iterable of parameter sets,
+    using the driver's executemany path.
+
+    Parameter sets are consumed lazily and sent in batches of ``batch_size``,
+    so arbitrarily large iterators can be loaded with bounded memory. Each batch
+    runs in its own transaction unless ``use_transaction=False``.
+
+    Returns the total number of rows affected.
+    """
+    if isinstance(connectable, Engine):
+        with connectable.connect() as conn:
+            return run_many(conn, sql, params, batch_size=batch_size, **kwargs)
+
+    kwargs.setdefault("raise_errors", True)
+    params = iter(params)
+    total = 0
+    while batch := list(islice(params, batch_size)):
+        # A single-item list of parameter lists maps the batch to the statement
+        for res in _run_sql(
+            connectable, sql, [batch], ensure_single_query=True, **kwargs
+        ):
+            total += max(res.rowcount, 0)
+    return total
+
+
 def get_sql_files(
     fixtures: Union[Path, list[Path]], recursive=False, order_by_name=True
 ):
@@ -612,33 +1445,131 @@ def _get_sql_files(fixture: Path, recursive=False):
     return [r for r in files if r.is_file()]
 
 
+def fixture_root(fixtures: Union[Path, list[Path]]) -> Path:
+    """The directory that fixture paths are named relative to: the fixture
+    directory itself, or the directory containing a fixture file (or the common
+    parent of several). Unlike the common path of the SQL files found, this
+    doesn't depend on which files are selected."""
+    if isinstance(fixtures, Path):
+        fixtures = [fixtures]
+    dirs = [f if f.is_dir() else f.parent for f in (Path(f) for f in fixtures)]
+    return Path(os.path.commonpath(dirs))
+
+
 def run_fixtures(connectable, fixtures: Union[Path, list[Path]], params=None, **kwargs):
     """
     Run a set of SQL fixture files on a database. Fixtures can be passed as a list of file paths or a directory.
     Fixtures are ordered by name by default, but this can be disabled.
+
+    Returns an ``ExecutionReport`` with a ``StatementRecord`` for each executed
+    statement. Pass ``slowest=N`` to print the N slowest statements at the end.
+
+    With ``parallel=N``, fixtures are grouped into stages from ``-- depends-on:``
+    declarations in file headers, and up to N files per stage are run
+    concurrently on separate pooled connections. These run outside of any
+    transaction open on ``connectable``. Files that don't declare dependencies
+    wait for the file before them, so they keep their place in name order,
+    unless ``stage_by_directory=True`` lets them run concurrently within each
+    directory. See ``macrostrat.database.fixtures``.
+
+    With ``incremental=True``, the content and parameter hashes of each fixture
+    file are recorded in a ledger table (``ledger_table``, by default
+    ``macrostrat_meta.applied_fixtures``) when it runs without errors (other
+    than "already exists" errors, or errors recovered by ``on_error``), and
+    unchanged files are skipped on later runs. ``force`` takes a list of glob
+    patterns for files to re-run regardless. Applied and skipped files are
+    listed on the returned report. Files are recorded by their path relative to
+    ``ledger_root`` (by default the fixture directory, or the directory
+    containing the fixture files), so running a single file from a directory
+    matches the entry recorded when running the whole directory.
     """
     recursive = kwargs.pop("recursive", False)
     order_by_name = kwargs.pop("order_by_name", True)
-    output_mode, output_file = _normalize_output_args(kwargs)
+    parallel = kwargs.pop("parallel", None)
+    stage_by_directory = kwargs.pop("stage_by_directory", False)
+    slowest = kwargs.pop("slowest", None)
+    incremental = kwargs.pop("incremental", False)
+    force = kwargs.pop("force", None)
+    ledger_table = kwargs.pop("ledger_table", "macrostrat_meta.applied_fixtures")
+    ledger_root = kwargs.pop("ledger_root", None)
+    report = kwargs.pop("report", None) or ExecutionReport()
+    output_mode, output = _normalize_output_args(kwargs)
+
+    console = kwargs.pop("console", None)
+    if console is not None and isinstance(output, ConsoleSink):
+        # Print messages through a rich console provided by the caller
+        output = ConsoleSink(output.file, console=console)
 
-    console = kwargs.pop("console", Console(stderr=True, file=output_file))
     files = get_sql_files(fixtures, recursive=recursive, order_by_name=order_by_name)
 
-    prefix = os.path.commonpath(files)
+    prefix = fixture_root(fixtures)
+
+    output.message("Running fixtures in " + style(str(prefix), fg="cyan", bold=True))
+
+    ledger = None
+    if incremental:
+        from .fixtures import FixtureLedger
+
+        ledger = FixtureLedger(
+            connectable, ledger_root or prefix, params, table=ledger_table
+        )
+        files, report.skipped = ledger.plan(files, force=force)
 
-    console.print(f"Running fixtures in [cyan bold]{prefix}[/]")
-    for fixture in files:
-        fn = fixture.relative_to(prefix)
-        console.print(f"[cyan bold]{fn}[/]")
-        run_sql_file(
+    if parallel is not None and parallel > 1:
+        from .fixtures import run_fixtures_parallel
+
+        report.failures = run_fixtures_parallel(
             connectable,
-            fixture,
+            files,
             params,
+            parallel=parallel,
+            output=output,
+            prefix=prefix,
+            stage_by_directory=stage_by_directory,
             output_mode=output_mode,
-            output_file=output_file,
+            report=report,
             **kwargs,
         )
-        console.print()
+        failed = {f.file for f in report.failures}
+        for fixture in files:
+            if fixture in failed:
+                continue
+            report.applied.append(fixture)
+            if ledger is not None:
+                ledger.record(fixture)
+    else:
+        for fixture in files:
+            fn = fixture.relative_to(prefix)
+            output.message(style(str(fn), fg="cyan", bold=True))
+            file_report = ExecutionReport()
+            run_sql_file(
+                connectable,
+                fixture,
+                params,
+                output_mode=output_mode,
+                output_file=output,
+                report=file_report,
+                **kwargs,
+            )
+            report.records.extend(file_report.records)
+            output.message("")
+            # Errors recovered by ``on_error`` don't prevent the file from
+            # completing
+            errors = [r.error for r in file_report.errors if not r.recovered]
+            if not any(not _is_already_exists_error(e) for e in errors):
+                report.applied.append(fixture)
+                if ledger is not None:
+                    ledger.record(fixture)
+
+    if ledger is not None:
+        output.message(
+            f"Applied {len(report.applied)} fixture(s), "
+            f"skipped {len(report.skipped)} unchanged"
+        )
+    if slowest:
+        report.print_slowest(slowest, file=output)
+    output.flush()
+    return report
 
 
 def run_sql(*args, **kwargs):
@@ -650,7 +1581,9 @@ def run_sql(*args, **kwargs):
     connectable : Union[Engine, Connection]
         A SQLAlchemy engine or connection object.
     sql : Union[str, Path, IO, SQL, Composed]
-        A SQL query, or a file containing a SQL query.
+        A SQL query, or a file containing a SQL query. Scripts are split into
+        statements lazily, and may contain ``COPY ... FROM stdin`` data blocks
+        (as in plain-format dumps).
     params : Union[dict, list, tuple]
         Parameters to bind to the query. If a list or tuple, the parameters
         will be bound to the query in order. If a dict, the parameters will
@@ -680,7 +1613,46 @@ def run_sql(*args, **kwargs):
         statement filter.
     use_transaction: bool
         Whether to run the query in a transaction block
+    single_transaction: bool
+        If True, run all statements in a single transaction, committed once they
+        have all run, rather than committing after each statement. When errors are
+        tolerated (``raise_errors=False`` or an ``on_error`` handler), each statement
+        runs in a savepoint so that a failed statement is rolled back on its own;
+        otherwise, an error rolls back the whole transaction. Statements that can't
+        run inside a transaction block (e.g. ``VACUUM``) are not supported.
+    pipeline: bool
+        If True, send statements to the server in batches using psycopg's pipeline
+        mode, rather than waiting for a round trip per statement. Each batch runs
+        in a single transaction; if a statement fails, its batch is rolled back and
+        re-run one statement at a time so that errors are handled as usual (on an
+        autocommit connection, where it can't be rolled back, the error is raised).
+        Transaction control statements are run on their own. Results are buffered.
+    batch: bool
+        If True, send consecutive statements without bind parameters to the server
+        as a single multi-statement script, in one round trip. Each script runs in
+        a single transaction; if it fails, it is rolled back and bisected to find
+        the failing statement, which is run on its own so that errors are handled
+        as usual. Results are buffered.
+    pipeline_batch_size: int
+        Number of statements to send per pipeline batch (default 500).
+    on_statement: Callable[[StatementRecord], None]
+        A function called with a ``StatementRecord`` (index, summary, wall time,
+        rowcount and error) after each statement is executed.
+    report: ExecutionReport
+        A report to which statement records are added.
+    slowest: int
+        If set, print the N slowest statements once all statements have run.
+    output_file: IO | OutputSink
+        Where to report progress (standard error by default). File objects are
+        wrapped in a ``ConsoleSink``, which writes statements in batches; see
+        ``macrostrat.database.output`` for JSON-lines and in-memory sinks.
+    many: bool
+        If True, ``params`` is an iterable of parameter sets for a single statement,
+        which are executed in batches using ``run_many``. The total number of rows
+        affected is returned.
     """
+    if kwargs.pop("many", False):
+        return run_many(*args, **kwargs)
     res = _run_sql(*args, **kwargs)
     if kwargs.pop("yield_results", False):
         return res
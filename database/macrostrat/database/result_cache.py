@@ -0,0 +1,466 @@
+"""
+An in-process cache for the results of read-only queries.
+
+Results are cached as SQLAlchemy ``FrozenResult`` objects, keyed on the
+database URL, rendered SQL text and bound parameters (so a cache can be shared
+between several databases), and expire after a per-query TTL. The
+cache is bounded both by number of entries and by the estimated memory used by
+cached rows, evicting least-recently-used entries first.
+
+Only plain ``SELECT`` (or ``WITH ... SELECT``) queries run outside of an
+explicit transaction are cached, so writes are never skipped and uncommitted
+data is never shared.
+
+Each entry is tagged with the tables it reads (inferred from ``FROM`` lists and
+``JOIN`` clauses, or given explicitly), so that entries can be invalidated
+when a table changes. Tags are only as good as the query text: queries on
+views should pass the underlying tables with ``tags=``, since writes (and their
+notifications) happen on the base tables. ``ResultCache.listen`` starts a background thread that
+invalidates tags sent as PostgreSQL notifications; ``create_invalidation_trigger``
+installs a trigger that sends one whenever a table is modified::
+
+    create_invalidation_trigger(db.engine, "macrostrat.units")
+    db.result_cache.listen(db.engine)
+    db.run_query("SELECT * FROM macrostrat.units", cache=60)
+"""
+
+import re
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Event, RLock, Thread
+from time import monotonic
+from typing import Hashable, Iterable, Optional
+
+from psycopg.sql import SQL, Identifier, Literal
+from sqlalchemy.engine import Connection, Engine, FrozenResult
+from sqlalchemy.orm import Session, SessionTransactionOrigin
+
+from macrostrat.utils import get_logger
+
+log = get_logger(__name__)
+
+default_channel = "macrostrat_cache_invalidation"
+
+# Tag that invalidates every entry
+all_tables = "*"
+
+_identifier = r"(?:\"[^\"]+\"|\w+)"
+_table_name = rf"{_identifier}(?:\.{_identifier})?"
+# A table, or a subquery or function call (whose name isn't captured)
+_table_reference = re.compile(
+    rf"\b(FROM|JOIN)\s+(?:({_table_name})|(?=\())", re.IGNORECASE
+)
+# A further table in a comma-separated FROM list, after an optional alias
+_from_list_item = re.compile(
+    rf"\s*(?:(?:AS\s+)?{_identifier}\s*)?,\s*(?:({_table_name})|(?=\())",
+    re.IGNORECASE,
+)
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_select_query = re.compile(r"^[\s(]*(?:SELECT|WITH)\b", re.IGNORECASE)
+# Keywords of statements (or clauses) that write or lock rows
+_write_keyword = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|INTO|FOR\s+(?:NO\s+KEY\s+|KEY\s+)?SHARE)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_table_tag(table: str) -> str:
+    """Normalize a table name to a ``schema.table`` tag (assuming the ``public``
+    schema for unqualified names)."""
+    # Unquoted identifiers are case-insensitive
+    parts = [
+        p[1:-1] if p.startswith('"') else p.lower() for p in table.strip().split(".")
+    ]
+    if len(parts) == 1:
+        parts.insert(0, "public")
+    return ".".join(parts)
+
+
+def infer_table_tags(sql_text: str) -> frozenset[str]:
+    """Infer the tables read by a query from its ``FROM`` lists and ``JOIN``
+    clauses. Function calls (e.g. ``FROM generate_series(...)``) are ignored.
+    Views are tagged by name, not by the tables they read."""
+    tags = set()
+    for match in _table_reference.finditer(sql_text):
+        name = match.group(2)
+        pos = match.end()
+        while True:
+            if sql_text[pos:].lstrip().startswith("("):
+                # A function call; skip its arguments
+                pos = _skip_parentheses(sql_text, sql_text.index("(", pos))
+            else:
+                tags.add(normalize_table_tag(name))
+            if match.group(1).upper() != "FROM":
+                break
+            item = _from_list_item.match(sql_text, pos)
+            if item is None:
+                break
+            name = item.group(1)
+            pos = item.end()
+    return frozenset(tags)
+
+
+def _skip_parentheses(sql_text: str, start: int) -> int:
+    """The position after the parenthesis matching the one at ``start``."""
+    depth = 0
+    for pos in range(start, len(sql_text)):
+        if sql_text[pos] == "(":
+            depth += 1
+        elif sql_text[pos] == ")":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return len(sql_text)
+
+
+def is_cacheable_query(sql_text: str) -> bool:
+    """Whether a statement is a plain ``SELECT`` (or ``WITH ... SELECT``) query
+    that neither writes nor locks rows."""
+    sql_text = _string_literal.sub("''", sql_text)
+    return (
+        _select_query.match(sql_text) is not None
+        and _write_keyword.search(sql_text) is None
+    )
+
+
+def _in_explicit_transaction(connectable) -> bool:
+    """Whether queries on ``connectable`` run in a transaction opened by the
+    caller, where they could see uncommitted changes."""
+    if isinstance(connectable, Session):
+        if isinstance(connectable.bind, Connection):
+            # e.g. a session created by ``Database.transaction``
+            return connectable.bind.in_transaction()
+        transaction = connectable.get_transaction()
+        return transaction is not None and (
+            transaction.origin != SessionTransactionOrigin.AUTOBEGIN
+            or len(connectable.new) + len(connectable.dirty) + len(connectable.deleted)
+            > 0
+        )
+    if isinstance(connectable, Connection):
+        return connectable.in_transaction()
+    return False
+
+
+def estimate_size(frozen: FrozenResult) -> int:
+    """Estimate the memory used by a frozen result's rows, in bytes."""
+    size = sys.getsizeof(frozen.data)
+    for row in frozen.data:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+@dataclass
+class CacheEntry:
+    result: FrozenResult
+    expires: float
+    size: int
+    tags: frozenset[str]
+
+
+class ResultCache(object):
+    """
+    A thread-safe, size-bounded cache of query results with TTL expiry and
+    table-tagged invalidation.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 2**20):
+        """
+        Args:
+            max_entries: Maximum number of cached results.
+            max_bytes: Maximum estimated memory used by cached rows. Results
+                larger than this are not cached.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._tags: dict[str, set] = {}
+        self._lock = RLock()
+        self._listener: Optional[Thread] = None
+        self._stop = Event()
+
+    def get(self, key: Hashable) -> Optional[FrozenResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(
+        self,
+        key: Hashable,
+        result: FrozenResult,
+        ttl: float,
+        tags: Iterable[str] = (),
+    ) -> bool:
+        """Cache a result for ``ttl`` seconds. Returns False if the result is too
+        large to cache."""
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return False
+        entry = CacheEntry(result, monotonic() + ttl, size, frozenset(tags))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.bytes += size
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._tags[tag]
+
+    def invalidate(self, table: str) -> int:
+        """Remove the entries that read a table (or all entries, for ``"*"``).
+        Returns the number of entries removed."""
+        with self._lock:
+            if table == all_tables:
+                keys = list(self._entries)
+            else:
+                keys = list(self._tags.get(normalize_table_tag(table), ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return dict(
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                bytes=self.bytes,
+                max_bytes=self.max_bytes,
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups > 0 else 0.0,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                invalidations=self.invalidations,
+                listening=self.listening,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None and self._listener.is_alive()
+
+    def listen(
+        self,
+        engine: Engine,
+        channel: str = default_channel,
+        *,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Start a background thread that listens for notifications on ``channel``
+        (on a dedicated connection) and invalidates the table named in each
+        payload. An empty payload or ``"*"`` clears the cache. If the connection
+        is lost, the cache is cleared and the listener reconnects.
+
+        Args:
+            engine: Engine for the database to listen to (psycopg driver).
+            channel: Notification channel.
+            poll_interval: Maximum time between checks for ``stop()``.
+        """
+        if self.listening:
+            raise RuntimeError("The result cache is already listening")
+        conninfo = engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self._stop.clear()
+        ready = Event()
+        self._listener = Thread(
+            target=self._listen,
+            args=(conninfo, channel, poll_interval, ready),
+            name=f"result-cache-{channel}",
+            daemon=True,
+        )
+        self._listener.start()
+        ready.wait(timeout=10)
+
+    def _listen(self, conninfo: str, channel: str, poll_interval: float, ready):
+        import psycopg
+
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(SQL("LISTEN {}").format(Identifier(channel)))
+                    ready.set()
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=poll_interval):
+                            self.invalidate(notify.payload or all_tables)
+            except Exception as err:
+                # Notifications may have been missed
+                log.warning("Result cache listener failed (%s); clearing cache", err)
+                self.invalidate(all_tables)
+                ready.set()
+                self._stop.wait(poll_interval)
+
+    def stop(self):
+        """Stop listening for invalidation notifications."""
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+
+
+def create_invalidation_trigger(connectable, table: str, channel=default_channel):
+    """
+    Create a statement-level trigger that sends the table's ``schema.table``
+    name on ``channel`` whenever rows are inserted, updated, deleted or
+    truncated, for use with ``ResultCache.listen``.
+    """
+    from .query import run_sql
+
+    tag = normalize_table_tag(table)
+    schema, name = tag.split(".", 1)
+    params = dict(
+        table=Identifier(schema, name),
+        trigger=Identifier("macrostrat_cache_invalidation"),
+        channel=Literal(channel),
+    )
+    run_sql(
+        connectable,
+        """
+        CREATE OR REPLACE FUNCTION public.macrostrat_notify_cache_invalidation()
+        RETURNS trigger AS $$
+        BEGIN
+          PERFORM pg_notify(TG_ARGV[0], TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE TRIGGER {trigger}
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION public.macrostrat_notify_cache_invalidation({channel});
+        """,
+        params,
+        raise_errors=True,
+        output_mode="none",
+    )
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _cache_key(connectable, sql_text: str, params) -> Optional[Hashable]:
+    from .query import _get_engine
+
+    database = _get_engine(connectable).url.render_as_string(hide_password=True)
+    key = (database, sql_text, _freeze(params or {}))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def run_cached_query(
+    connectable,
+    cache: ResultCache,
+    query,
+    params=None,
+    *,
+    ttl: float,
+    tags: Optional[Iterable[str]] = None,
+    **kwargs,
+):
+    """
+    Run a single read-only query, returning a cached result if an identical
+    query (with the same parameters, on the same database) ran within the last ``ttl`` seconds.
+
+    Results are returned as SQLAlchemy ``Result`` objects built from a
+    ``FrozenResult``, so every caller can iterate over its own copy. Only plain
+    ``SELECT`` and ``WITH ... SELECT`` queries are cached (so e.g.
+    ``INSERT ... RETURNING`` always runs), and not when ``connectable`` is in
+    an explicit transaction. Queries with unhashable parameters are not cached
+    either.
+
+    Args:
+        connectable: A SQLAlchemy engine, connection or session.
+        cache: The cache to use.
+        query: A SQL query (or file containing one).
+        params: Parameters to pass to the query.
+        ttl: Time (in seconds) for which the result is cached.
+        tags: Tables read by the query, used for invalidation. By default,
+            these are inferred from the query's ``FROM`` and ``JOIN`` clauses.
+            Queries on views must list the view's base tables here.
+    """
+    from .query import _get_queries, _render_query_text, run_query
+
+    queries = _get_queries(query, interpret_as_file=kwargs.get("interpret_as_file"))
+    if queries is None or len(queries) != 1:
+        raise ValueError("Exactly one query must be passed to run a cached query")
+    _, sql_text, bind_params = _render_query_text(connectable, queries[0], params)
+
+    if not is_cacheable_query(sql_text) or _in_explicit_transaction(connectable):
+        return run_query(connectable, query, params, **kwargs)
+
+    key = _cache_key(connectable, sql_text, bind_params)
+    if key is not None:
+        frozen = cache.get(key)
+        if frozen is not None:
+            return frozen()
+
+    res = run_query(connectable, query, params, **kwargs)
+    if key is None or not res.returns_rows:
+        return res
+
+    frozen = res.freeze()
+    if tags is None:
+        tags = infer_table_tags(sql_text)
+    else:
+        tags = [normalize_table_tag(t) for t in tags]
+    cache.put(key, frozen, ttl, tags)
+    return frozen()
@@ -6,6 +6,7 @@ from psycopg.sql import Identifier, Literal, SQL
 from sqlalchemy import inspect as sa_inspect
 
 from macrostrat.database import Database
+from macrostrat.database.utils import register_geometry_types
 
 
 @dataclass
@@ -111,6 +112,7 @@ def serial_to_identity(
 
     # Use a fresh inspector — db.inspector is cached and won't reflect DDL
     # changes made in the same session (e.g. a prior serial_to_identity call).
+    register_geometry_types()
     insp = sa_inspect(db.engine)
     if not insp.has_table(table, schema=schema):
         raise ValueError(f"Table {table} does not exist in schema {schema}")
@@ -18,13 +18,9 @@ from sqlalchemy.exc import (
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.elements import ClauseElement
-from sqlalchemy_utils import (
-    create_database as _create_database,
-    database_exists,
-    drop_database as _drop_database,
-)
 
 from macrostrat.utils import cmd, get_logger
+from .bulk import get_arrow_table
 from .query import get_sql_text, execute  # noqa
 
 log = get_logger(__name__)
@@ -35,12 +31,28 @@ from .query import run_sql, run_query, run_sql_file, run_fixtures  # noqa: F401
 DatabaseInput = Union["Database", Engine, str, URL]
 
 
-def get_dataframe(connectable, filename_or_query, **kwargs):
+def get_dataframe(connectable, filename_or_query, *, engine="pandas", **kwargs):
     """
     Run a query on a SQL database (represented by
     a SQLAlchemy database object) and turn it into a
     `Pandas` dataframe.
+
+    With ``engine="arrow"``, results are exported with ``COPY`` and parsed into
+    columnar Arrow buffers before conversion, which is much faster for large
+    results. Only the ``params`` keyword argument is supported by this engine,
+    and PostGIS geometries are returned as WKB bytes. It requires ``pyarrow``
+    and ``numpy`` (the ``arrow`` extra).
     """
+    if engine == "arrow":
+        params = kwargs.pop("params", None)
+        if kwargs:
+            raise TypeError(
+                f"Unsupported arguments for the arrow engine: {', '.join(kwargs)}"
+            )
+        return get_arrow_table(connectable, filename_or_query, params).to_pandas()
+    if engine != "pandas":
+        raise ValueError(f"Unknown dataframe engine {engine!r}")
+
     from pandas import read_sql
 
     sql = get_sql_text(filename_or_query)
@@ -130,6 +142,8 @@ def drop_database(_input: DatabaseInput, force=None, allow_missing=False):
         _force_drop_postgresql_database(url)
     else:
         # Drop the database without force
+        from sqlalchemy_utils import drop_database as _drop_database
+
         _drop_database(url)
 
 
@@ -250,9 +264,18 @@ def create_database(_input: DatabaseInput, **kwargs):
 
     if exists_ok and db_exists:
         return
+    from sqlalchemy_utils import create_database as _create_database
+
     _create_database(url, **kwargs)
 
 
+def database_exists(_input: DatabaseInput) -> bool:
+    """Check whether a database exists (using ``sqlalchemy_utils``)."""
+    from sqlalchemy_utils import database_exists as _database_exists
+
+    return _database_exists(get_database_url(_input))
+
+
 def create_engine(_input: DatabaseInput, **kwargs):
     from .core import Database
 
@@ -339,6 +362,14 @@ def reflect_table(engine, tablename, *column_args, **kwargs):
     instance to set up foreign and primary key constraints.
     https://docs.sqlalchemy.org/en/13/core/reflection.html#reflecting-views
     """
+    register_geometry_types()
     schema = kwargs.pop("schema", "public")
     meta = MetaData(schema=schema)
     return Table(tablename, meta, *column_args, autoload_with=engine, **kwargs)
+
+
+def register_geometry_types():
+    """Import GeoAlchemy2, which registers PostGIS types with SQLAlchemy's
+    PostgreSQL dialect so that geometry columns can be reflected. It is slow
+    to import, so this is deferred until reflection is needed."""
+    import geoalchemy2  # noqa: F401
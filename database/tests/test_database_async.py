@@ -0,0 +1,117 @@
+"""
+Tests for the asyncio database interface.
+"""
+
+import asyncio
+from time import perf_counter
+
+from pytest import fixture, raises
+
+from macrostrat.database.aio import AsyncDatabase
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def run_async(db):
+    """Run a coroutine function with a fresh AsyncDatabase on its own event loop."""
+
+    def _run(fn):
+        async def main():
+            adb = AsyncDatabase(db)
+            try:
+                return await fn(adb)
+            finally:
+                await adb.dispose()
+
+        return asyncio.run(main())
+
+    return _run
+
+
+def test_async_run_query(run_async):
+    async def fn(adb):
+        res = await adb.run_query("SELECT :a::integer + 1", dict(a=1))
+        return res.scalar()
+
+    assert run_async(fn) == 2
+
+
+def test_async_instance_params(db):
+    async def main():
+        adb = AsyncDatabase(db, instance_params=dict(value="test"))
+        res = await adb.run_query("SELECT :value")
+        await adb.dispose()
+        return res.scalar()
+
+    assert asyncio.run(main()) == "test"
+
+
+def test_async_run_sql(run_async):
+    async def fn(adb):
+        results = []
+        async for res in adb.run_sql("SELECT 1; SELECT 2", output_mode="none"):
+            results.append(res.scalar())
+        return results
+
+    assert run_async(fn) == [1, 2]
+
+
+def test_async_transaction(run_async):
+    async def fn(adb):
+        async with adb.transaction(rollback="always"):
+            await adb.run_query("CREATE TABLE async_test (id integer)")
+            await adb.run_query("INSERT INTO async_test VALUES (1)")
+            async with adb.savepoint(rollback="always"):
+                await adb.run_query("INSERT INTO async_test VALUES (2)")
+            count = await adb.run_query("SELECT count(*) FROM async_test")
+            assert count.scalar() == 1
+        exists = await adb.run_query("SELECT to_regclass('async_test') IS NOT NULL")
+        return exists.scalar()
+
+    assert run_async(fn) is False
+
+
+def test_async_transaction_error(run_async):
+    async def fn(adb):
+        with raises(ValueError):
+            async with adb.transaction():
+                await adb.run_query("CREATE TABLE async_test (id integer)")
+                raise ValueError("Roll back")
+        exists = await adb.run_query("SELECT to_regclass('async_test') IS NOT NULL")
+        return exists.scalar()
+
+    assert run_async(fn) is False
+
+
+def test_async_get_table(run_async):
+    async def fn(adb):
+        table = await adb.get_table("sample")
+        assert await adb.get_table("sample") is table
+        return table
+
+    assert "name" in run_async(fn).columns
+
+
+def test_async_concurrent_queries(run_async):
+    async def fn(adb):
+        start = perf_counter()
+        await asyncio.gather(*(adb.run_query("SELECT pg_sleep(0.2)") for _ in range(4)))
+        return perf_counter() - start
+
+    # Queries run concurrently on pooled connections
+    assert run_async(fn) < 0.6
+
+
+def test_async_run_query_commits(run_async):
+    async def fn(adb):
+        await adb.run_query("CREATE TABLE async_commit_test (id integer)")
+        try:
+            await adb.run_query("INSERT INTO async_commit_test VALUES (1)")
+            # Read back from a new session
+            res = await adb.run_query("SELECT count(*) FROM async_commit_test")
+            return res.scalar()
+        finally:
+            await adb.run_query("DROP TABLE async_commit_test")
+
+    assert run_async(fn) == 1
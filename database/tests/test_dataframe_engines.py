@@ -0,0 +1,145 @@
+"""
+Tests for the columnar (Arrow) engine for ``get_dataframe``.
+"""
+
+from datetime import date
+
+from pytest import importorskip, raises
+
+from .test_database import db, empty_db, engine
+
+pa = importorskip("pyarrow")
+pd = importorskip("pandas")
+
+typed_query = """
+SELECT
+  i AS id,
+  i::bigint * 10 AS big,
+  i / 2.0::float8 AS half,
+  'row ' || i || ' 100%' AS name,
+  CASE WHEN i = 2 THEN NULL ELSE '' END AS empty,
+  i > 1 AS flag,
+  decode('0102', 'hex') AS data
+FROM generate_series(1, :n) AS i
+"""
+
+
+def test_arrow_table_types(db):
+    from macrostrat.database.bulk import get_arrow_table
+
+    table = get_arrow_table(db.engine, typed_query, dict(n=3))
+    assert table.num_rows == 3
+    assert table.schema.field("id").type == pa.int32()
+    assert table.schema.field("big").type == pa.int64()
+    assert table.schema.field("half").type == pa.float64()
+    assert table.schema.field("flag").type == pa.bool_()
+    assert table.schema.field("data").type == pa.binary()
+    assert table.column("name").to_pylist()[0] == "row 1 100%"
+    # Empty strings are distinct from NULLs
+    assert table.column("empty").to_pylist() == ["", None, ""]
+    assert table.column("data").to_pylist()[0] == b"\x01\x02"
+
+
+def test_engines_agree(db):
+    query = "SELECT id, name FROM sample ORDER BY id"
+    df1 = db.get_dataframe(query)
+    df2 = db.get_dataframe(query, engine="arrow")
+    # The arrow engine uses narrower integer types where possible
+    pd.testing.assert_frame_equal(df1, df2, check_dtype=False)
+
+
+def test_arrow_engine_empty_result(db):
+    df = db.get_dataframe("SELECT 1 AS a WHERE false", engine="arrow")
+    assert list(df.columns) == ["a"]
+    assert len(df) == 0
+
+
+def test_arrow_engine_unsupported_args(db):
+    with raises(TypeError):
+        db.get_dataframe("SELECT 1", engine="arrow", index_col="a")
+
+
+def test_arrow_engine_types_match_pandas(db):
+    query = """
+    SELECT
+      i::numeric / 4 AS value,
+      timestamptz '2024-01-01 12:00:00+02' + i * interval '1 hour' AS time,
+      CASE WHEN i = 1 THEN 'NaN' ELSE 'null' END AS label
+    FROM generate_series(1, 3) AS i
+    """
+    df1 = db.get_dataframe(query)
+    df2 = db.get_dataframe(query, engine="arrow")
+    pd.testing.assert_frame_equal(df1, df2, check_dtype=False)
+    assert df2["value"].dtype == df1["value"].dtype
+    assert str(df2["time"].dt.tz) == "UTC"
+    # Only empty, unquoted values are read as NULL
+    assert df2["label"].tolist() == ["NaN", "null", "null"]
+
+
+def test_arrow_table_streamed(db):
+    from macrostrat.database.bulk import get_arrow_table
+
+    # Larger than the CSV reader's block size, so it is read in several batches
+    query = """
+    SELECT i, CASE WHEN i % 3 = 0 THEN NULL ELSE decode(lpad(to_hex(i), 8, '0'), 'hex') END AS data
+    FROM generate_series(1, 200000) AS i
+    """
+    table = get_arrow_table(db.engine, query)
+    assert table.num_rows == 200000
+    assert table.column("data").num_chunks > 1
+    data = table.column("data").to_pylist()
+    assert data[0] == b"\x00\x00\x00\x01"
+    assert data[2] is None
+    assert data[-2] == (199999).to_bytes(4, "big")
+
+
+def test_arrow_query_planned_once(db):
+    from macrostrat.database.bulk import get_arrow_table
+
+    # An immutable function with constant arguments is evaluated when the query
+    # is planned
+    db.run_sql(
+        """
+        CREATE SEQUENCE arrow_test_calls;
+        CREATE FUNCTION arrow_test_count() RETURNS bigint IMMUTABLE LANGUAGE sql
+        AS $$ SELECT nextval('arrow_test_calls') $$;
+        """,
+        raise_errors=True,
+    )
+    try:
+        table = get_arrow_table(db.engine, "SELECT arrow_test_count() AS n")
+        assert table.column("n").to_pylist() == [1]
+        calls = db.run_query("SELECT last_value FROM arrow_test_calls").scalar()
+        assert calls == 1
+    finally:
+        db.run_sql(
+            "DROP FUNCTION arrow_test_count(); DROP SEQUENCE arrow_test_calls",
+            raise_errors=True,
+        )
+
+
+def test_arrow_infinite_timestamps(db):
+    from macrostrat.database.bulk import get_arrow_table
+
+    table = get_arrow_table(
+        db.engine,
+        """
+        SELECT
+          'infinity'::timestamptz AS tz,
+          '-infinity'::timestamp AS ts,
+          'infinity'::date AS day,
+          date '2024-01-01' AS finite
+        """,
+    )
+    assert table.to_pylist() == [
+        dict(tz=None, ts=None, day=None, finite=date(2024, 1, 1))
+    ]
+
+
+def test_arrow_query_errors(db):
+    from psycopg.errors import UndefinedTable
+
+    from macrostrat.database.bulk import get_arrow_table
+
+    with raises(UndefinedTable):
+        get_arrow_table(db.engine, "SELECT * FROM arrow_nonexistent_table")
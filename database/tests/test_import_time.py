@@ -0,0 +1,83 @@
+"""
+Import-time regression tests: heavy optional dependencies should only be
+imported on first use.
+"""
+
+import subprocess
+import sys
+
+from pytest import raises
+
+# Modules that importing macrostrat.database shouldn't pull in
+deferred_modules = [
+    "geoalchemy2",
+    "sqlalchemy_utils",
+    "sqlalchemy.ext.automap",
+    "rich",
+    "psycopg2",
+    "pandas",
+    "pyarrow",
+    "macrostrat.database.mapper",
+    "macrostrat.database.aio",
+    "macrostrat.database.fixtures",
+]
+
+# Budget for the time spent in the package's own modules, in microseconds
+own_modules_budget = 250_000
+
+
+def _import_times(module: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative import times (in microseconds) of each module
+    imported by a module, as reported by ``python -X importtime``."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def test_deferred_imports():
+    times = _import_times("macrostrat.database")
+    assert "macrostrat.database" in times
+    imported = [m for m in deferred_modules if m in times]
+    assert imported == []
+
+
+def test_import_time_budget():
+    times = _import_times("macrostrat.database")
+    own_time = sum(
+        self_time
+        for name, (self_time, _) in times.items()
+        if name.startswith("macrostrat.database")
+    )
+    assert own_time < own_modules_budget
+
+
+def test_lazy_mapper_attribute():
+    import macrostrat.database
+    from macrostrat.database.mapper import DatabaseMapper
+
+    assert macrostrat.database.DatabaseMapper is DatabaseMapper
+    with raises(AttributeError):
+        macrostrat.database.NotAnAttribute
+
+
+def test_database_registers_geometry_types():
+    # Reflecting with a Database's engine directly (e.g. MetaData.reflect) should
+    # see PostGIS types, without importing GeoAlchemy2 with the package
+    code = (
+        "from sqlalchemy.dialects.postgresql.base import ischema_names\n"
+        "from macrostrat.database import Database\n"
+        "assert 'geometry' not in ischema_names\n"
+        "Database('postgresql+psycopg://localhost/unused')\n"
+        "assert 'geometry' in ischema_names\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
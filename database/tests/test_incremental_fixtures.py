@@ -0,0 +1,131 @@
+"""
+Tests for incremental fixture runs using the applied-fixtures ledger.
+"""
+
+from pytest import fixture
+
+from macrostrat.database.postgresql import table_exists
+from macrostrat.database.query import StatementDirective
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def fixture_dir(tmp_path):
+    (tmp_path / "01-schema.sql").write_text("CREATE SCHEMA incremental_test;")
+    (tmp_path / "02-table.sql").write_text(
+        "CREATE TABLE incremental_test.a (id integer);"
+    )
+    return tmp_path
+
+
+@fixture
+def cleanup(db):
+    yield
+    db.run_sql(
+        "DROP SCHEMA IF EXISTS incremental_test CASCADE;"
+        "DROP SCHEMA IF EXISTS macrostrat_meta CASCADE;",
+        raise_errors=True,
+    )
+
+
+def _names(files):
+    return [f.name for f in files]
+
+
+def test_incremental_fixtures(db, fixture_dir, cleanup):
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.applied) == ["01-schema.sql", "02-table.sql"]
+    assert report.skipped == []
+    assert table_exists(db, "a", schema="incremental_test")
+
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert report.applied == []
+    assert _names(report.skipped) == ["01-schema.sql", "02-table.sql"]
+    assert len(report) == 0
+
+    # Changed files are re-run
+    (fixture_dir / "02-table.sql").write_text(
+        "CREATE TABLE incremental_test.b (id integer);"
+    )
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.applied) == ["02-table.sql"]
+    assert table_exists(db, "b", schema="incremental_test")
+
+
+def test_incremental_force(db, fixture_dir, cleanup):
+    db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    report = db.run_fixtures(
+        fixture_dir, incremental=True, force=["02-*"], output_mode="none"
+    )
+    assert _names(report.skipped) == ["01-schema.sql"]
+    # "Already exists" errors don't prevent a file from being recorded
+    assert _names(report.applied) == ["02-table.sql"]
+    assert len(report.errors) == 1
+
+
+def test_incremental_params(db, fixture_dir, cleanup):
+    db.run_fixtures(fixture_dir, dict(value=1), incremental=True, output_mode="none")
+    report = db.run_fixtures(
+        fixture_dir, dict(value=2), incremental=True, output_mode="none"
+    )
+    # Files are re-run when parameters change; errors aren't recorded as applied
+    assert report.skipped == []
+
+
+def test_failed_fixtures_not_recorded(db, fixture_dir, cleanup):
+    (fixture_dir / "03-broken.sql").write_text("SELECT * FROM nonexistent;")
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.applied) == ["01-schema.sql", "02-table.sql"]
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.applied) == []
+    assert _names(report.skipped) == ["01-schema.sql", "02-table.sql"]
+
+
+def test_recovered_fixtures_recorded(db, fixture_dir, cleanup):
+    (fixture_dir / "03-view.sql").write_text(
+        "CREATE VIEW incremental_test.v AS SELECT * FROM incremental_test.c;"
+    )
+
+    def recover(ctx, err, connectable):
+        return [
+            StatementDirective(query="CREATE TABLE incremental_test.c (id integer)"),
+            StatementDirective(query=ctx.query),
+        ]
+
+    report = db.run_fixtures(
+        fixture_dir, incremental=True, on_error=recover, output_mode="none"
+    )
+    assert table_exists(db, "c", schema="incremental_test")
+    assert report.errors[0].recovered
+    # Files whose errors were all recovered are recorded as applied
+    assert _names(report.applied) == ["01-schema.sql", "02-table.sql", "03-view.sql"]
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.skipped) == ["01-schema.sql", "02-table.sql", "03-view.sql"]
+
+
+def test_ledger_keys_independent_of_selection(db, fixture_dir, cleanup):
+    # Running one file records the same key as running the whole directory
+    db.run_fixtures(fixture_dir / "01-schema.sql", incremental=True, output_mode="none")
+    report = db.run_fixtures(fixture_dir, incremental=True, output_mode="none")
+    assert _names(report.skipped) == ["01-schema.sql"]
+    assert _names(report.applied) == ["02-table.sql"]
+
+    report = db.run_fixtures(
+        [fixture_dir / "02-table.sql"], incremental=True, output_mode="none"
+    )
+    assert _names(report.skipped) == ["02-table.sql"]
+
+
+def test_ledger_root(db, fixture_dir, cleanup):
+    (fixture_dir / "sub").mkdir()
+    (fixture_dir / "01-schema.sql").rename(fixture_dir / "sub" / "01-schema.sql")
+    db.run_fixtures(fixture_dir, incremental=True, recursive=True, output_mode="none")
+    # Files in a subdirectory match when run with the same ledger root
+    report = db.run_fixtures(
+        fixture_dir / "sub",
+        incremental=True,
+        ledger_root=fixture_dir,
+        output_mode="none",
+    )
+    assert _names(report.skipped) == ["01-schema.sql"]
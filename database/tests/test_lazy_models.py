@@ -0,0 +1,106 @@
+"""
+Tests for lazily mapping reflected tables to models.
+"""
+
+from pytest import fixture, raises
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+
+from macrostrat.database import Database
+from macrostrat.database.query import run_sql
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def lazy_schema(engine):
+    run_sql(
+        engine,
+        """
+        CREATE SCHEMA lazy_test;
+        CREATE TABLE lazy_test.region (id serial PRIMARY KEY, name text);
+        CREATE TABLE lazy_test.site (
+            id serial PRIMARY KEY,
+            region_id integer NOT NULL REFERENCES lazy_test.region(id)
+        );
+        CREATE TABLE lazy_test.specimen (
+            id serial PRIMARY KEY,
+            site_id integer REFERENCES lazy_test.site(id),
+            parent_id integer REFERENCES lazy_test.specimen(id)
+        );
+        CREATE TABLE lazy_test.unrelated (id serial PRIMARY KEY);
+        CREATE TABLE lazy_test.no_primary_key (value text);
+        INSERT INTO lazy_test.region (name) VALUES ('Test region');
+        INSERT INTO lazy_test.site (region_id) VALUES (1);
+        INSERT INTO lazy_test.specimen (site_id) VALUES (1);
+        """,
+        raise_errors=True,
+        output_mode="none",
+    )
+    yield "lazy_test"
+    run_sql(engine, "DROP SCHEMA lazy_test CASCADE", output_mode="none")
+
+
+@fixture
+def lazy_db(db, lazy_schema, tmp_path):
+    # A cache file gives the mapper its own automap base
+    _db = Database(db.engine.url)
+    _db.automap(schemas=[lazy_schema], lazy=True, cache_file=tmp_path / "models.pickle")
+    yield _db
+    _db.cleanup()
+
+
+def _mapped_tables(db):
+    return sorted(cls.__table__.name for cls in db.mapper.automap_base.classes)
+
+
+def test_lazy_models_are_not_mapped(lazy_db):
+    assert _mapped_tables(lazy_db) == []
+    assert "lazy_test_unrelated" in lazy_db.model
+    assert "lazy_test_specimen" in lazy_db.model.keys()
+    # Tables without primary keys can't be mapped
+    assert "lazy_test_no_primary_key" not in lazy_db.model
+    with raises(AttributeError):
+        lazy_db.model.lazy_test_nonexistent
+
+
+def test_lazy_model_maps_referenced_tables(lazy_db):
+    site = lazy_db.model.lazy_test_site
+    assert site.__table__.name == "site"
+    assert _mapped_tables(lazy_db) == ["region", "site"]
+    configure_mappers()
+    assert hasattr(lazy_db.model.lazy_test_region, "lazy_test_site_collection")
+    assert hasattr(site, "_region")
+
+
+def test_relationships_to_earlier_models(lazy_db):
+    site = lazy_db.model.lazy_test_site
+    specimen = lazy_db.get_model("lazy_test.specimen")
+    assert _mapped_tables(lazy_db) == ["region", "site", "specimen"]
+    # Backrefs are added when mappers are configured
+    configure_mappers()
+    # Relationships to a class mapped earlier are added, with backrefs
+    assert hasattr(specimen, "_site")
+    assert hasattr(site, "lazy_test_specimen_collection")
+    # Self-referential relationships are mapped by automap
+    assert hasattr(specimen, "_specimen")
+
+    row = lazy_db.session.scalars(select(specimen)).one()
+    assert row._site._region.name == "Test region"
+    assert len(row._site.lazy_test_specimen_collection) == 1
+
+
+def test_lazy_tables(lazy_db):
+    table = lazy_db.table.lazy_test_unrelated
+    assert table.name == "unrelated"
+    assert _mapped_tables(lazy_db) == ["unrelated"]
+
+
+def test_lazy_mode_without_cache(db, lazy_schema):
+    _db = Database(db.engine.url)
+    try:
+        _db.automap(schemas=[lazy_schema], lazy=True)
+        assert "lazy_test_unrelated" in _db.model
+        assert _db.model.lazy_test_unrelated.__table__.schema == lazy_schema
+    finally:
+        _db.cleanup()
@@ -0,0 +1,161 @@
+"""
+Tests for the streaming PostgreSQL statement splitter.
+"""
+
+from io import StringIO
+
+from macrostrat.database import lexer
+from macrostrat.database.lexer import CopyFromStdin, split_statements
+
+from .test_database import db, empty_db, engine
+
+
+def _split(sql):
+    return list(split_statements(sql))
+
+
+def test_simple_split():
+    assert _split("SELECT 1; SELECT 2;") == ["SELECT 1", "SELECT 2"]
+
+
+def test_no_trailing_semicolon():
+    assert _split("SELECT 1;\nSELECT 2\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_empty_statements_skipped():
+    assert _split(";;\n -- only a comment;\n;") == []
+
+
+def test_comments_stripped():
+    sql = """
+    -- A line comment; with a semicolon
+    SELECT 1; /* A block comment; */
+    SELECT /* inline */ 2;
+    """
+    assert _split(sql) == ["SELECT 1", "SELECT   2"]
+
+
+def test_nested_block_comments():
+    sql = "/* outer /* inner; */ still a comment; */ SELECT 1;"
+    assert _split(sql) == ["SELECT 1"]
+
+
+def test_string_literals():
+    sql = "SELECT 'a;b', 'don''t;', \"odd;name\" FROM t; SELECT 2"
+    assert _split(sql) == ["SELECT 'a;b', 'don''t;', \"odd;name\" FROM t", "SELECT 2"]
+
+
+def test_escape_string_literals():
+    sql = r"SELECT E'it\'s; fine', e'\\'; SELECT 2"
+    assert _split(sql) == [r"SELECT E'it\'s; fine', e'\\'", "SELECT 2"]
+
+
+def test_comment_markers_in_strings():
+    sql = "SELECT '-- not a comment', '/* nor this */'; SELECT 2"
+    assert _split(sql)[0] == "SELECT '-- not a comment', '/* nor this */'"
+
+
+def test_dollar_quoting():
+    sql = """
+    CREATE FUNCTION f() RETURNS text AS $body$
+    BEGIN
+      -- a comment inside the body is preserved;
+      RETURN $$a;b$$;
+    END;
+    $body$ LANGUAGE plpgsql;
+    SELECT $1::integer;
+    """
+    statements = _split(sql)
+    assert len(statements) == 2
+    assert "RETURN $$a;b$$;" in statements[0]
+    assert "-- a comment inside the body is preserved;" in statements[0]
+    assert statements[1] == "SELECT $1::integer"
+
+
+def test_begin_atomic():
+    sql = """
+    CREATE FUNCTION add(a integer, b integer) RETURNS integer
+    LANGUAGE SQL
+    BEGIN ATOMIC
+      SELECT CASE WHEN a IS NULL THEN 0 ELSE a END + b;
+      SELECT 1;
+    END;
+    SELECT CASE WHEN true THEN 1 END;
+    BEGIN;
+    END;
+    """
+    statements = _split(sql)
+    assert len(statements) == 4
+    assert statements[0].endswith("SELECT 1;\n    END")
+    assert statements[1:] == ["SELECT CASE WHEN true THEN 1 END", "BEGIN", "END"]
+
+
+def test_dollar_sign_in_identifier():
+    assert _split("SELECT a$b$ FROM t; SELECT 2") == ["SELECT a$b$ FROM t", "SELECT 2"]
+
+
+def test_copy_from_stdin():
+    sql = "COPY t (a, b) FROM stdin;\n1\ta;b\n2\t\\N\n\\.\nSELECT 1;\n"
+    copy, select = _split(sql)
+    assert isinstance(copy, CopyFromStdin)
+    assert copy == "COPY t (a, b) FROM stdin"
+    assert copy.data == "1\ta;b\n2\t\\N\n"
+    assert select == "SELECT 1"
+
+
+def test_copy_data_streamed(monkeypatch):
+    monkeypatch.setattr(lexer, "copy_chunk_size", 10)
+    rows = [f"{i}\trow {i}\n" for i in range(10)]
+    lines = iter(["COPY t FROM stdin;\n", *rows, "\\.\n", "SELECT 1;\n"])
+    statements = split_statements(lines)
+    copy = next(statements)
+    chunks = copy.iter_data()
+    assert next(chunks) == rows[0] + rows[1]
+    # The data block is read as it is consumed
+    assert next(lines) == rows[2]
+    assert "".join(chunks) == "".join(rows[3:])
+    assert list(statements) == ["SELECT 1"]
+
+
+def test_psql_meta_commands_skipped():
+    sql = "\\connect mydb\nSELECT 1;\n"
+    assert _split(sql) == ["SELECT 1"]
+
+
+def test_split_is_lazy():
+    lines = iter(["SELECT 1;\n", "SELECT 2;\n", "SELECT 3;\n"])
+    statements = split_statements(lines)
+    assert next(statements) == "SELECT 1"
+    # Only the first line has been consumed
+    assert next(lines) == "SELECT 2;\n"
+
+
+def test_split_file_handle():
+    f = StringIO("SELECT 1;\nSELECT 2;\n")
+    assert _split(f) == ["SELECT 1", "SELECT 2"]
+
+
+def test_run_copy_from_stdin(db):
+    sql = """
+    CREATE TABLE copy_test (id integer, name text);
+    COPY copy_test (id, name) FROM stdin;
+    1\tfirst; entry
+    2\t\\N
+    \\.
+    """
+    # Inline data blocks can't be indented
+    sql = "\n".join(line.strip() for line in sql.split("\n"))
+    with db.transaction(rollback="always"):
+        res = db.run_sql(sql, raise_errors=True)
+        assert res[1] == 2
+        rows = db.run_query("SELECT id, name FROM copy_test ORDER BY id").all()
+        assert [tuple(r) for r in rows] == [(1, "first; entry"), (2, None)]
+
+
+def test_run_copy_from_stdin_repeated(db):
+    sql = "COPY copy_test (id) FROM stdin;\n1\n2\n\\.\n"
+    with db.transaction(rollback="always"):
+        db.run_sql("CREATE TABLE copy_test (id integer)", raise_errors=True)
+        # Statements with data blocks aren't replayed from the statement cache
+        for _ in range(2):
+            assert db.run_sql(sql, raise_errors=True) == [2]
@@ -0,0 +1,142 @@
+"""
+Tests for pool and query metrics.
+"""
+
+from pytest import fixture, raises
+from sqlalchemy import event
+from sqlalchemy.exc import ProgrammingError
+
+from macrostrat.database import Database
+from macrostrat.database.metrics import (
+    Histogram,
+    other_fingerprint,
+    render_prometheus,
+    statement_fingerprint,
+)
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def metrics_db(db):
+    _db = Database(db.engine.url, metrics=True, pool_size=3)
+    yield _db
+    _db.engine.dispose()
+
+
+def test_statement_fingerprint():
+    assert statement_fingerprint("SELECT * FROM a WHERE id = 1 AND name = 'x'") == (
+        "SELECT * FROM a WHERE id = ? AND name = ?"
+    )
+    assert statement_fingerprint("INSERT INTO a VALUES (1, 'it''s',\n 3.5);") == (
+        "INSERT INTO a VALUES (...)"
+    )
+    # Identifiers containing digits are kept
+    assert statement_fingerprint("SELECT col1 FROM t2") == "SELECT col1 FROM t2"
+
+
+def test_histogram():
+    hist = Histogram([0.1, 1.0])
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value)
+    assert hist.cumulative_counts() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert hist.to_dict()["sum"] == 2.65
+
+
+def test_metrics_disabled(db):
+    _db = Database(db.engine.url)
+    try:
+        assert _db.metrics is None
+        _db.run_query("SELECT 1").scalar()
+        stats = _db.stats()
+        assert "metrics" not in stats
+        assert stats["pool"]["pool_class"] == "QueuePool"
+    finally:
+        _db.engine.dispose()
+
+
+def test_query_metrics(metrics_db):
+    for i in range(3):
+        metrics_db.run_query(f"SELECT {i}").scalar()
+    with raises(ProgrammingError):
+        metrics_db.run_query("SELECT * FROM nonexistent_table").scalar()
+    metrics_db.session.rollback()
+
+    stats = metrics_db.stats()["metrics"]
+    select = stats["queries"]["SELECT ?"]
+    assert select["count"] == 3
+    assert select["errors"] == 0
+    assert stats["queries"]["SELECT * FROM nonexistent_table"]["errors"] == 1
+    assert stats["connections_created"] >= 1
+    assert stats["checkouts"] >= 1
+    assert stats["checkout_time"]["count"] == stats["checkouts"]
+
+
+def test_pool_stats(metrics_db):
+    with metrics_db.engine.connect():
+        pool = metrics_db.stats()["pool"]
+        assert pool["size"] == 3
+        assert pool["checked_out"] == 1
+        assert pool["overflow"] == 0
+
+
+def test_checkouts_after_dispose(metrics_db):
+    metrics_db.engine.dispose()
+    metrics_db.metrics.reset()
+    with metrics_db.engine.connect():
+        pass
+    assert metrics_db.metrics.stats()["checkouts"] == 1
+
+
+def test_query_without_start_time(metrics_db):
+    # A statement that began before the engine was instrumented has no start time
+    def clear_timers(conn, *args):
+        conn.info.pop("metrics_query_start", None)
+
+    event.listen(metrics_db.engine, "before_cursor_execute", clear_timers)
+    try:
+        metrics_db.metrics.reset()
+        with metrics_db.engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+        assert metrics_db.metrics.stats()["queries"] == {}
+    finally:
+        event.remove(metrics_db.engine, "before_cursor_execute", clear_timers)
+
+
+def test_shared_engine(metrics_db):
+    # Databases sharing an engine share its metrics, and don't count twice
+    shared = [Database(metrics_db.engine, metrics=True) for _ in range(3)]
+    assert all(d.metrics is metrics_db.metrics for d in shared)
+    metrics_db.metrics.reset()
+    shared[0].run_query("SELECT 1").scalar()
+    stats = metrics_db.metrics.stats()
+    assert stats["queries"]["SELECT ?"]["count"] == 1
+    assert stats["checkouts"] == 1
+
+
+def test_fingerprint_limit(db):
+    _db = Database(db.engine.url, metrics=dict(max_fingerprints=2))
+    try:
+        for sql in ("SELECT 1", "SELECT 1, 2", "SELECT 1, 2, 3", "SELECT 1, 2, 3, 4"):
+            with _db.engine.connect() as conn:
+                conn.exec_driver_sql(sql)
+        queries = _db.metrics.stats()["queries"]
+        assert len(queries) == 3
+        assert queries[other_fingerprint]["count"] == 2
+    finally:
+        _db.engine.dispose()
+
+
+def test_render_prometheus(metrics_db):
+    metrics_db.run_query("SELECT 1").scalar()
+    text = render_prometheus(metrics_db, labels=dict(database="testing"))
+    assert "# TYPE macrostrat_db_query_duration_seconds histogram" in text
+    assert (
+        'macrostrat_db_query_duration_seconds_count{database="testing",statement="SELECT ?"} 1'
+        in text
+    )
+    assert 'le="+Inf"' in text
+    assert 'macrostrat_db_pool_size{database="testing"} 3' in text
+    # Each metric is declared once
+    assert text.count("# TYPE macrostrat_db_query_errors_total counter") == 1
+    assert text.endswith("\n")
@@ -0,0 +1,125 @@
+"""
+Tests for the fingerprint-validated automap model cache.
+"""
+
+from pickle import dump
+
+from pytest import fixture
+from sqlalchemy import event
+
+from macrostrat.database import Database
+from macrostrat.database.mapper.cache import DatabaseModelCache
+from macrostrat.database.query import run_sql
+
+from .test_database import db, empty_db, engine
+
+schemas = ["model_cache_a", "model_cache_b"]
+
+
+@fixture
+def cache_schemas(engine):
+    run_sql(
+        engine,
+        """
+        CREATE SCHEMA model_cache_a;
+        CREATE SCHEMA model_cache_b;
+        CREATE TABLE model_cache_b.parent (id serial PRIMARY KEY, name text);
+        CREATE TABLE model_cache_a.child (
+            id serial PRIMARY KEY,
+            parent_id integer REFERENCES model_cache_b.parent(id)
+        );
+        """,
+        raise_errors=True,
+        output_mode="none",
+    )
+    yield schemas
+    run_sql(
+        engine,
+        "DROP SCHEMA model_cache_a CASCADE; DROP SCHEMA model_cache_b CASCADE",
+        output_mode="none",
+    )
+
+
+def _automap(db, cache_file):
+    _db = Database(db.engine.url)
+    queries = []
+
+    @event.listens_for(_db.engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    _db.automap(schemas=schemas, cache_file=cache_file)
+    _db.engine.dispose()
+    return _db, queries
+
+
+def test_schema_fingerprints(engine, cache_schemas):
+    cache = DatabaseModelCache()
+    fp1 = cache.schema_fingerprints(engine, schemas + ["nonexistent"])
+    assert set(fp1) == set(schemas)
+    run_sql(engine, "ALTER TABLE model_cache_b.parent ADD COLUMN description text")
+    fp2 = cache.schema_fingerprints(engine, schemas)
+    assert fp2["model_cache_a"] == fp1["model_cache_a"]
+    assert fp2["model_cache_b"] != fp1["model_cache_b"]
+
+
+def test_model_cache(db, cache_schemas, tmp_path):
+    cache_file = tmp_path / "models.pickle"
+    db1, _ = _automap(db, cache_file)
+    assert cache_file.exists()
+    builder = db1.mapper.automap_base.builder
+    assert builder.loaded_schemas == {s: False for s in schemas}
+
+    db2, queries = _automap(db, cache_file)
+    builder = db2.mapper.automap_base.builder
+    assert builder.loaded_schemas == {s: True for s in schemas}
+    assert db2.mapper.automap_base.loaded_from_cache
+    # Only the fingerprint query is run
+    assert len(queries) == 1
+    child = db2.model.model_cache_a_child
+    assert hasattr(child, "_parent")
+    assert db2.model.model_cache_b_parent.__table__.c.keys() == ["id", "name"]
+    # No temporary files are left behind
+    assert [p.name for p in tmp_path.iterdir()] == ["models.pickle"]
+
+
+def test_model_cache_rebuilds_changed_schema(db, engine, cache_schemas, tmp_path):
+    cache_file = tmp_path / "models.pickle"
+    _automap(db, cache_file)
+
+    run_sql(engine, "ALTER TABLE model_cache_a.child ADD COLUMN note text")
+    db2, _ = _automap(db, cache_file)
+    assert db2.mapper.automap_base.builder.loaded_schemas == {
+        "model_cache_a": False,
+        "model_cache_b": True,
+    }
+    assert "note" in db2.model.model_cache_a_child.__table__.c
+
+    # The rebuilt schema is cached
+    db3, _ = _automap(db, cache_file)
+    assert all(db3.mapper.automap_base.builder.loaded_schemas.values())
+
+
+def test_model_cache_tracks_referenced_schemas(db, engine, cache_schemas, tmp_path):
+    cache_file = tmp_path / "models.pickle"
+    _db = Database(db.engine.url)
+    _db.automap(schemas=["model_cache_a"], cache_file=cache_file)
+    _db.engine.dispose()
+
+    # A change to a table referenced from another schema invalidates the entry
+    run_sql(engine, "ALTER TABLE model_cache_b.parent ADD COLUMN description text")
+    _db = Database(db.engine.url)
+    _db.automap(schemas=["model_cache_a"], cache_file=cache_file)
+    _db.engine.dispose()
+    assert _db.mapper.automap_base.builder.loaded_schemas["model_cache_a"] is False
+    parent = _db.mapper.automap_base.metadata.tables["model_cache_b.parent"]
+    assert "description" in parent.c
+
+
+def test_model_cache_ignores_legacy_file(db, cache_schemas, tmp_path):
+    cache_file = tmp_path / "models.pickle"
+    with open(cache_file, "wb") as f:
+        dump({"legacy": "metadata"}, f)
+    db1, _ = _automap(db, cache_file)
+    assert not any(db1.mapper.automap_base.builder.loaded_schemas.values())
+    assert "model_cache_a_child" in db1.model
@@ -0,0 +1,74 @@
+"""
+Tests for output sinks used to report progress while running SQL.
+"""
+
+import json
+from io import StringIO
+
+from macrostrat.database.output import (
+    ConsoleSink,
+    JSONLinesSink,
+    MemorySink,
+    get_output_sink,
+    null_sink,
+)
+from macrostrat.database.query import _normalize_output_args
+
+from .test_database import db, empty_db, engine
+
+sql = "SELECT 1; SELECT * FROM nonexistent_table; SELECT 2"
+
+
+def test_memory_sink(db):
+    sink = MemorySink()
+    db.run_sql(sql, output_file=sink)
+    assert [e.kind for e in sink.events] == ["statement", "error", "statement"]
+    assert sink.events[0].text == "SELECT 1"
+    assert "nonexistent_table" in sink.errors[0].to_dict()["error"]
+
+
+def test_memory_sink_replay(db):
+    sink = MemorySink()
+    db.run_sql(sql, output_file=sink)
+    output = StringIO()
+    sink.replay(ConsoleSink(output))
+    text = output.getvalue()
+    assert text.startswith("SELECT 1\n")
+    assert text.endswith("SELECT 2\n")
+
+
+def test_json_lines_sink(db, tmp_path):
+    fn = tmp_path / "output.jsonl"
+    sink = JSONLinesSink(fn)
+    db.run_sql(sql, output_file=sink)
+    sink.close()
+    events = [json.loads(line) for line in fn.read_text().splitlines()]
+    assert [e["event"] for e in events] == ["statement", "error", "statement"]
+    assert events[1]["already_exists"] is False
+    assert all(isinstance(e["time"], float) for e in events)
+
+
+def test_console_sink_batching():
+    output = StringIO()
+    sink = ConsoleSink(output, max_lines=2, interval=60)
+    sink.statement("SELECT 1")
+    assert output.getvalue() == ""
+    sink.statement("SELECT 2")
+    assert output.getvalue() == "SELECT 1\nSELECT 2\n"
+    sink.statement("SELECT 3", skipped=True)
+    sink.flush()
+    assert output.getvalue().endswith("SELECT 3\n")
+
+
+def test_console_sink_flushes_before_errors():
+    output = StringIO()
+    sink = ConsoleSink(output, interval=60)
+    sink.statement("SELECT 1")
+    sink.error("SELECT 2", Exception("Test error"))
+    assert output.getvalue() == "SELECT 1\nSELECT 2\nTest error\n"
+
+
+def test_null_sink():
+    output_mode, sink = _normalize_output_args(dict(output_mode="none"))
+    assert sink is null_sink
+    assert get_output_sink(sink) is null_sink
@@ -0,0 +1,148 @@
+"""
+Tests for staged, concurrent fixture execution with ``run_fixtures(parallel=N)``.
+"""
+
+from io import StringIO
+
+from pytest import fixture, raises
+
+from macrostrat.database.fixtures import FixtureError, plan_stages
+from macrostrat.database.postgresql import table_exists
+
+from .test_database import db, empty_db, engine
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+@fixture
+def dependent_fixtures(tmp_path):
+    _write(
+        tmp_path / "01-schema.sql",
+        "CREATE SCHEMA parallel_test;\n",
+    )
+    _write(
+        tmp_path / "02-table-a.sql",
+        "-- A table\n-- depends-on: 01-schema.sql\n"
+        "CREATE TABLE parallel_test.a (id integer PRIMARY KEY);\n",
+    )
+    _write(
+        tmp_path / "03-table-b.sql",
+        "-- depends-on: 01-schema.sql\n"
+        "CREATE TABLE parallel_test.b (id integer PRIMARY KEY);\n",
+    )
+    _write(
+        tmp_path / "04-view.sql",
+        "-- depends-on: 02-table-a.sql, 03-table-b.sql\n"
+        "CREATE VIEW parallel_test.ab AS SELECT a.id FROM parallel_test.a JOIN parallel_test.b USING (id);\n",
+    )
+    return tmp_path
+
+
+@fixture
+def cleanup(db):
+    yield
+    db.run_sql("DROP SCHEMA IF EXISTS parallel_test CASCADE", raise_errors=True)
+
+
+def test_dependency_stages(dependent_fixtures):
+    files = sorted(dependent_fixtures.glob("*.sql"))
+    stages = [[f.name for f in stage] for stage in plan_stages(files)]
+    assert stages == [
+        ["01-schema.sql"],
+        ["02-table-a.sql", "03-table-b.sql"],
+        ["04-view.sql"],
+    ]
+
+
+def test_directory_stages(tmp_path):
+    files = [
+        _write(tmp_path / "a-schemas" / "01.sql", "SELECT 1;"),
+        _write(tmp_path / "a-schemas" / "02.sql", "SELECT 1;"),
+        _write(tmp_path / "b-views" / "01.sql", "SELECT 1;"),
+    ]
+    stages = plan_stages(files, by_directory=True)
+    assert stages == [files[:2], files[2:]]
+
+
+def test_undeclared_fixtures_run_in_order(tmp_path):
+    files = [
+        _write(tmp_path / "00_schema.sql", "SELECT 1;"),
+        _write(tmp_path / "01_data.sql", "SELECT 1;"),
+    ]
+    assert plan_stages(files) == [[files[0]], [files[1]]]
+
+
+def test_mixed_declarations(tmp_path):
+    files = [
+        _write(tmp_path / "00_schema.sql", "SELECT 1;"),
+        _write(tmp_path / "01_data.sql", "SELECT 1;"),
+        _write(tmp_path / "02_a.sql", "-- depends-on: 00_schema.sql\nSELECT 1;"),
+        _write(tmp_path / "03_b.sql", "-- depends-on: 00_schema.sql\nSELECT 1;"),
+        _write(tmp_path / "04_view.sql", "SELECT 1;"),
+    ]
+    stages = [[f.name for f in stage] for stage in plan_stages(files)]
+    # Files without declarations keep their place in name order
+    assert stages == [
+        ["00_schema.sql"],
+        ["01_data.sql", "02_a.sql", "03_b.sql"],
+        ["04_view.sql"],
+    ]
+
+
+def test_circular_dependencies(tmp_path):
+    files = [
+        _write(tmp_path / "a.sql", "-- depends-on: b.sql\nSELECT 1;"),
+        _write(tmp_path / "b.sql", "-- depends-on: a.sql\nSELECT 1;"),
+    ]
+    with raises(ValueError):
+        plan_stages(files)
+
+
+def test_parallel_fixtures(db, dependent_fixtures, cleanup):
+    output = StringIO()
+    report = db.run_fixtures(dependent_fixtures, parallel=4, output_file=output)
+    assert report.failures == []
+    assert len(report) == 4
+    assert table_exists(db, "a", schema="parallel_test")
+    assert table_exists(db, "b", schema="parallel_test")
+    # Output is printed per file, in order
+    text = output.getvalue()
+    assert text.index("02-table-a.sql") < text.index("03-table-b.sql")
+
+
+def test_parallel_fixtures_failures(db, dependent_fixtures, cleanup):
+    _write(
+        dependent_fixtures / "03-table-b.sql",
+        "-- depends-on: 01-schema.sql\nSELECT * FROM nonexistent_table;\n",
+    )
+    report = db.run_fixtures(dependent_fixtures, parallel=4, output_mode="none")
+    assert [f.file.name for f in report.failures] == ["03-table-b.sql", "04-view.sql"]
+    assert table_exists(db, "a", schema="parallel_test")
+
+
+def test_parallel_fixtures_raise_errors(db, dependent_fixtures, cleanup):
+    _write(
+        dependent_fixtures / "03-table-b.sql",
+        "-- depends-on: 01-schema.sql\nSELECT * FROM nonexistent_table;\n",
+    )
+    with raises(FixtureError) as exc:
+        db.run_fixtures(
+            dependent_fixtures, parallel=4, output_mode="none", raise_errors=True
+        )
+    assert [f.file.name for f in exc.value.failures] == ["03-table-b.sql"]
+    # Later stages are not run
+    assert not table_exists(db, "ab", schema="parallel_test")
+
+
+def test_parallel_fixtures_without_dependencies(db, tmp_path, cleanup):
+    # Files that depend on earlier ones by name order alone
+    _write(tmp_path / "00_schema.sql", "CREATE SCHEMA parallel_test;")
+    _write(tmp_path / "01_table.sql", "CREATE TABLE parallel_test.a (id integer);")
+    _write(tmp_path / "02_data.sql", "INSERT INTO parallel_test.a VALUES (1);")
+    report = db.run_fixtures(tmp_path, parallel=4, output_mode="none")
+    assert report.failures == []
+    assert db.run_query("SELECT count(*) FROM parallel_test.a").scalar() == 1
@@ -0,0 +1,102 @@
+"""
+Tests for running multi-statement SQL in psycopg pipeline mode.
+"""
+
+from io import StringIO
+
+from pytest import raises
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+
+from macrostrat.database.query import ExecutionReport, StatementDirective, run_sql
+
+from .test_database import db, empty_db, engine
+
+setup_sql = """
+CREATE TABLE pipeline_test (id integer PRIMARY KEY, name text);
+INSERT INTO pipeline_test (id, name) VALUES (1, 'one');
+INSERT INTO pipeline_test (id, name) VALUES (:id, :name);
+SELECT count(*) FROM pipeline_test;
+"""
+
+
+def _count(db):
+    return db.run_query("SELECT count(*) FROM pipeline_test").scalar()
+
+
+def test_pipeline(db):
+    with db.transaction(rollback="always"):
+        res = db.run_sql(
+            setup_sql, dict(id=2, name="two"), pipeline=True, raise_errors=True
+        )
+        assert len(res) == 4
+        assert res[-1].scalar() == 2
+        assert _count(db) == 2
+
+
+def test_pipeline_small_batches(db):
+    with db.transaction(rollback="always"):
+        res = db.run_sql(
+            setup_sql,
+            dict(id=2, name="two"),
+            pipeline=True,
+            pipeline_batch_size=1,
+            raise_errors=True,
+        )
+        assert len(res) == 4
+        assert _count(db) == 2
+
+
+def test_pipeline_error_falls_back(db):
+    sql = """
+    CREATE TABLE pipeline_test (id integer PRIMARY KEY);
+    INSERT INTO pipeline_test (id) VALUES (1);
+    INSERT INTO pipeline_test (id) VALUES (1);
+    INSERT INTO pipeline_test (id) VALUES (2);
+    """
+    with db.transaction(rollback="always"):
+        with StringIO() as output:
+            db.run_sql(sql, pipeline=True, output_file=output)
+            output.seek(0)
+            assert "duplicate key" in output.read()
+        # Statements on either side of the failing one were applied
+        assert _count(db) == 2
+
+
+def test_pipeline_error_raises(db):
+    sql = "SELECT 1; SELECT * FROM pipeline_missing_table; SELECT 2"
+    with raises(ProgrammingError):
+        db.run_sql(sql, pipeline=True, raise_errors=True)
+    db.session.rollback()
+
+
+def test_pipeline_error_context(db):
+    sql = "SELECT 1; SELECT * FROM pipeline_missing_table; SELECT 2"
+    seen = []
+
+    def recover(ctx, err, connectable):
+        seen.append(ctx.index)
+        return [StatementDirective(query="SELECT 3")]
+
+    res = db.run_sql(sql, pipeline=True, on_error=recover, raise_errors=True)
+    assert seen == [1]
+    assert len(res) == 3
+
+
+def test_pipeline_error_autocommit(engine):
+    sql = """
+    INSERT INTO pipeline_autocommit_test (id) VALUES (1);
+    INSERT INTO pipeline_autocommit_test (id) VALUES (1);
+    INSERT INTO pipeline_autocommit_test (id) VALUES (2);
+    """
+    report = ExecutionReport()
+    run_sql(engine, "CREATE TABLE pipeline_autocommit_test (id integer PRIMARY KEY)")
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            # The batch can't be rolled back, so it isn't re-run
+            with raises(IntegrityError):
+                run_sql(conn, sql, pipeline=True, report=report, output_mode="none")
+        assert [r.index for r in report.records] == [1]
+        assert report.records[0].failed
+    finally:
+        run_sql(engine, "DROP TABLE pipeline_autocommit_test")
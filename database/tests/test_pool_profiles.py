@@ -0,0 +1,108 @@
+"""
+Tests for named connection pool profiles.
+"""
+
+from pytest import fixture, raises
+from sqlalchemy.pool import NullPool
+
+from macrostrat.database import Database
+from macrostrat.database.profiles import (
+    PoolProfile,
+    get_pool_profile,
+    pool_profiles,
+    register_pool_profile,
+)
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def make_db(db):
+    databases = []
+
+    def _make_db(**kwargs):
+        _db = Database(db.engine.url, **kwargs)
+        databases.append(_db)
+        return _db
+
+    yield _make_db
+    for _db in databases:
+        _db.engine.dispose()
+
+
+def test_builtin_profiles():
+    assert {"default", "web", "worker", "cli", "pgbouncer"} <= set(pool_profiles)
+    assert get_pool_profile("pgbouncer").prepare_threshold is None
+    assert get_pool_profile().engine_kwargs() == {}
+    with raises(ValueError):
+        get_pool_profile("nonexistent")
+
+
+def test_web_profile(make_db):
+    _db = make_db(profile="web")
+    assert _db.profile is pool_profiles["web"]
+    pool = _db.engine.pool
+    assert pool.size() == 10
+    assert pool._max_overflow == 20
+    assert pool._recycle == 1800
+    assert pool._pre_ping
+    assert _db.run_query("SHOW statement_timeout").scalar() == "30s"
+    assert _db.run_query("SHOW application_name").scalar() == "macrostrat-web"
+
+
+def test_profile_overrides(make_db):
+    _db = make_db(profile="web", pool_size=3, statement_timeout=1500)
+    assert _db.profile.name == "web"
+    assert _db.profile.pool_size == 3
+    assert _db.engine.pool.size() == 3
+    assert _db.run_query("SHOW statement_timeout").scalar() == "1500ms"
+
+
+def test_connect_args_override(make_db):
+    _db = make_db(profile="web", connect_args=dict(application_name="test-app"))
+    assert _db.run_query("SHOW application_name").scalar() == "test-app"
+    # Other profile connection settings are kept
+    assert _db.run_query("SHOW statement_timeout").scalar() == "30s"
+
+
+def test_connect_args_options(make_db):
+    _db = make_db(profile="web", connect_args=dict(options="-c work_mem=8MB"))
+    # Startup options are combined with the profile's
+    assert _db.run_query("SHOW work_mem").scalar() == "8MB"
+    assert _db.run_query("SHOW statement_timeout").scalar() == "30s"
+
+
+def test_profile_with_engine(db):
+    with raises(ValueError):
+        Database(db.engine, profile="web")
+    with raises(ValueError):
+        Database(db.engine, statement_timeout=1000)
+    # The prepared-statement policy can still be set
+    _db = Database(db.engine, prepared_max=50)
+    assert _db.engine is db.engine
+
+
+def test_cli_profile(make_db):
+    _db = make_db(profile="cli")
+    assert isinstance(_db.engine.pool, NullPool)
+    assert _db.run_query("SELECT 1").scalar() == 1
+
+
+def test_pgbouncer_profile(make_db):
+    _db = make_db(profile="pgbouncer")
+    with _db.engine.connect() as conn:
+        assert conn.connection.driver_connection.prepare_threshold is None
+    assert _db.prepared_statement_stats() is None
+
+
+def test_custom_profile(make_db):
+    profile = PoolProfile("test-custom", pool_size=1, max_overflow=0)
+    register_pool_profile(profile)
+    try:
+        _db = make_db(profile="test-custom")
+        assert _db.profile is profile
+        assert _db.engine.pool.size() == 1
+        _db = make_db(profile=profile.replace(pool_size=2))
+        assert _db.engine.pool.size() == 2
+    finally:
+        del pool_profiles["test-custom"]
@@ -0,0 +1,92 @@
+"""
+Tests for server-side prepared statement settings and hit-rate tracking.
+"""
+
+from pytest import fixture
+
+from macrostrat.database import Database
+from macrostrat.database.prepared import PreparedStatementTracker
+
+from .test_database import db, empty_db, engine
+
+
+def test_tracker_policy():
+    tracker = PreparedStatementTracker(prepare_threshold=2, prepared_max=1)
+    info = {}
+    for _ in range(5):
+        tracker.observe(info, "SELECT 1")
+    # Prepared on the third execution, and reused afterwards
+    assert tracker.stats()["prepares"] == 1
+    assert tracker.hits == 2
+    assert tracker.hit_rate == 2 / 5
+
+    # Evicted once another statement is prepared
+    for _ in range(3):
+        tracker.observe(info, "SELECT 2")
+    tracker.observe(info, "SELECT 1")
+    assert tracker.hits == 2
+
+    tracker.clear(info)
+    tracker.observe(info, "SELECT 2")
+    assert tracker.hits == 2
+
+
+@fixture
+def prepared_db(db):
+    _db = Database(
+        db.engine.url,
+        prepare_threshold=0,
+        prepared_max=10,
+        track_prepared_statements=True,
+    )
+    yield _db
+    _db.engine.dispose()
+
+
+def test_prepared_statements(prepared_db):
+    with prepared_db.engine.connect() as conn:
+        assert conn.connection.driver_connection.prepare_threshold == 0
+    for i in range(5):
+        assert prepared_db.run_query("SELECT :i::integer", dict(i=i)).scalar() == i
+    stats = prepared_db.prepared_statement_stats()
+    assert stats["executions"] >= 5
+    assert stats["hits"] >= 1
+
+    # Check that the server has the statement prepared
+    n_prepared = prepared_db.run_query(
+        "SELECT count(*) FROM pg_prepared_statements"
+    ).scalar()
+    assert n_prepared >= 1
+
+
+def test_disable_prepared_statements(db):
+    _db = Database(db.engine.url, prepare_threshold=None)
+    try:
+        with _db.engine.connect() as conn:
+            assert conn.connection.driver_connection.prepare_threshold is None
+        assert _db.prepared_statement_stats() is None
+    finally:
+        _db.engine.dispose()
+
+
+def _n_listeners(engine):
+    return len(engine.dispatch.before_cursor_execute) + len(
+        engine.pool.dispatch.connect
+    )
+
+
+def test_shared_engine_listeners(db):
+    engine = Database(db.engine.url).engine
+    n_listeners = _n_listeners(engine)
+    try:
+        # Nothing is attached with default settings
+        assert Database(engine).prepared_statement_stats() is None
+        assert _n_listeners(engine) == n_listeners
+
+        # Tracking is attached once, and shared
+        databases = [Database(engine, track_prepared_statements=True) for _ in range(5)]
+        assert _n_listeners(engine) == n_listeners + 1
+        trackers = {id(d._prepared_statements) for d in databases}
+        assert len(trackers) == 1
+    finally:
+        engine.dispose()
@@ -0,0 +1,69 @@
+"""
+Tests for connection-free rendering of psycopg ``Composed`` queries.
+"""
+
+from psycopg.sql import SQL, Identifier, Literal
+from sqlalchemy import event
+
+from macrostrat.database.query import (
+    _composable_key,
+    _render_query,
+    rendered_query_cache,
+)
+
+from .test_database import db, empty_db, engine
+
+
+def _query(table="sample", value="it's a \\ test"):
+    return SQL("SELECT * FROM {table} WHERE name = {value}").format(
+        table=Identifier("public", table), value=Literal(value)
+    )
+
+
+def test_render_without_connection(db):
+    # Settings are checked once per engine
+    _render_query(_query(), db.engine)
+
+    checkouts = []
+
+    def on_checkout(*args):
+        checkouts.append(args)
+
+    event.listen(db.engine, "checkout", on_checkout)
+    try:
+        for i in range(10):
+            _render_query(_query(value=str(i)), db.engine)
+    finally:
+        event.remove(db.engine, "checkout", on_checkout)
+    assert checkouts == []
+
+
+def test_render_matches_connection(db):
+    query = _query()
+    with db.engine.connect() as conn:
+        expected = query.as_string(conn.connection.driver_connection)
+    assert _render_query(query, db.engine) == expected
+    assert _render_query(query, db.session) == expected
+
+
+def test_rendered_queries_memoized(db):
+    rendered_query_cache.clear()
+    _render_query(_query(), db.engine)
+    _render_query(_query(), db.engine)
+    assert rendered_query_cache.stats()["hits"] == 1
+    assert rendered_query_cache.stats()["size"] == 1
+
+
+def test_composable_keys():
+    assert _composable_key(_query()) == _composable_key(_query())
+    assert _composable_key(_query(value=1)) != _composable_key(_query(value=True))
+    # Arbitrary objects aren't cached
+    assert _composable_key(_query(value=[1, 2])) is None
+
+
+def test_run_query_with_identifiers(db):
+    res = db.run_query(
+        "SELECT count(*) FROM {table} WHERE name != {value}",
+        dict(table=Identifier("sample"), value=Literal("\\'")),
+    )
+    assert res.scalar() >= 0
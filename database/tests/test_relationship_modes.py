@@ -0,0 +1,109 @@
+"""
+Tests for limiting the relationships generated by automap.
+"""
+
+from pytest import fixture, mark, raises
+from sqlalchemy.orm import configure_mappers
+
+from macrostrat.database import Database
+from macrostrat.database.query import run_sql
+
+from .test_database import db, empty_db, engine
+
+schemas = ["rel_test_a", "rel_test_b"]
+
+
+@fixture
+def relationship_schemas(engine):
+    sql = ""
+    for schema in schemas:
+        sql += f"""
+        CREATE SCHEMA {schema};
+        CREATE TABLE {schema}.parent (id serial PRIMARY KEY);
+        CREATE TABLE {schema}.tag (id serial PRIMARY KEY);
+        CREATE TABLE {schema}.child (
+            id serial PRIMARY KEY,
+            parent_id integer REFERENCES {schema}.parent(id)
+        );
+        CREATE TABLE {schema}.parent_tag (
+            parent_id integer REFERENCES {schema}.parent(id),
+            tag_id integer REFERENCES {schema}.tag(id),
+            PRIMARY KEY (parent_id, tag_id)
+        );
+        """
+    run_sql(engine, sql, raise_errors=True, output_mode="none")
+    yield schemas
+    run_sql(
+        engine,
+        "; ".join(f"DROP SCHEMA {schema} CASCADE" for schema in schemas),
+        output_mode="none",
+    )
+
+
+def _relationships(db, schema):
+    configure_mappers()
+    res = {}
+    for table in ("parent", "child", "tag"):
+        model = db.model[f"{schema}_{table}"]
+        res[table] = sorted(model.__mapper__.relationships.keys())
+    return res
+
+
+@fixture
+def automap(db, relationship_schemas):
+    databases = []
+
+    def _automap(**kwargs):
+        _db = Database(db.engine.url)
+        _db.automap(schemas=relationship_schemas, **kwargs)
+        databases.append(_db)
+        return _db
+
+    yield _automap
+    for _db in databases:
+        _db.cleanup()
+
+
+def test_all_relationships(automap):
+    _db = automap(relationships="all")
+    assert _relationships(_db, "rel_test_a") == {
+        "parent": ["rel_test_a_child_collection", "rel_test_a_tag_collection"],
+        "child": ["_parent"],
+        "tag": ["rel_test_a_parent_collection"],
+    }
+
+
+def test_scalar_relationships(automap):
+    _db = automap(relationships="scalar")
+    assert _relationships(_db, "rel_test_a") == {
+        "parent": [],
+        "child": ["_parent"],
+        "tag": [],
+    }
+
+
+def test_no_relationships(automap):
+    _db = automap(relationships="none")
+    assert _relationships(_db, "rel_test_a") == {"parent": [], "child": [], "tag": []}
+
+
+def test_relationships_by_schema(automap):
+    _db = automap(relationships={"rel_test_a": "scalar", "*": "none"})
+    assert _relationships(_db, "rel_test_a")["child"] == ["_parent"]
+    assert _relationships(_db, "rel_test_b")["child"] == []
+
+
+@mark.parametrize("relationships", ["some", {"rel_test_a": "many"}])
+def test_invalid_relationship_mode(automap, relationships):
+    with raises(ValueError):
+        automap(relationships=relationships)
+
+
+def test_lazy_scalar_relationships(automap):
+    _db = automap(relationships="scalar", lazy=True)
+    _db.model.rel_test_a_parent
+    child = _db.model.rel_test_a_child
+    configure_mappers()
+    # Relationships to models mapped earlier follow the same mode
+    assert child.__mapper__.relationships.keys() == ["_parent"]
+    assert _db.model.rel_test_a_parent.__mapper__.relationships.keys() == []
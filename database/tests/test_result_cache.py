@@ -0,0 +1,176 @@
+"""
+Tests for the read-query result cache.
+"""
+
+from time import sleep
+
+from pytest import fixture, raises
+from sqlalchemy.engine import FrozenResult
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from macrostrat.database import Database
+from macrostrat.database.result_cache import (
+    ResultCache,
+    create_invalidation_trigger,
+    infer_table_tags,
+    normalize_table_tag,
+)
+from macrostrat.database.utils import temporary_database
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def lookup_table(db):
+    db.run_sql("""
+        CREATE TABLE result_cache_test (id integer PRIMARY KEY, name text);
+        INSERT INTO result_cache_test VALUES (1, 'one'), (2, 'two');
+        """)
+    db.session.commit()
+    db.result_cache.clear()
+    yield "public.result_cache_test"
+    db.result_cache.stop()
+    db.run_sql("DROP TABLE result_cache_test")
+    db.session.commit()
+
+
+def _insert(engine, id):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO result_cache_test VALUES ({id}, 'new')")
+
+
+query = "SELECT id, name FROM result_cache_test WHERE id >= :min_id ORDER BY id"
+
+
+def test_table_tags():
+    assert normalize_table_tag("Units") == "public.units"
+    assert normalize_table_tag('macrostrat."Units"') == "macrostrat.Units"
+    tags = infer_table_tags(
+        "SELECT * FROM macrostrat.units u JOIN lookup l ON true, generate_series(1, 2)"
+    )
+    assert tags == {"macrostrat.units", "public.lookup"}
+    # Comma-separated FROM lists, with aliases, functions and subqueries
+    tags = infer_table_tags(
+        "SELECT * FROM a, b AS x, generate_series(1, 2) g, (SELECT 1) s, c y"
+    )
+    assert tags == {"public.a", "public.b", "public.c"}
+
+
+def test_cached_query(db, lookup_table):
+    res = db.run_query(query, dict(min_id=1), cache=60)
+    assert [r.id for r in res] == [1, 2]
+    _insert(db.engine, 3)
+    # The cached result is returned, and can be iterated again
+    res = db.run_query(query, dict(min_id=1), cache=60)
+    assert [r.id for r in res] == [1, 2]
+    # Different parameters are cached separately
+    res = db.run_query(query, dict(min_id=2), cache=60)
+    assert [r.id for r in res] == [2, 3]
+    stats = db.result_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+    assert stats["bytes"] > 0
+
+
+def test_cache_expiry(db, lookup_table):
+    db.run_query(query, dict(min_id=1), cache=0.05)
+    _insert(db.engine, 3)
+    sleep(0.1)
+    res = db.run_query(query, dict(min_id=1), cache=0.05)
+    assert len(res.all()) == 3
+    assert db.result_cache.stats()["expirations"] == 1
+
+
+def test_cache_invalidation(db, lookup_table):
+    db.run_query(query, dict(min_id=1), cache=60)
+    db.run_query("SELECT 1 AS one", cache=60)
+    assert db.result_cache.invalidate("result_cache_test") == 1
+    assert len(db.result_cache) == 1
+
+
+def test_listen_notify_invalidation(db, lookup_table):
+    create_invalidation_trigger(db.engine, lookup_table)
+    db.result_cache.listen(db.engine, poll_interval=0.05)
+    assert db.result_cache.listening
+
+    db.run_query(query, dict(min_id=1), cache=60)
+    _insert(db.engine, 3)
+    for _ in range(100):
+        if len(db.result_cache) == 0:
+            break
+        sleep(0.02)
+    res = db.run_query(query, dict(min_id=1), cache=60)
+    assert len(res.all()) == 3
+    assert db.result_cache.stats()["invalidations"] == 1
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    for i in range(3):
+        cache.put(i, _frozen([(i,)]), ttl=60)
+    assert cache.get(0) is None
+    assert cache.get(2) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_bound():
+    small = _frozen([(1,)])
+    large = _frozen([("x" * 1000,)] * 100)
+    cache = ResultCache(max_bytes=50_000)
+    cache.put("small", small, ttl=60)
+    assert not cache.put("large", large, ttl=60)
+    assert cache.stats()["bytes"] < 50_000
+
+
+def test_uncacheable_statements(db, lookup_table):
+    with raises(ValueError):
+        db.run_query("SELECT 1; SELECT 2", cache=60)
+    db.run_query("UPDATE result_cache_test SET name = 'updated'", cache=60)
+    assert len(db.result_cache) == 0
+    # Writes that return rows run every time
+    insert = "INSERT INTO result_cache_test VALUES (:id, 'new') RETURNING id"
+    for id in (3, 4):
+        assert db.run_query(insert, dict(id=id), cache=60).scalar() == id
+    locking = "SELECT id FROM result_cache_test FOR UPDATE"
+    db.run_query(locking, cache=60).all()
+    assert len(db.result_cache) == 0
+    assert db.run_query(query, dict(min_id=1), cache=60).all()[-1].id == 4
+
+
+def test_no_caching_in_transactions(db, lookup_table):
+    with db.transaction(rollback="always"):
+        insert = "INSERT INTO result_cache_test VALUES (3, 'uncommitted')"
+        db.run_sql(insert, raise_errors=True)
+        res = db.run_query(query, dict(min_id=1), cache=60)
+        assert len(res.all()) == 3
+        assert len(db.result_cache) == 0
+    # Rolled-back rows aren't served from the cache
+    assert len(db.run_query(query, dict(min_id=1), cache=60).all()) == 2
+
+
+def test_shared_cache(db):
+    cache = ResultCache()
+    # An empty cache is falsy, but is still used
+    first = Database(db.engine.url, result_cache=cache)
+    assert first.result_cache is cache
+
+    url = db.engine.url.set(database=db.engine.url.database + "_result_cache")
+    with temporary_database(url, force_drop=True) as engine:
+        second = Database(engine.url, result_cache=cache)
+        try:
+            query = "SELECT current_database() AS name"
+            # Entries are keyed on the database
+            names = [d.run_query(query, cache=60).scalar() for d in (first, second)]
+            assert names == [db.engine.url.database, url.database]
+            assert len(cache) == 2
+            assert first.run_query(query, cache=60).scalar() == names[0]
+            assert cache.stats()["hits"] == 1
+        finally:
+            second.cleanup()
+            first.cleanup()
+
+
+def _frozen(rows):
+    res = IteratorResult(SimpleResultMetaData(["value"]), iter(rows))
+    return FrozenResult(res)
@@ -0,0 +1,70 @@
+"""
+Tests for batched execution of a statement over many parameter sets.
+"""
+
+from pytest import raises
+
+from macrostrat.database import run_many
+
+from .test_database import db, empty_db, engine
+
+
+def _rows(n):
+    for i in range(n):
+        yield dict(id=i, name=f"row {i}")
+
+
+def _setup(db):
+    db.run_sql(
+        "CREATE TABLE many_test (id integer PRIMARY KEY, name text)", raise_errors=True
+    )
+
+
+def test_run_many(db):
+    with db.transaction(rollback="always"):
+        _setup(db)
+        n = db.run_many(
+            "INSERT INTO many_test (id, name) VALUES (:id, :name)",
+            _rows(2500),
+            batch_size=1000,
+        )
+        assert n == 2500
+        assert db.run_query("SELECT count(*) FROM many_test").scalar() == 2500
+
+
+def test_run_query_many(db):
+    with db.transaction(rollback="always"):
+        _setup(db)
+        n = db.run_query(
+            "INSERT INTO many_test (id, name) VALUES (:id, :name)",
+            _rows(10),
+            many=True,
+            batch_size=3,
+        )
+        assert n == 10
+        n = db.run_query(
+            "UPDATE many_test SET name = 'updated' WHERE id = :id",
+            ({"id": i} for i in range(5)),
+            many=True,
+        )
+        assert n == 5
+
+
+def test_run_many_instance_params(db):
+    db.instance_params = {"suffix": "!"}
+    try:
+        with db.transaction(rollback="always"):
+            _setup(db)
+            db.run_many(
+                "INSERT INTO many_test (id, name) VALUES (:id, :name || :suffix)",
+                _rows(3),
+            )
+            names = db.run_query("SELECT name FROM many_test ORDER BY id").scalars()
+            assert list(names) == ["row 0!", "row 1!", "row 2!"]
+    finally:
+        db.instance_params = {}
+
+
+def test_run_many_single_statement(db):
+    with raises(ValueError):
+        run_many(db.engine, "SELECT 1; SELECT 2", [{}])
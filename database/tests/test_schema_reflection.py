@@ -0,0 +1,123 @@
+"""
+Tests for concurrent reflection of several schemas.
+"""
+
+from threading import current_thread
+
+from pytest import fixture
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table, Text, event
+
+from macrostrat.database import Database
+from macrostrat.database.mapper.reflection import merge_schemas, reflect_schemas
+from macrostrat.database.query import run_sql
+
+from .test_database import db, empty_db, engine
+
+schemas = [f"reflect_test_{i}" for i in range(4)]
+
+
+@fixture
+def reflection_schemas(engine):
+    sql = ""
+    for i, schema in enumerate(schemas):
+        sql += f"""
+        CREATE SCHEMA {schema};
+        CREATE TABLE {schema}.item (id serial PRIMARY KEY, name text);
+        """
+        if i > 0:
+            # Reference a table in the previous schema
+            sql += f"""
+            CREATE TABLE {schema}.link (
+                id serial PRIMARY KEY,
+                item_id integer REFERENCES {schemas[i - 1]}.item(id)
+            );
+            """
+    run_sql(engine, sql, raise_errors=True, output_mode="none")
+    yield schemas
+    run_sql(
+        engine,
+        "; ".join(f"DROP SCHEMA {schema} CASCADE" for schema in schemas),
+        output_mode="none",
+    )
+
+
+def _mapped(db):
+    return {
+        key: (
+            [c.name for c in model.__table__.columns],
+            sorted(model.__mapper__.relationships.keys()),
+        )
+        for key, model in ((k, db.model[k]) for k in db.model.keys())
+        if key.startswith("reflect_test_")
+    }
+
+
+def test_reflect_schemas_concurrently(engine, reflection_schemas):
+    threads = set()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record_thread(conn, cursor, statement, parameters, context, executemany):
+        threads.add(current_thread().name)
+
+    try:
+        reflected = reflect_schemas(engine, reflection_schemas, max_workers=4)
+    finally:
+        event.remove(engine, "before_cursor_execute", record_thread)
+
+    assert list(reflected) == reflection_schemas
+    assert len([t for t in threads if t.startswith("reflect-schema")]) > 1
+    # Referenced tables in other schemas are reflected too
+    assert "reflect_test_0.item" in reflected["reflect_test_1"].tables
+
+
+def _automap(db, **kwargs):
+    _db = Database(db.engine.url)
+    try:
+        # Relationship modes other than "all" give each mapper its own base
+        _db.automap(schemas=schemas, **kwargs)
+        return _mapped(_db)
+    finally:
+        _db.cleanup()
+
+
+def test_concurrent_automap_matches_sequential(db, reflection_schemas):
+    sequential = _automap(db, relationships="none")
+    concurrent = _automap(db, relationships="none", max_workers=4)
+    assert concurrent == sequential
+    assert "reflect_test_3_link" in concurrent
+
+
+def test_concurrent_automap_relationships(db, reflection_schemas):
+    # Schemas are mapped together, so relationships across schemas are created
+    mapped = _automap(db, relationships={"*": "all"}, max_workers=4)
+    assert mapped["reflect_test_1_link"][1] == ["_item"]
+    assert mapped["reflect_test_0_item"][1] == ["reflect_test_1_link_collection"]
+
+
+def test_merge_prefers_own_tables():
+    # A stale copy of a table, reflected as a reference from another schema
+    referencing = MetaData()
+    Table("item", referencing, Column("id", Integer, primary_key=True), schema="b")
+    Table(
+        "link",
+        referencing,
+        Column("id", Integer, primary_key=True),
+        Column("item_id", ForeignKey("b.item.id")),
+        schema="a",
+    )
+    own = MetaData()
+    Table(
+        "item",
+        own,
+        Column("id", Integer, primary_key=True),
+        Column("name", Text),
+        schema="b",
+    )
+
+    for order in (["a", "b"], ["b", "a"]):
+        target = MetaData()
+        merge_schemas(target, {s: dict(a=referencing, b=own)[s] for s in order})
+        assert sorted(target.tables) == ["a.link", "b.item"]
+        assert target.tables["b.item"].c.keys() == ["id", "name"]
+        fk = next(iter(target.tables["a.link"].foreign_keys))
+        assert fk.column.table is target.tables["b.item"]
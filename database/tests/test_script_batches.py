@@ -0,0 +1,105 @@
+"""
+Tests for sending parameter-free statements as multi-statement scripts.
+"""
+
+from io import StringIO
+
+from pytest import fixture, raises
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import ProgrammingError
+
+from macrostrat.database.query import ExecutionReport, run_query, run_sql
+
+from .test_database import db, empty_db, engine
+
+script = """
+INSERT INTO script_batch_test (id) VALUES (1);
+INSERT INTO script_batch_test (id) VALUES (2);
+INSERT INTO nonexistent_table (id) VALUES (3);
+INSERT INTO script_batch_test (id) VALUES (4);
+INSERT INTO script_batch_test (id) VALUES (5);
+"""
+
+
+@fixture
+def test_table(engine):
+    run_sql(engine, "CREATE TABLE script_batch_test (id integer PRIMARY KEY)")
+    yield "script_batch_test"
+    run_sql(engine, "DROP TABLE script_batch_test")
+
+
+def _ids(engine):
+    with engine.connect() as conn:
+        res = run_query(conn, "SELECT id FROM script_batch_test ORDER BY id")
+        return [r[0] for r in res]
+
+
+def test_script_batch(engine, test_table):
+    report = ExecutionReport()
+    output = StringIO()
+    sql = (
+        "INSERT INTO script_batch_test (id) SELECT generate_series(1, 3); SELECT 50 % 3"
+    )
+    results = run_sql(
+        engine, sql, batch=True, yield_results=True, report=report, output_file=output
+    )
+    rowcounts = [res.rowcount for res in results]
+    assert rowcounts == [3, 1]
+    assert _ids(engine) == [1, 2, 3]
+    assert [r.index for r in report.records] == [0, 1]
+    assert output.getvalue().count("\n") == 2
+
+
+def test_script_batch_results(engine, test_table):
+    sql = (
+        "SELECT 1 AS a; SELECT 2 AS b, 3 AS c; INSERT INTO script_batch_test VALUES (1)"
+    )
+    results = run_sql(engine, sql, batch=True, raise_errors=True, output_mode="none")
+    # Each statement has its own result, like the default path
+    assert [r.all() for r in results[:2]] == [[(1,)], [(2, 3)]]
+    assert list(results[1].keys()) == ["b", "c"]
+    assert not results[2].returns_rows
+    assert results[2].rowcount == 1
+    assert all(isinstance(r, Result) for r in results)
+
+
+def test_script_batch_error(engine, test_table):
+    report = ExecutionReport()
+    output = StringIO()
+    run_sql(engine, script, batch=True, report=report, output_file=output)
+    # The failing statement is found and handled as usual
+    assert _ids(engine) == [1, 2, 4, 5]
+    assert [r.index for r in report.errors] == [2]
+    assert "nonexistent_table" in output.getvalue()
+
+
+def test_script_batch_raise_errors(engine, test_table):
+    with raises(ProgrammingError):
+        run_sql(engine, script, batch=True, raise_errors=True, output_mode="none")
+    # Statements before the failing one are committed
+    assert _ids(engine) == [1, 2]
+
+
+def test_script_batch_with_params(engine, test_table):
+    sql = """
+    INSERT INTO script_batch_test (id) VALUES (1);
+    INSERT INTO script_batch_test (id) VALUES (:id);
+    INSERT INTO script_batch_test (id) SELECT max(id) + 1 FROM script_batch_test;
+    """
+    run_sql(engine, sql, dict(id=2), batch=True, raise_errors=True)
+    assert _ids(engine) == [1, 2, 3]
+
+
+def test_script_batch_single_transaction(engine, test_table):
+    run_sql(engine, script, batch=True, single_transaction=True, output_mode="none")
+    assert _ids(engine) == [1, 2, 4, 5]
+
+
+def test_script_batch_exclusive(engine):
+    with raises(ValueError):
+        run_sql(engine, "SELECT 1", batch=True, pipeline=True)
+
+
+def test_database_script_batch(db, test_table, engine):
+    db.run_sql(script, batch=True, output_mode="none")
+    assert _ids(engine) == [1, 2, 4, 5]
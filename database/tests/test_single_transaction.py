@@ -0,0 +1,112 @@
+"""
+Tests for running a script in a single transaction, with per-statement savepoints.
+"""
+
+from pytest import fixture, raises
+from sqlalchemy import event
+from sqlalchemy.exc import ProgrammingError
+
+from macrostrat.database.query import run_query, run_sql
+
+from .test_database import db, empty_db, engine
+
+script = """
+INSERT INTO single_transaction_test (id) VALUES (1);
+INSERT INTO nonexistent_table (id) VALUES (2);
+INSERT INTO single_transaction_test (id) VALUES (3);
+"""
+
+
+@fixture
+def test_table(engine):
+    run_sql(engine, "CREATE TABLE single_transaction_test (id integer PRIMARY KEY)")
+    yield "single_transaction_test"
+    run_sql(engine, "DROP TABLE single_transaction_test")
+
+
+def _ids(engine):
+    with engine.connect() as conn:
+        res = run_query(conn, "SELECT id FROM single_transaction_test ORDER BY id")
+        return [r[0] for r in res]
+
+
+@fixture
+def commits(engine):
+    counts = dict(commit=0, savepoint=0)
+
+    def on_commit(conn):
+        counts["commit"] += 1
+
+    def on_savepoint(conn, name):
+        counts["savepoint"] += 1
+
+    event.listen(engine, "commit", on_commit)
+    event.listen(engine, "savepoint", on_savepoint)
+    yield counts
+    event.remove(engine, "commit", on_commit)
+    event.remove(engine, "savepoint", on_savepoint)
+
+
+def test_single_transaction(engine, test_table, commits):
+    run_sql(engine, script, single_transaction=True, output_mode="none")
+    # The failed statement is rolled back on its own
+    assert _ids(engine) == [1, 3]
+    assert commits["commit"] == 1
+    assert commits["savepoint"] == 3
+
+
+def test_transaction_per_statement(engine, test_table, commits):
+    run_sql(engine, script, output_mode="none")
+    assert _ids(engine) == [1, 3]
+    assert commits["commit"] == 2
+    assert commits["savepoint"] == 0
+
+
+def test_single_transaction_raise_errors(engine, test_table, commits):
+    with raises(ProgrammingError):
+        run_sql(engine, script, single_transaction=True, raise_errors=True)
+    # No savepoints are needed, and the whole script is rolled back
+    assert _ids(engine) == []
+    assert commits["commit"] == 0
+    assert commits["savepoint"] == 0
+
+
+def test_single_transaction_pipeline(engine, test_table):
+    run_sql(engine, script, single_transaction=True, pipeline=True, output_mode="none")
+    assert _ids(engine) == [1, 3]
+
+
+def test_single_transaction_on_error(engine, test_table):
+    errors = []
+
+    def on_error(ctx, err, connectable):
+        errors.append(ctx.index)
+        # Skip the failed statement
+        return []
+
+    run_sql(
+        engine,
+        script,
+        single_transaction=True,
+        raise_errors=True,
+        on_error=on_error,
+        output_mode="none",
+    )
+    assert errors == [1]
+    assert _ids(engine) == [1, 3]
+
+
+def test_database_single_transaction(db, test_table, engine):
+    db.run_sql(script, single_transaction=True, output_mode="none")
+    assert _ids(engine) == [1, 3]
+
+
+def test_single_transaction_stopped_early(engine, test_table):
+    sql = "INSERT INTO single_transaction_test (id) VALUES (1); SELECT 2"
+    with engine.connect() as conn:
+        results = run_sql(conn, sql, single_transaction=True, yield_results=True)
+        next(results)
+        results.close()
+        # The transaction isn't left open
+        assert not conn.in_transaction()
+    assert _ids(engine) == []
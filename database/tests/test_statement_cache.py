@@ -0,0 +1,113 @@
+"""
+Tests for the parsed-statement cache used by ``run_sql`` and ``run_fixtures``.
+
+These tests do not require a database connection.
+"""
+
+import os
+
+from pytest import fixture, raises
+
+from macrostrat.database.cache import LRUCache
+from macrostrat.database.query import StatementCache, _get_queries
+
+multi_statement_sql = """
+-- A comment that must be stripped
+CREATE TABLE a (id integer);
+INSERT INTO a (id) VALUES (:id::integer);
+"""
+
+
+@fixture
+def cache():
+    return StatementCache(maxsize=4)
+
+
+def test_lru_cache_eviction():
+    lru = LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+    # "b" was the least recently used entry
+    assert "b" not in lru
+    assert lru.stats() == dict(size=2, maxsize=2, hits=1, misses=0, evictions=1)
+
+
+def test_lru_cache_weight():
+    lru = LRUCache(maxsize=10, maxweight=10)
+    lru.put("a", 1, weight=4)
+    lru.put("b", 2, weight=4)
+    lru.put("c", 3, weight=4)
+    assert "a" not in lru
+    assert lru.stats()["weight"] == 8
+    # Replacing an entry updates its weight
+    lru.put("b", 2, weight=1)
+    assert lru.stats()["weight"] == 5
+    # Values heavier than the limit are not cached
+    lru.put("d", 4, weight=11)
+    assert "d" not in lru
+    assert lru.pop("c") == 3
+    assert lru.stats()["weight"] == 1
+
+
+def test_source_cache_bounded_by_size():
+    cache = StatementCache(max_source_size=100, max_total_size=100)
+    sources = [f"SELECT {i}, '{'x' * 30}';" for i in range(5)]
+    for sql in sources:
+        cache.statements(sql)
+    stats = cache.stats()["sources"]
+    assert stats["size"] == 2
+    assert stats["weight"] <= 100
+    assert stats["evictions"] == 3
+    # Sources larger than max_source_size are not cached
+    cache.statements("SELECT 1;" * 20)
+    assert cache.stats()["sources"]["size"] == 2
+
+
+def test_lru_cache_invalid_size():
+    with raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_string_statements_cached(cache):
+    q1 = cache.statements(multi_statement_sql)
+    q2 = cache.statements(multi_statement_sql)
+    assert q1 == q2
+    assert len(q1) == 2
+    assert cache.stats()["sources"]["hits"] == 1
+    assert cache.stats()["sources"]["misses"] == 1
+
+
+def test_cached_statements_are_copies(cache):
+    q1 = cache.statements(multi_statement_sql)
+    q1.append("SELECT 1")
+    assert len(cache.statements(multi_statement_sql)) == 2
+
+
+def test_file_statements_invalidated_on_change(cache, tmp_path):
+    fn = tmp_path / "fixture.sql"
+    fn.write_text("SELECT 1;")
+    assert cache.statements(fn) == ["SELECT 1"]
+    assert cache.statements(fn) == ["SELECT 1"]
+
+    fn.write_text("SELECT 1; SELECT 2;")
+    # Force a distinct modification time, as some filesystems have coarse timestamps
+    st = fn.stat()
+    os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert len(cache.statements(fn)) == 2
+    assert cache.stats()["sources"]["misses"] == 2
+
+
+def test_statement_info(cache):
+    info = cache.info("INSERT INTO a (id) VALUES (:id::integer)")
+    assert info.escaped == r"INSERT INTO a (id) VALUES (:id\:\:integer)"
+    assert not info.has_server_binds
+    assert info.summary == "INSERT INTO a"
+    assert cache.info("INSERT INTO a (id) VALUES (:id::integer)") is info
+
+
+def test_get_queries_uses_cache():
+    assert _get_queries(multi_statement_sql) == _get_queries(
+        multi_statement_sql, use_cache=False
+    )
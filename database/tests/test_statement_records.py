@@ -0,0 +1,51 @@
+"""
+Tests for per-statement instrumentation (``on_statement`` and ``ExecutionReport``).
+"""
+
+from io import StringIO
+from pathlib import Path
+
+from macrostrat.database.query import ExecutionReport
+
+from .test_database import db, empty_db, engine
+
+fixture_dir = Path(__file__).parent / "fixtures" / "schema-dir"
+
+
+def test_on_statement_callback(db):
+    records = []
+    sql = "SELECT 1; SELECT * FROM generate_series(1, 3); SELECT * FROM nonexistent"
+    db.run_sql(sql, on_statement=records.append, output_mode="none")
+    assert [r.index for r in records] == [0, 1, 2]
+    assert records[1].rowcount == 3
+    assert records[1].summary == "SELECT * FROM generate_series"
+    assert all(r.wall_time >= 0 for r in records)
+    assert records[2].failed
+    assert not records[0].failed
+
+
+def test_run_sql_report(db):
+    report = ExecutionReport()
+    db.run_sql("SELECT 1; SELECT 2", report=report, output_mode="none")
+    assert len(report) == 2
+    assert report.errors == []
+    assert report.total_time == sum(r.wall_time for r in report.records)
+
+
+def test_pipeline_records(db):
+    report = ExecutionReport()
+    db.run_sql("SELECT 1; SELECT 2; SELECT 3", report=report, pipeline=True)
+    assert [r.index for r in report.records] == [0, 1, 2]
+
+
+def test_run_fixtures_report(db):
+    output = StringIO()
+    with db.transaction(rollback="always"):
+        report = db.run_fixtures(fixture_dir, output_file=output, slowest=2)
+    assert len(report) == 4
+    assert {Path(r.source).name for r in report.records} == {
+        "01-basic-fixtures.sql",
+        "02-additional-fixtures.sql",
+    }
+    assert len(report.slowest(2)) == 2
+    assert "Slowest statements (4 run" in output.getvalue()
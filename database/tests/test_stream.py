@@ -0,0 +1,47 @@
+"""
+Tests for streaming query results with server-side cursors.
+"""
+
+from pytest import importorskip, raises
+
+from .test_database import db, empty_db, engine
+
+series_query = "SELECT i AS id, 'row ' || i AS name FROM generate_series(1, :n) AS i"
+
+
+def test_stream_tuples(db):
+    batches = list(db.stream(series_query, dict(n=25), batch_size=10))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert batches[0][0] == (1, "row 1")
+
+
+def test_stream_dicts(db):
+    (batch,) = db.stream(series_query, dict(n=2), output="dicts")
+    assert batch == [dict(id=1, name="row 1"), dict(id=2, name="row 2")]
+
+
+def test_stream_dataframe(db):
+    importorskip("pandas")
+    batches = list(db.stream(series_query, dict(n=5), batch_size=3, output="dataframe"))
+    assert [len(df) for df in batches] == [3, 2]
+    assert list(batches[0].columns) == ["id", "name"]
+
+
+def test_stream_empty_result(db):
+    assert list(db.stream("SELECT 1 WHERE false")) == []
+
+
+def test_stream_early_exit(db):
+    pool = db.engine.pool
+    checked_out = pool.checkedout()
+    results = db.stream(series_query, dict(n=1000), batch_size=10)
+    next(results)
+    assert pool.checkedout() == checked_out + 1
+    results.close()
+    # The dedicated connection is returned to the pool
+    assert pool.checkedout() == checked_out
+
+
+def test_stream_single_query_only(db):
+    with raises(ValueError):
+        list(db.stream("SELECT 1; SELECT 2"))
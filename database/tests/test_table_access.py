@@ -6,10 +6,11 @@ from pathlib import Path
 
 import pytest
 from pytest import fixture
-from sqlalchemy import Table, insert, select
+from sqlalchemy import Table, event, insert, select
 
 from macrostrat.database import Database
 from macrostrat.database.query import run_sql
+from macrostrat.database.utils import reflect_table
 
 fixtures_dir = Path(__file__).parent / "fixtures"
 
@@ -93,6 +94,93 @@ def test_get_table_insert(db):
     db.session.commit()
 
 
+# ---------------------------------------------------------------------------
+# preload_tables
+# ---------------------------------------------------------------------------
+
+n_preload_tables = 10
+
+
+@fixture(scope="module")
+def preload_schema(db):
+    sql = "CREATE SCHEMA preload_test;"
+    for i in range(n_preload_tables):
+        sql += f"""
+        CREATE TABLE preload_test.table_{i} (
+            id serial PRIMARY KEY,
+            formation_id integer REFERENCES geology.formation(id),
+            name text UNIQUE
+        );
+        CREATE INDEX ON preload_test.table_{i} (name, formation_id);
+        """
+    run_sql(db.engine, sql, raise_errors=True, output_mode="none")
+    yield "preload_test"
+    run_sql(db.engine, "DROP SCHEMA preload_test CASCADE", output_mode="none")
+
+
+def _count_queries(engine):
+    queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    return queries
+
+
+def test_preload_tables(database_url, preload_schema):
+    names = [f"table_{i}" for i in range(n_preload_tables)]
+    _db = Database(database_url)
+    try:
+        # Reflecting tables one by one costs several queries per table
+        queries = _count_queries(_db.engine)
+        for name in names:
+            _db.get_table(name, schema=preload_schema)
+        n_single = len(queries)
+    finally:
+        _db.cleanup()
+
+    _db = Database(database_url)
+    try:
+        queries = _count_queries(_db.engine)
+        tables = _db.preload_tables(preload_schema)
+        n_queries = len(queries)
+        assert sorted(tables) == names
+        assert n_queries < n_single / 3
+
+        # Later lookups don't hit the database
+        tbl = _db.get_table(f"{preload_schema}.table_0")
+        assert tbl is tables["table_0"]
+        assert _db[f"{preload_schema}.table_1"] is tables["table_1"]
+        assert len(queries) == n_queries
+
+        # Referenced tables are cached too
+        fk = next(iter(tbl.foreign_keys))
+        assert _db.get_table("geology.formation") is fk.column.table
+        assert len(queries) == n_queries
+    finally:
+        _db.cleanup()
+
+
+def test_preload_tables_matches_reflection(db, preload_schema):
+    _db = Database(db.engine.url)
+    try:
+        tbl = _db.preload_tables(preload_schema)["table_2"]
+        reflected = reflect_table(db.engine, "table_2", schema=preload_schema)
+        assert [c.name for c in tbl.columns] == [c.name for c in reflected.columns]
+        assert {i.name for i in tbl.indexes} == {i.name for i in reflected.indexes}
+        assert len(tbl.foreign_keys) == len(reflected.foreign_keys) == 1
+    finally:
+        _db.cleanup()
+
+
+def test_preload_named_tables(fresh_db):
+    sample = fresh_db.get_table("sample")
+    tables = fresh_db.preload_tables(names=["sample"])
+    # Cached tables are kept
+    assert tables["sample"] is sample
+
+
 # ---------------------------------------------------------------------------
 # get_model
 # ---------------------------------------------------------------------------
@@ -0,0 +1,104 @@
+"""
+Tests for COPY-based bulk loading with ``Database.copy_in``.
+"""
+
+from io import BytesIO
+
+from pytest import fixture, importorskip, raises
+
+from .test_database import db, empty_db, engine
+
+
+@fixture
+def copy_db(db):
+    db.run_sql(
+        "CREATE TABLE copy_in_test (id integer PRIMARY KEY, name text, value double precision)",
+        raise_errors=True,
+    )
+    yield db
+    db.run_sql("DROP TABLE copy_in_test", raise_errors=True)
+    db._table_cache.clear()
+    # Release the session's connection, as later tests copy the database
+    db.session.close()
+
+
+def _rows(db):
+    res = db.run_query("SELECT id, name, value FROM copy_in_test ORDER BY id")
+    return [tuple(r) for r in res]
+
+
+def test_copy_in_binary(copy_db):
+    rows = ((i, f"name {i}", i / 2) for i in range(1000))
+    stats = copy_db.copy_in("copy_in_test", rows)
+    assert stats.rows == 1000
+    assert stats.rows_per_second > 0
+    assert _rows(copy_db)[1] == (1, "name 1", 0.5)
+
+
+def test_copy_in_dicts_csv(copy_db):
+    rows = [
+        dict(id=1, name="", value=None),
+        dict(id=2, name=None, value=1.5),
+        dict(id=3, name='with "quotes", commas'),
+    ]
+    stats = copy_db.copy_in("copy_in_test", rows, format="csv")
+    assert stats.rows == 3
+    assert _rows(copy_db) == [
+        (1, "", None),
+        (2, None, 1.5),
+        (3, 'with "quotes", commas', None),
+    ]
+
+
+def test_copy_in_columns(copy_db):
+    copy_db.copy_in("copy_in_test", [(1, "a"), (2, "b")], columns=["id", "name"])
+    assert _rows(copy_db) == [(1, "a", None), (2, "b", None)]
+
+
+def test_copy_in_file(copy_db):
+    data = BytesIO(b"id,name\n1,a\n2,b\n")
+    stats = copy_db.copy_in(
+        "copy_in_test", data, columns=["id", "name"], format="csv", header=True
+    )
+    assert stats.rows == 2
+    assert stats.bytes == len(data.getvalue())
+
+
+def test_copy_in_dataframe(copy_db):
+    pd = importorskip("pandas")
+    df = pd.DataFrame(dict(id=[1, 2], value=[1.5, float("nan")]))
+    copy_db.copy_in("copy_in_test", df)
+    assert _rows(copy_db) == [(1, None, 1.5), (2, None, None)]
+
+
+def test_copy_in_invalid_format(copy_db):
+    with raises(ValueError):
+        copy_db.copy_in("copy_in_test", [], format="parquet")
+
+
+def test_copy_in_csv_binary_values(copy_db):
+    copy_db.run_sql(
+        "CREATE TABLE copy_in_bytes (id integer, data bytea)", raise_errors=True
+    )
+    try:
+        rows = [(1, b"\x00\xff"), (2, memoryview(b"ab")), (3, b""), (4, None)]
+        copy_db.copy_in("copy_in_bytes", rows, format="csv")
+        res = copy_db.run_query("SELECT data FROM copy_in_bytes ORDER BY id")
+        assert [r.data for r in res] == [b"\x00\xff", b"ab", b"", None]
+    finally:
+        copy_db.run_sql("DROP TABLE copy_in_bytes", raise_errors=True)
+
+
+def test_copy_in_dataframe_array_values(copy_db):
+    pd = importorskip("pandas")
+    np = importorskip("numpy")
+    copy_db.run_sql(
+        "CREATE TABLE copy_in_arrays (id integer, values float8[])", raise_errors=True
+    )
+    try:
+        df = pd.DataFrame(dict(id=[1, 2], values=[np.array([1.0, 2.0]), None]))
+        copy_db.copy_in("copy_in_arrays", df)
+        res = copy_db.run_query("SELECT values FROM copy_in_arrays ORDER BY id")
+        assert [r.values for r in res] == [[1.0, 2.0], None]
+    finally:
+        copy_db.run_sql("DROP TABLE copy_in_arrays", raise_errors=True)